@@ -5,5 +5,8 @@ class AccountsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'accounts'
     verbose_name = 'アカウント'
+    
+    def ready(self):
+        from . import signals  # noqa: F401
 
 
@@ -0,0 +1,142 @@
+"""
+認証済みユーザーのプロセス内キャッシュ
+
+JWTAuthentication はリクエストのたびにユーザーを主キーで引き、
+さらに多くのビューが自分のプロフィールを引く。CachedJWTAuthentication は
+トークンのユーザーIDをキーに、ユーザーとプロフィールを select_related の1回で読んで
+TTL 秒だけプロセス内に保持する。リクエストには毎回コピーを渡すので、
+ビューで変更してもキャッシュには影響しない。キャッシュが効いている間、ユーザーの問い合わせはしない。
+
+無効化はユーザーごとのバージョンで行う。ユーザー・プロフィールの保存と削除、退会
+（シグナルを送らない一括更新）で invalidate_user() が Django のキャッシュフレームワーク
+（CACHES['default']）上のバージョンを上げ、キャッシュ済みのユーザーは読み込んだときの
+バージョンと一致する間だけ使う。CACHE_BACKEND に Redis / Memcached を指定して
+全プロセスで共有すれば、無効化・パスワード変更は他のプロセスでも次のリクエストから効く。
+既定のプロセス内キャッシュ（LocMemCache）では、他のプロセスには最大 TTL 秒遅れて届く。
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+TTL = getattr(settings, 'AUTH_USER_CACHE_TTL', 60)
+MAX_SIZE = getattr(settings, 'AUTH_USER_CACHE_SIZE', 10000)
+VERSION_KEY_PREFIX = 'auth-user-version'
+
+
+class UserCache:
+    """ユーザーIDごとの (期限, バージョン, ユーザー) を持つ LRU キャッシュ（スレッドセーフ）"""
+
+    def __init__(self, ttl=TTL, max_size=MAX_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, user_id, version=None):
+        """キャッシュ済みのユーザー（プロフィール付き）を返す（なければ、期限切れ・バージョン違いなら None）"""
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry is None:
+                return None
+            expires_at, cached_version, user = entry
+            if expires_at <= now or cached_version != version:
+                del self.entries[user_id]
+                return None
+            self.entries.move_to_end(user_id)
+        return _copy(user)
+
+    def set(self, user, version=None):
+        with self.lock:
+            self.entries[user.pk] = (time.monotonic() + self.ttl, version, _copy(user))
+            self.entries.move_to_end(user.pk)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self.lock:
+            self.entries.pop(user_id, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+def _copy(user):
+    """ユーザーとキャッシュ済みのプロフィールをコピーする（リクエスト間で同じオブジェクトを共有しない）"""
+    user = copy.copy(user)
+    profile = user._state.fields_cache.get('profile')
+    if profile is not None:
+        profile = copy.copy(profile)
+        profile._state.fields_cache['user'] = user
+        user._state.fields_cache['profile'] = profile
+    return user
+
+
+user_cache = UserCache()
+
+
+def version_key(user_id):
+    return f'{VERSION_KEY_PREFIX}:{user_id}'
+
+
+def _bump_version(key):
+    if not cache.add(key, 1, timeout=None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            # add と incr の間に消えた
+            cache.add(key, 1, timeout=None)
+
+
+def invalidate_user(user_id):
+    """キャッシュ済みのユーザーを無効にする（バージョンを上げ、トランザクション中なら確定後にも上げる）"""
+    user_cache.invalidate(user_id)
+    key = version_key(user_id)
+    _bump_version(key)
+    # 確定前に別のプロセスが古い行を新しいバージョンで読み込んだ場合に備える
+    transaction.on_commit(lambda: _bump_version(key))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """ユーザーをプロセス内キャッシュから取得する JWTAuthentication
+
+    request.user.profile もキャッシュ済み（プロフィールがなければ参照時に
+    Profile.DoesNotExist）なので、自分のプロフィールを読むだけなら問い合わせは発生しない。
+    is_active とパスワード変更の確認はキャッシュ済みのユーザーに対して行う。
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+        version = cache.get(version_key(user_id))
+        user = user_cache.get(user_id, version)
+        if user is None:
+            try:
+                user = User.objects.select_related('profile').get(**{api_settings.USER_ID_FIELD: user_id})
+            except User.DoesNotExist:
+                raise AuthenticationFailed(_('User not found'), code='user_not_found')
+            user_cache.set(user, version)
+
+        if not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code='password_changed')
+
+        return user
@@ -1,6 +1,7 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
 from django.contrib.auth.password_validation import validate_password
+from blog.avatars import avatar_url
 from blog.models import Profile
 
 
@@ -55,7 +56,7 @@ class UserSerializer(serializers.ModelSerializer):
         if hasattr(obj, 'profile'):
             return {
                 'display_name': obj.profile.display_name,
-                'avatar': obj.profile.avatar.url if obj.profile.avatar else None,
+                'avatar': avatar_url(obj.profile),
                 'bio': obj.profile.bio
             }
         return None
@@ -0,0 +1,21 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from blog.models import Profile
+
+from .authentication import invalidate_user
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    """ユーザーの変更（無効化・パスワード変更を含む）・削除で認証済みユーザーのキャッシュを無効にする"""
+    invalidate_user(instance.pk)
+
+
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def invalidate_cached_profile(sender, instance, **kwargs):
+    """プロフィールの変更・削除で認証済みユーザーのキャッシュを無効にする"""
+    invalidate_user(instance.user_id)
@@ -4,6 +4,7 @@ from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.views import APIView
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth.models import User
+from blog.purge import deactivate_user
 from .serializers import RegisterSerializer, UserSerializer
 
 
@@ -37,5 +38,10 @@ class MeView(APIView):
     def get(self, request):
         serializer = UserSerializer(request.user)
         return Response(serializer.data)
+    
+    def delete(self, request):
+        """退会（アカウントを無効化し、データはバックグラウンドで削除する）"""
+        deactivate_user(request.user)
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
 
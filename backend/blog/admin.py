@@ -16,6 +16,14 @@ class LikeAdmin(admin.ModelAdmin):
     list_filter = ['created_at']
     search_fields = ['from_user__username', 'to_user__username']
     readonly_fields = ['created_at']
+    list_select_related = ['from_user', 'to_user']
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).with_mutual()
+    
+    @admin.display(description='相互いいね', boolean=True, ordering='mutual')
+    def is_mutual(self, obj):
+        return obj.is_mutual()
 
 
 @admin.register(Match)
@@ -29,10 +37,17 @@ class MatchAdmin(admin.ModelAdmin):
 @admin.register(Message)
 class MessageAdmin(admin.ModelAdmin):
     list_display = ['sender', 'match', 'content_preview', 'is_read', 'created_at']
-    list_filter = ['is_read', 'created_at']
+    list_filter = ['created_at']
     search_fields = ['sender__username', 'content']
     readonly_fields = ['created_at']
     
+    def get_queryset(self, request):
+        return super().get_queryset(request).with_read_state()
+    
+    @admin.display(description='既読', boolean=True)
+    def is_read(self, obj):
+        return obj.is_read
+    
     def content_preview(self, obj):
         return obj.content[:50] + '...' if len(obj.content) > 50 else obj.content
     content_preview.short_description = 'メッセージ'
@@ -0,0 +1,218 @@
+"""
+プロフィール画像の縮小版
+
+アップロードされた元画像（Profile.avatar）から SIZES の大きさの JPEG を作り、
+内容のハッシュをファイル名にして保存する（avatars/<サイズ>/<ハッシュ>.jpg）。
+同じ名前の内容は変わらないので、配信側で無期限にキャッシュしてよい。
+縮小はリクエスト中には行わず、process_avatars コマンドが
+元画像と縮小版の元（avatar_source）が食い違うプロフィールを順に処理する。
+食い違いは保存時に avatar_pending に持つので、待っているものがなければ
+インデックスを1回引くだけで済む。
+縮小版ができるまでは元画像の URL を返す。
+
+アップロード（receive / accept）は本文を UPLOAD_CHUNK_SIZE ずつ一時ファイルに書き出し、
+バイト数はその途中で、画素数はヘッダーだけを読んだ時点で制限する。
+デコードは JPEG なら draft、それ以外は reduce で縮小しながら行う。reduce は元の大きさの
+まま全体をデコードするので、縮小版を作るとき（render）もデコードの前に画素数を確かめ直し、
+1件あたりのメモリが入力の大きさではなく画素数の上限で決まるようにする。
+"""
+import hashlib
+import io
+import tempfile
+import uuid
+
+from django.conf import settings
+from django.core.files.base import ContentFile, File
+from django.core.files.storage import default_storage
+from django.db.models import F
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from .models import Profile
+
+SIZES = {'small': 192, 'medium': 512, 'large': 1080}
+# 一覧のカードは丸く切り抜いて表示するので正方形にする（large は縦横比を保つ）
+SQUARE_SIZES = {'small', 'medium'}
+LIST_SIZE = 'small'
+QUALITY = getattr(settings, 'AVATAR_QUALITY', 85)
+MAX_UPLOAD_SIZE = getattr(settings, 'AVATAR_MAX_UPLOAD_SIZE', 10 * 1024 * 1024)
+MAX_PIXELS = getattr(settings, 'AVATAR_MAX_PIXELS', 25_000_000)
+UPLOAD_CHUNK_SIZE = 64 * 1024
+FORMATS = {'JPEG': 'jpg', 'PNG': 'png', 'WEBP': 'webp', 'GIF': 'gif'}
+# reduce で画素の平均を取れるモード（パレットなどは先に RGB にする）
+REDUCIBLE_MODES = {'L', 'LA', 'RGB', 'RGBA', 'CMYK', 'I', 'F'}
+
+
+class InvalidAvatar(ValueError):
+    pass
+
+
+class AvatarTooLarge(InvalidAvatar):
+    pass
+
+
+def pending_profiles():
+    """縮小版がない、または元画像が差し替えられたプロフィール（(avatar_pending, id) インデックスで引く）"""
+    return Profile.objects.filter(avatar_pending=True)
+
+
+def _flatten(image):
+    """透過を白背景に合成して RGB にする"""
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def _check_pixels(image):
+    """デコードする画素数が MAX_PIXELS を超えていれば AvatarTooLarge（ヘッダーだけで判定する）"""
+    width, height = image.size
+    if width * height > MAX_PIXELS:
+        raise AvatarTooLarge(f'Avatar must be at most {MAX_PIXELS} pixels')
+
+
+def render(image):
+    """元画像から {サイズ名: JPEG のバイト列} を作る（画素数が多すぎれば AvatarTooLarge）"""
+    # JPEG は最大サイズを下回らない範囲で縮小しながらデコードする
+    largest = max(SIZES.values())
+    image.draft('RGB', (largest, largest))
+    # 形式によらず、画素を展開する前に（draft 後の）デコードする大きさを確かめる
+    _check_pixels(image)
+    # それ以外の形式も、最大サイズを下回らない範囲で先に整数倍の縮小をかけておく
+    factor = min(image.size) // largest
+    if factor > 1:
+        if image.mode not in REDUCIBLE_MODES:
+            image = _flatten(image)
+        image = image.reduce(factor)
+    # 向きの補正と透過の合成は縮小した画像に対して行う（EXIF は reduce の結果にも残る）
+    image = _flatten(ImageOps.exif_transpose(image))
+    rendered = {}
+    for name, size in SIZES.items():
+        if name in SQUARE_SIZES:
+            resized = ImageOps.fit(image, (size, size), Image.LANCZOS)
+        else:
+            resized = image.copy()
+            resized.thumbnail((size, size), Image.LANCZOS)
+        buffer = io.BytesIO()
+        # EXIF（位置情報など）は付けずに保存する
+        resized.save(buffer, 'JPEG', quality=QUALITY, optimize=True, progressive=True)
+        rendered[name] = buffer.getvalue()
+    return rendered
+
+
+def store(name, data):
+    """内容のハッシュを名前にして保存し、保存先の名前を返す（同じ内容は保存し直さない）"""
+    digest = hashlib.sha256(data).hexdigest()[:32]
+    path = f'avatars/{name}/{digest}.jpg'
+    if not default_storage.exists(path):
+        default_storage.save(path, ContentFile(data))
+    return path
+
+
+def receive(stream, content_length=None):
+    """アップロードされた本文を一時ファイルに書き出す（MAX_UPLOAD_SIZE を超えたら AvatarTooLarge）"""
+    if content_length is not None and content_length > MAX_UPLOAD_SIZE:
+        raise AvatarTooLarge(f'Avatar must be at most {MAX_UPLOAD_SIZE} bytes')
+    if stream is None:
+        raise InvalidAvatar('Request body must be an image')
+    upload = tempfile.TemporaryFile(dir=settings.FILE_UPLOAD_TEMP_DIR)
+    size = 0
+    while True:
+        chunk = stream.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > MAX_UPLOAD_SIZE:
+            upload.close()
+            raise AvatarTooLarge(f'Avatar must be at most {MAX_UPLOAD_SIZE} bytes')
+        upload.write(chunk)
+    if not size:
+        upload.close()
+        raise InvalidAvatar('Request body must be an image')
+    upload.seek(0)
+    return upload
+
+
+def inspect(upload):
+    """画像の形式と大きさをヘッダーで確かめてから、壊れていないかを確かめる
+
+    形式の拡張子を返す。画素数が MAX_PIXELS を超えると AvatarTooLarge、
+    画像として読めなければ InvalidAvatar。
+    """
+    try:
+        with Image.open(upload) as image:
+            if image.format not in FORMATS:
+                raise InvalidAvatar(f'Avatar must be one of {", ".join(FORMATS)}')
+            _check_pixels(image)
+            extension = FORMATS[image.format]
+            if image.format == 'JPEG':
+                largest = max(SIZES.values())
+                image.draft('RGB', (largest, largest))
+                image.load()
+            else:
+                # JPEG 以外は画素を展開せずにデータの整合性だけを確かめる
+                image.verify()
+            return extension
+    except Image.DecompressionBombError:
+        raise AvatarTooLarge(f'Avatar must be at most {MAX_PIXELS} pixels')
+    except (OSError, UnidentifiedImageError, SyntaxError):
+        raise InvalidAvatar('Avatar is not a valid image')
+    finally:
+        upload.seek(0)
+
+
+def accept(profile, stream, content_length=None):
+    """アップロードを受け取ってプロフィール画像を差し替える（縮小版は process_avatars が作る）"""
+    with receive(stream, content_length) as upload:
+        extension = inspect(upload)
+        profile.avatar.save(f'{uuid.uuid4().hex}.{extension}', File(upload), save=False)
+    profile.save(update_fields=['avatar', 'updated_at'])
+    return profile
+
+
+def process(profile):
+    """プロフィール画像の縮小版を作って保存する
+
+    処理中に画像が差し替えられていたら結果は捨てる（次の実行で作り直す）。
+    読めない画像や画素数が多すぎる画像は縮小版なしで処理済みにし、元画像の URL を返し続ける。
+    """
+    source = profile.avatar.name
+    try:
+        with profile.avatar.open('rb') as f, Image.open(f) as image:
+            thumbnails = {name: store(name, data) for name, data in render(image).items()}
+    except (OSError, UnidentifiedImageError, Image.DecompressionBombError, InvalidAvatar):
+        thumbnails = {}
+    updated = Profile.objects.filter(pk=profile.pk, avatar=source).update(
+        avatar_thumbnails=thumbnails, avatar_source=source, avatar_pending=False,
+        cache_version=F('cache_version') + 1
+    )
+    profile.avatar_thumbnails, profile.avatar_source = thumbnails, source
+    if updated:
+        profile.avatar_pending = False
+        profile.refresh_from_db(fields=['cache_version'])
+    return bool(updated and thumbnails)
+
+
+def stored_avatar_url(name, source, thumbnails, size=LIST_SIZE):
+    """保存先の名前から画像 URL を求める（.values() で読んだ列から使う）"""
+    if not name:
+        return None
+    if source == name and size in thumbnails:
+        return default_storage.url(thumbnails[size])
+    return default_storage.url(name)
+
+
+def avatar_url(profile, size=LIST_SIZE, request=None):
+    """表示用の画像 URL（縮小版がまだなければ元画像、画像がなければ None）"""
+    url = stored_avatar_url(profile.avatar.name, profile.avatar_source, profile.avatar_thumbnails, size)
+    if url is None:
+        return None
+    return request.build_absolute_uri(url) if request is not None else url
+
+
+def avatar_urls(profile, request=None):
+    """すべてのサイズの画像 URL"""
+    if not profile.avatar:
+        return None
+    return {size: avatar_url(profile, size, request) for size in SIZES}
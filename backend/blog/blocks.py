@@ -0,0 +1,81 @@
+"""
+ブロック関係の除外セット
+
+ユーザーごとに、ブロックした・された相手のユーザーID（双方向）を集合にして
+Django のキャッシュフレームワーク（CACHES['default']）に保存する。
+ブロックの作成・解除ではシグナルから双方のキーを消す（トランザクション中なら確定後にも消す）。
+ビューでは for_request() でリクエストごとに1回だけ読み、
+exclude_blocked() で queryset から相手の行を除く（NOT IN の反結合 1つ）。
+
+キャッシュの削除はキャッシュを共有するプロセスにしか届かないため、
+既定のプロセス内キャッシュ（LocMemCache）では他のプロセスが最大 TIMEOUT 秒
+（既定60秒）古い集合で一覧を返し得る。いいね・メッセージ送信などの書き込みは
+キャッシュを使わず blocked_among() で DB を確認するので、この間もブロックは破られない。
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+
+from .models import Block
+
+TIMEOUT = getattr(settings, 'BLOCK_CACHE_TIMEOUT', 60)
+KEY_PREFIX = 'blocked-users'
+# リクエストに読み込んだ集合を持たせておく属性名
+REQUEST_ATTR = '_blocked_user_ids'
+
+
+def cache_key(user_id):
+    return f'{KEY_PREFIX}:{user_id}'
+
+
+def blocked_user_ids(user_id):
+    """ブロックした・されたユーザーIDの集合（キャッシュになければ DB から読んで保存）"""
+    key = cache_key(user_id)
+    blocked = cache.get(key)
+    if blocked is None:
+        pairs = Block.objects.filter(Q(blocker_id=user_id) | Q(blocked_id=user_id)).values_list(
+            'blocker_id', 'blocked_id'
+        )
+        blocked = frozenset(blocked_id if blocker_id == user_id else blocker_id for blocker_id, blocked_id in pairs)
+        cache.set(key, blocked, TIMEOUT)
+    return blocked
+
+
+def blocked_among(user_id, user_ids):
+    """user_ids のうち user_id とどちらかの向きのブロックがあるユーザーID（キャッシュを使わない）"""
+    user_ids = list(user_ids)
+    if not user_ids:
+        return set()
+    pairs = Block.objects.filter(
+        Q(blocker_id=user_id, blocked_id__in=user_ids) | Q(blocker_id__in=user_ids, blocked_id=user_id)
+    ).values_list('blocker_id', 'blocked_id')
+    return {blocked_id if blocker_id == user_id else blocker_id for blocker_id, blocked_id in pairs}
+
+
+def for_request(request):
+    """リクエストのユーザーの除外セット（リクエスト中は1回だけ読む。未認証なら空）"""
+    blocked = getattr(request, REQUEST_ATTR, None)
+    if blocked is None:
+        user = request.user
+        blocked = blocked_user_ids(user.pk) if user.is_authenticated else frozenset()
+        setattr(request, REQUEST_ATTR, blocked)
+    return blocked
+
+
+def exclude_blocked(queryset, request, *fields):
+    """queryset から、fields のどれかがブロック関係の相手を指す行を除く"""
+    blocked = for_request(request)
+    if not blocked:
+        return queryset
+    for field in fields:
+        queryset = queryset.exclude(**{f'{field}__in': blocked})
+    return queryset
+
+
+def invalidate(*user_ids):
+    """ユーザーの除外セットを消す（トランザクション中なら確定後にもう一度消す）"""
+    keys = [cache_key(user_id) for user_id in set(user_ids)]
+    cache.delete_many(keys)
+    # 確定前に別のリクエストが古い集合を読み直して保存した場合に備える
+    transaction.on_commit(lambda: cache.delete_many(keys))
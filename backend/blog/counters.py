@@ -0,0 +1,182 @@
+"""
+ユーザーごとの集計値（UserCounters）の更新
+
+いいね・マッチング・メッセージの作成や削除のたびに差分だけを UPDATE で加算する。
+batch() の中の加算はまとめておき、抜けるときに1回の UPDATE（ユーザーごとの差分は CASE）で行う。
+行がまだない場合は実データから作成してから加算し、値がずれた場合は
+実データから数え直す（reconcile_counters コマンド）。
+"""
+import threading
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+from django.db.models import Case, Count, F, IntegerField, Value, When
+
+from .models import Like, MatchMember, Message, UserCounters
+
+
+_pending = threading.local()
+
+
+def _grouped_counts(queryset, field):
+    return queryset.order_by().values_list(field).annotate(count=Count('id'))
+
+
+def compute(user_ids):
+    """実データから集計値を計算して {ユーザーID: {項目: 値}} で返す"""
+    user_ids = list(user_ids)
+    counters = {user_id: dict.fromkeys(UserCounters.COUNTER_FIELDS, 0) for user_id in user_ids}
+
+    for user_id, count in _grouped_counts(Like.objects.filter(from_user__in=user_ids), 'from_user'):
+        counters[user_id]['likes_sent'] = count
+    for user_id, count in _grouped_counts(Like.objects.filter(to_user__in=user_ids), 'to_user'):
+        counters[user_id]['likes_received'] = count
+    pending = Like.objects.filter(to_user__in=user_ids).with_mutual().filter(mutual=False)
+    for user_id, count in _grouped_counts(pending, 'to_user'):
+        counters[user_id]['pending_likes'] = count
+
+    for user_id, count in _grouped_counts(MatchMember.objects.filter(user__in=user_ids), 'user'):
+        counters[user_id]['matches'] = count
+    unread = Message.objects.filter(match__members__user__in=user_ids).annotate(
+        recipient=F('match__members__user'), read_id=F('match__members__last_read_message_id')
+    ).exclude(sender=F('recipient')).filter(id__gt=F('read_id'))
+    for user_id, count in _grouped_counts(unread, 'recipient'):
+        counters[user_id]['unread_messages'] = count
+    return counters
+
+
+def rebuild(user_ids):
+    """集計値を数え直して保存し、値がずれていた行数を返す"""
+    computed = compute(user_ids)
+    existing = UserCounters.objects.in_bulk(list(computed))
+    created = []
+    changed = []
+    for user_id, values in computed.items():
+        counters = existing.get(user_id)
+        if counters is None:
+            created.append(UserCounters(user_id=user_id, **values))
+            continue
+        if any(getattr(counters, field) != value for field, value in values.items()):
+            for field, value in values.items():
+                setattr(counters, field, value)
+            changed.append(counters)
+
+    UserCounters.objects.bulk_create(created, ignore_conflicts=True)
+    UserCounters.objects.bulk_update(changed, UserCounters.COUNTER_FIELDS)
+    return len(changed)
+
+
+def _update(deltas_by_user):
+    """{ユーザーID: {項目: 差分}} を1回の UPDATE で加算し、更新した行数を返す"""
+    fields = {field for deltas in deltas_by_user.values() for field in deltas}
+    values = {}
+    for field in fields:
+        by_user = {user_id: deltas[field] for user_id, deltas in deltas_by_user.items() if field in deltas}
+        if len(set(by_user.values())) == 1 and len(by_user) == len(deltas_by_user):
+            values[field] = F(field) + next(iter(by_user.values()))
+        else:
+            values[field] = F(field) + Case(
+                *[When(user_id=user_id, then=Value(delta)) for user_id, delta in by_user.items()],
+                default=Value(0), output_field=IntegerField()
+            )
+    return UserCounters.objects.filter(user_id__in=list(deltas_by_user)).update(**values)
+
+
+def _apply(deltas_by_user):
+    """差分を加算する（行がなければ実データから作成する）
+
+    まず UPDATE だけを行い、更新した行数が足りないときだけ行のないユーザーを調べる。
+    行がなければ、実データから数えた値からこの差分を引いた値で get_or_create してから加算する。
+    同時に作成されても一方は既存の行に加算するだけなので、加算は失われない
+    （UPDATE と存在確認の間に別のトランザクションが作った行だけは reconcile_counters で直す）。
+    """
+    deltas_by_user = {
+        user_id: {field: delta for field, delta in deltas.items() if delta}
+        for user_id, deltas in deltas_by_user.items()
+    }
+    deltas_by_user = {user_id: deltas for user_id, deltas in deltas_by_user.items() if deltas}
+    if not deltas_by_user or _update(deltas_by_user) == len(deltas_by_user):
+        return
+    existing = set(
+        UserCounters.objects.filter(user_id__in=list(deltas_by_user)).values_list('user_id', flat=True)
+    )
+    missing = {user_id: deltas for user_id, deltas in deltas_by_user.items() if user_id not in existing}
+    for user_id, values in compute(missing).items():
+        for field, delta in missing[user_id].items():
+            values[field] -= delta
+        UserCounters.objects.get_or_create(user_id=user_id, defaults=values)
+    _update(missing)
+
+
+def add(deltas_by_user):
+    """ユーザーごとに異なる差分を加算する（変更を書き込んだ後に呼ぶ）
+
+    {ユーザーID: {項目: 差分}} で指定する。batch() の中ならまとめておき、抜けるときに加算する。
+    """
+    pending = getattr(_pending, 'deltas', None)
+    if pending is None:
+        _apply(deltas_by_user)
+        return
+    for user_id, deltas in deltas_by_user.items():
+        pending[user_id].update(deltas)
+
+
+def bump(user_ids, **deltas):
+    """指定ユーザーの集計値に同じ差分を加算する（変更を書き込んだ後に呼ぶ）"""
+    add({user_id: deltas for user_id in set(user_ids)})
+
+
+@contextmanager
+def batch():
+    """ブロック内の加算をまとめ、抜けるときに1回の UPDATE で行う（トランザクションの中で使う）
+
+    入れ子にした場合は一番外側でまとめて加算する。例外で抜けた場合は加算しない。
+    """
+    if getattr(_pending, 'deltas', None) is not None:
+        yield
+        return
+    _pending.deltas = defaultdict(Counter)
+    try:
+        yield
+        deltas_by_user = _pending.deltas
+    finally:
+        _pending.deltas = None
+    _apply(deltas_by_user)
+
+
+def get_counters(user):
+    """ユーザーの集計値を取得（行がなければ作成）"""
+    counters = UserCounters.objects.filter(user=user).first()
+    if counters is None:
+        rebuild([user.id])
+        counters = UserCounters.objects.get(user=user)
+    return counters
+
+
+def like_created(from_user_id, to_user_id, is_mutual):
+    """いいね作成時（is_mutual: 相手からのいいねが既にあるか）"""
+    add({
+        from_user_id: {'likes_sent': 1, 'pending_likes': -1 if is_mutual else 0},
+        to_user_id: {'likes_received': 1, 'pending_likes': 0 if is_mutual else 1},
+    })
+
+
+def like_deleted(from_user_id, to_user_id, was_mutual, is_mutual):
+    """いいね削除時（was_mutual: 削除前に相互だったか / is_mutual: 相手からのいいねが残っているか）
+
+    双方向のいいねを1回の DELETE で消した場合は was_mutual だけが真になり、
+    どちらの未承認数も変わらない。
+    """
+    add({
+        from_user_id: {'likes_sent': -1, 'pending_likes': 1 if is_mutual else 0},
+        to_user_id: {'likes_received': -1, 'pending_likes': 0 if was_mutual else -1},
+    })
+
+
+def unread_counts(match):
+    """マッチング内の未読メッセージ数を受信者ごとに返す"""
+    counts = {}
+    for sender_id, count in _grouped_counts(Message.objects.filter(match=match).unread(), 'sender'):
+        recipient_id = match.user2_id if sender_id == match.user1_id else match.user1_id
+        counts[recipient_id] = counts.get(recipient_id, 0) + count
+    return counts
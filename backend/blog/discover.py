@@ -0,0 +1,95 @@
+"""
+おすすめユーザー（discover）の候補キュー
+
+ユーザーごとに表示候補を DiscoverCandidate として事前に積んでおき、
+discover はキューの先頭を読むだけで済むようにする。
+キューはプロフィールIDの走査位置（DiscoverQueue.last_profile_id）から
+少しずつ補充するため、新規プロフィールは次の補充時に自然に取り込まれる。
+
+候補はいいね・パス・ブロックのときにだけキューから外し、表示しただけでは外さない。
+表示した候補を外すと、応答が届かなかった・カードを見ずに再読み込みした場合に
+その相手が二度と出てこなくなるため、操作するまでは同じ候補を返すのを意図した仕様とする。
+"""
+from django.conf import settings
+
+from . import blocks
+from .models import Profile, Like, DiscoverQueue, DiscoverCandidate
+from .swipelog import passed_user_ids
+
+QUEUE_SIZE = getattr(settings, 'DISCOVER_QUEUE_SIZE', 100)
+SCAN_BATCH_SIZE = 500
+MAX_SCAN_BATCHES = 10
+
+
+def excluded_user_ids(user, user_ids=None):
+    """候補から除外すべきユーザーID（いいね済み・パス済み・ブロック関係）を返す
+
+    user_ids を指定するとその中だけを調べる。
+    """
+    likes = Like.objects.filter(from_user=user)
+    blocked = blocks.blocked_user_ids(user.id)
+    if user_ids is not None:
+        likes = likes.filter(to_user__in=user_ids)
+        blocked = blocked.intersection(user_ids)
+
+    excluded = set(likes.values_list('to_user_id', flat=True))
+    excluded |= blocked
+    excluded |= passed_user_ids(user, user_ids)
+    return excluded
+
+
+def refill_queue(user, size=QUEUE_SIZE, extra=0):
+    """候補キューを指定件数（extra 指定時は現在の件数 + extra 件以上）まで補充する
+
+    走査はプロフィールIDの昇順にバッチ単位で進め、1回の呼び出しで
+    読むプロフィール数は SCAN_BATCH_SIZE * MAX_SCAN_BATCHES までに抑える。
+    """
+    state, created = DiscoverQueue.objects.get_or_create(user=user)
+    queued = DiscoverCandidate.objects.filter(user=user).count()
+    size = max(size, queued + extra)
+
+    for _ in range(MAX_SCAN_BATCHES):
+        if queued >= size:
+            break
+
+        rows = list(
+            Profile.objects.filter(id__gt=state.last_profile_id)
+            .order_by('id')
+            .values_list('id', 'user_id')[:SCAN_BATCH_SIZE]
+        )
+        if not rows:
+            break
+
+        excluded = excluded_user_ids(user, [user_id for _, user_id in rows])
+        room = size - queued
+        candidates = []
+        for profile_id, user_id in rows:
+            # 積みきれなかった分は次回以降に走査する
+            if len(candidates) >= room:
+                break
+            state.last_profile_id = profile_id
+            if user_id != user.id and user_id not in excluded:
+                candidates.append(DiscoverCandidate(user=user, candidate_id=user_id))
+        DiscoverCandidate.objects.bulk_create(candidates, ignore_conflicts=True)
+        queued += len(candidates)
+
+    state.save(update_fields=['last_profile_id', 'updated_at'])
+    return queued
+
+
+def enqueue(user, candidate):
+    """候補を1件キューに戻す（いいね取り消し・ブロック解除時）"""
+    if user.id == candidate.id or not DiscoverQueue.objects.filter(user=user).exists():
+        return
+    if excluded_user_ids(user, [candidate.id]):
+        return
+    if not Profile.objects.filter(user=candidate).exists():
+        return
+    DiscoverCandidate.objects.bulk_create(
+        [DiscoverCandidate(user=user, candidate=candidate)], ignore_conflicts=True
+    )
+
+
+def dequeue(user, candidate):
+    """候補をキューから取り除く"""
+    DiscoverCandidate.objects.filter(user=user, candidate=candidate).delete()
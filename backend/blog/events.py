@@ -0,0 +1,140 @@
+"""
+Server-Sent Events によるリアルタイム配信
+
+GET /api/blog/events/ に EventSource で接続すると、自分宛てのイベント
+（新着メッセージ・マッチング成立・解除）が pubsub 経由で届く。
+認証は SimpleJWT のアクセストークンで、EventSource はヘッダーを
+付けられないため ?token= でも受け付ける。ユーザーの確認（is_active・パスワード変更）は
+通常の API と同じ CachedJWTAuthentication で行い、接続中もハートビートごとに確かめ直して
+退会・削除されたユーザーの接続は閉じる。
+接続を保持する非同期ビューなので ASGI サーバー（uvicorn など）で動かすこと。
+WSGI ではストリームが最後まで読まれてから送られ、接続がワーカーを占有し続けるため 503 を返す。
+"""
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.exceptions import InvalidToken
+
+from accounts.authentication import CachedJWTAuthentication
+
+from .pubsub import get_broker, publish_to_users, user_channel
+from .serializers import MessageSerializer
+
+HEARTBEAT = getattr(settings, 'EVENTS_HEARTBEAT', 15)
+
+_jwt = CachedJWTAuthentication()
+
+
+def message_created(message):
+    """新着メッセージを両方の参加者に送る"""
+    match = message.match
+    publish_to_users([match.user1_id, match.user2_id], {
+        'type': 'message',
+        'match': match.id,
+        'message': MessageSerializer(message).data,
+    })
+
+
+def match_created(match):
+    """マッチング成立を両方の参加者に送る"""
+    publish_to_users([match.user1_id], {'type': 'match', 'match': match.id, 'partner': match.user2_id})
+    publish_to_users([match.user2_id], {'type': 'match', 'match': match.id, 'partner': match.user1_id})
+
+
+def match_hidden(match):
+    """マッチング解除を両方の参加者に送る"""
+    publish_to_users([match.user1_id, match.user2_id], {'type': 'unmatch', 'match': match.id})
+
+
+def messages_read(match_id, partner_id, message_id):
+    """既読位置が進んだことを相手に送る（既読表示用）"""
+    publish_to_users([partner_id], {'type': 'read', 'match': match_id, 'last_read_message_id': message_id})
+
+
+def authenticate(request):
+    """Authorization ヘッダーまたは ?token= のアクセストークンから (トークン, ユーザー) を取得
+
+    無効なトークン・無効化されたユーザーなら None。
+    """
+    header = request.headers.get('Authorization', '')
+    raw_token = header[len('Bearer '):] if header.startswith('Bearer ') else request.GET.get('token')
+    if not raw_token:
+        return None
+    try:
+        token = _jwt.get_validated_token(raw_token)
+        return token, _jwt.get_user(token)
+    except (InvalidToken, AuthenticationFailed):
+        return None
+
+
+def is_authorized(token):
+    """接続中のトークンのユーザーがまだ有効か（退会・削除・パスワード変更で False）"""
+    try:
+        _jwt.get_user(token)
+    except (InvalidToken, AuthenticationFailed):
+        return False
+    return True
+
+
+def format_event(event):
+    data = json.dumps(event, cls=DjangoJSONEncoder, ensure_ascii=False)
+    return f"event: {event['type']}\ndata: {data}\n\n"
+
+
+async def stream(subscription, token):
+    """イベントを SSE 形式で送り続ける（HEARTBEAT 秒ごとにコメント行で接続を維持）
+
+    ハートビートのたびにユーザーを確かめ直し、無効になっていれば接続を閉じる
+    （EventSource の再接続は 401 で止まる）。
+    """
+    try:
+        yield 'retry: 3000\n\n'
+        while True:
+            event = await subscription.get(timeout=HEARTBEAT)
+            if event is not None:
+                yield format_event(event)
+            elif await sync_to_async(is_authorized)(token):
+                yield ': ping\n\n'
+            else:
+                return
+    finally:
+        subscription.close()
+
+
+class EventStream:
+    """stream() を応答に渡すための非同期イテラブル
+
+    応答の close()（送信の終了時に Django が呼ぶ）で購読を解除する。
+    切断でジェネレーターが捨てられた場合は stream() の finally で解除される。
+    """
+
+    def __init__(self, subscription, token):
+        self.subscription = subscription
+        self.token = token
+
+    def __aiter__(self):
+        return stream(self.subscription, self.token)
+
+    def close(self):
+        self.subscription.close()
+
+
+async def events(request):
+    """自分宛てのイベントを Server-Sent Events で受信"""
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({'error': 'The event stream requires an ASGI server'}, status=503)
+    authenticated = await sync_to_async(authenticate)(request)
+    if authenticated is None:
+        return JsonResponse({'error': 'Authentication credentials were not provided or are invalid'}, status=401)
+
+    token, user = authenticated
+    subscription = get_broker().subscribe([user_channel(user.id)])
+    response = StreamingHttpResponse(EventStream(subscription, token), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
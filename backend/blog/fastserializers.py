@@ -0,0 +1,259 @@
+"""
+一覧用の高速シリアライザ
+
+読み取り専用の一覧では、モデルのインスタンス化と
+DRF のフィールドごとの処理を省き、.values() の行から直接 dict を作る。
+出力の形は対応する ModelSerializer（serializers.py）と同じにしてある。
+プロフィールはIDとバージョンだけを一覧と同じ問い合わせで読み、
+断片は ProfileListSerializer と共有する profilecache から引く（なかった分だけまとめて1回で読む）。
+FAST_LIST_SERIALIZERS = False で通常のシリアライザに戻せる。
+"""
+from django.conf import settings
+from rest_framework import serializers
+from rest_framework.response import Response
+
+from . import profilecache
+from .avatars import stored_avatar_url
+from .models import Profile
+
+ENABLED = getattr(settings, 'FAST_LIST_SERIALIZERS', True)
+
+_datetime = serializers.DateTimeField().to_representation
+
+
+class ValuesSerializer:
+    """.values() の行から dict を作る読み取り専用シリアライザの基底クラス
+
+    values に読む列、row() に1行分の出力を書く。関連をまとめて読む場合は prefetch() を上書きする。
+    """
+    values = ()
+
+    def __init__(self, context=None):
+        self.context = context or {}
+        self.request = self.context.get('request')
+
+    def columns(self):
+        return list(self.values)
+
+    def queryset(self, queryset, ordering=()):
+        """queryset を .values() にする（キーセットページネーションの並び順の列も読む）"""
+        columns = self.columns()
+        columns += [field.lstrip('-') for field in ordering if field.lstrip('-') not in columns]
+        return queryset.values(*columns)
+
+    def prefetch(self, rows):
+        pass
+
+    def row(self, row):
+        raise NotImplementedError
+
+    def serialize(self, rows):
+        rows = list(rows)
+        self.prefetch(rows)
+        return [self.row(row) for row in rows]
+
+    def absolute(self, url):
+        if url is None or self.request is None:
+            return url
+        return self.request.build_absolute_uri(url)
+
+
+class ProfileCardSerializer(ValuesSerializer):
+    """ProfileListSerializer と同じ出力（一覧ではIDとバージョンだけを読み、断片は profilecache から引く）"""
+    values = ('id', 'cache_version')
+    fragment_values = (
+        'id', 'user_id', 'user__username', 'display_name', 'age', 'gender', 'location',
+        'avatar', 'avatar_source', 'avatar_thumbnails', 'bio',
+    )
+
+    def fragment(self, row):
+        """キャッシュする断片（ProfileListSerializer と同じく画像は相対 URL）"""
+        return {
+            'id': row['id'],
+            'user_id': row['user_id'],
+            'username': row['user__username'],
+            'display_name': row['display_name'],
+            'age': row['age'],
+            'gender': row['gender'],
+            'location': row['location'],
+            'avatar': stored_avatar_url(row['avatar'], row['avatar_source'], row['avatar_thumbnails']),
+            'bio': row['bio'],
+        }
+
+    def load(self, profile_ids):
+        rows = Profile.objects.filter(id__in=profile_ids).values(*self.fragment_values)
+        return {row['id']: self.fragment(row) for row in rows}
+
+    def fragments(self, versions):
+        """{プロフィールID: バージョン} の断片を {キー: データ} で返す（なかった分だけ1回の問い合わせで読む）"""
+        return profilecache.get_many(versions, self.load)
+
+    def card(self, data):
+        if data is None or not data['avatar']:
+            return data
+        return {**data, 'avatar': self.absolute(data['avatar'])}
+
+    def prefetch(self, rows):
+        self.cards = self.fragments({row['id']: row['cache_version'] for row in rows})
+
+    def serialize(self, rows):
+        # 読んだ後に削除されたプロフィールは一覧から外す
+        return [card for card in super().serialize(rows) if card is not None]
+
+    def row(self, row):
+        return self.card(self.cards.get(profilecache.key(row['id'], row['cache_version'])))
+
+    def by_user(self, user_ids):
+        """ユーザーIDごとのプロフィール（プロフィールがなければ含まない）を返す"""
+        versions = dict(Profile.objects.filter(user_id__in=set(user_ids)).values_list('id', 'cache_version'))
+        return {card['user_id']: self.card(card) for card in self.fragments(versions).values()}
+
+
+class NestedProfilesMixin:
+    """行の profile_user_fields が指すユーザーのプロフィールを、一覧と同じ問い合わせで読んだバージョンで引く"""
+    profile_user_fields = ()
+
+    def columns(self):
+        columns = super().columns()
+        for field in self.profile_user_fields:
+            columns += [f'{field}__profile__id', f'{field}__profile__cache_version']
+        return columns
+
+    def prefetch(self, rows):
+        self.card_serializer = ProfileCardSerializer(self.context)
+        self.cards = self.card_serializer.fragments({
+            row[f'{field}__profile__id']: row[f'{field}__profile__cache_version']
+            for row in rows for field in self.profile_user_fields
+            if row[f'{field}__profile__id'] is not None
+        })
+
+    def profile(self, row, field):
+        """行の field が指すユーザーのプロフィール（なければ None）"""
+        profile_id = row[f'{field}__profile__id']
+        if profile_id is None:
+            return None
+        return self.card_serializer.card(self.cards.get(profilecache.key(profile_id, row[f'{field}__profile__cache_version'])))
+
+
+class LikeValuesSerializer(NestedProfilesMixin, ValuesSerializer):
+    """LikeSerializer と同じ出力（queryset は with_mutual() 済みであること）"""
+    values = ('id', 'from_user', 'to_user', 'mutual', 'created_at')
+    profile_user_fields = ('from_user', 'to_user')
+
+    def row(self, row):
+        return {
+            'id': row['id'],
+            'from_user': row['from_user'],
+            'to_user': row['to_user'],
+            'from_user_profile': self.profile(row, 'from_user'),
+            'to_user_profile': self.profile(row, 'to_user'),
+            'is_mutual': row['mutual'],
+            'created_at': _datetime(row['created_at']),
+        }
+
+
+class MatchValuesSerializer(NestedProfilesMixin, ValuesSerializer):
+    """MatchSerializer と同じ出力"""
+    values = ('id', 'user1', 'user2', 'created_at')
+    profile_user_fields = ('user1', 'user2')
+
+    def row(self, row):
+        return {
+            'id': row['id'],
+            'user1': row['user1'],
+            'user2': row['user2'],
+            'user1_profile': self.profile(row, 'user1'),
+            'user2_profile': self.profile(row, 'user2'),
+            'created_at': _datetime(row['created_at']),
+        }
+
+
+class BlockValuesSerializer(NestedProfilesMixin, ValuesSerializer):
+    """BlockSerializer と同じ出力"""
+    values = ('id', 'blocker', 'blocked', 'blocked__username', 'reason', 'created_at')
+    profile_user_fields = ('blocked',)
+
+    def row(self, row):
+        return {
+            'id': row['id'],
+            'blocker': row['blocker'],
+            'blocked': row['blocked'],
+            'blocked_username': row['blocked__username'],
+            'blocked_profile': self.profile(row, 'blocked'),
+            'reason': row['reason'],
+            'created_at': _datetime(row['created_at']),
+        }
+
+
+class InboxValuesSerializer(NestedProfilesMixin, ValuesSerializer):
+    """InboxSerializer と同じ出力（queryset は last_activity_at・unread_count を注釈済みであること）"""
+    values = (
+        'match_id', 'partner', 'match__last_message_content', 'match__last_message_sender_id',
+        'match__last_message_at', 'last_activity_at', 'unread_count', 'created_at',
+    )
+    profile_user_fields = ('partner',)
+
+    def row(self, row):
+        return {
+            'match_id': row['match_id'],
+            'partner': row['partner'],
+            'partner_profile': self.profile(row, 'partner'),
+            'last_message': row['match__last_message_content'],
+            'last_message_sender': row['match__last_message_sender_id'],
+            'last_message_at': _datetime(row['match__last_message_at']),
+            'last_activity_at': _datetime(row['last_activity_at']),
+            'unread_count': row['unread_count'],
+            'created_at': _datetime(row['created_at']),
+        }
+
+
+class MessageValuesSerializer(ValuesSerializer):
+    """MessageSerializer と同じ出力（queryset は with_read_state() 済みであること）"""
+    values = (
+        'id', 'match', 'sender', 'sender__username', 'sender__profile__display_name',
+        'content', 'recipient_read_id', 'created_at',
+    )
+
+    def row(self, row):
+        display_name = row['sender__profile__display_name']
+        return {
+            'id': row['id'],
+            'match': row['match'],
+            'sender': row['sender'],
+            'sender_username': row['sender__username'],
+            'sender_display_name': display_name if display_name is not None else row['sender__username'],
+            'content': row['content'],
+            'is_read': row['id'] <= row['recipient_read_id'],
+            'created_at': _datetime(row['created_at']),
+        }
+
+
+class FastListMixin:
+    """一覧を fast_serializer_class（ValuesSerializer）で返す ViewSet 用 Mixin
+
+    list アクションは自動で、一覧を返すアクション（いいねの sent / received、受信箱、おすすめなど）は
+    fast_enabled() を確かめて fast_list() を呼ぶ。メッセージの by_match と search は
+    アーカイブから復元したインスタンスを混ぜて返すので対象外（by_match のポーリングは ETag で
+    シリアライズ自体を省く）。
+    """
+    fast_serializer_class = None
+
+    def fast_enabled(self, serializer_class=None):
+        return ENABLED and (serializer_class or self.fast_serializer_class) is not None
+
+    def list(self, request, *args, **kwargs):
+        if not self.fast_enabled():
+            return super().list(request, *args, **kwargs)
+        return self.fast_list(self.filter_queryset(self.get_queryset()))
+
+    def fast_list(self, queryset, serializer_class=None):
+        """queryset を .values() で読み、ページ分を serializer_class（省略時は fast_serializer_class）で返す"""
+        serializer = (serializer_class or self.fast_serializer_class)(self.get_serializer_context())
+        ordering = getattr(self, 'cursor_ordering', None) or getattr(self.paginator, 'ordering', None) or ()
+        if isinstance(ordering, str):
+            ordering = (ordering,)
+        queryset = serializer.queryset(queryset, ordering)
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(serializer.serialize(page))
+        return Response(serializer.serialize(queryset))
@@ -0,0 +1,98 @@
+from django.db.models import Case, When, IntegerField
+from rest_framework import filters
+from rest_framework.exceptions import ValidationError
+
+from . import geo, interests, search
+from .models import Profile
+
+MAX_RADIUS_KM = 500
+MAX_NEAREST = 100
+
+
+def proximity_params(request):
+    """近傍検索のパラメータ (緯度, 経度, 半径km, 件数) を取得
+
+    ?radius=<km> で半径以内、?nearest=<k> で近い順に k 件。
+    中心は ?lat=&lng=、省略時は自分のプロフィールの座標を使う。
+    どちらも指定がなければ None を返す。
+    """
+    params = request.query_params
+    if not params.get('radius') and not params.get('nearest'):
+        return None
+    
+    try:
+        radius = float(params['radius']) if params.get('radius') else None
+        nearest = int(params['nearest']) if params.get('nearest') else None
+        if params.get('lat') and params.get('lng'):
+            latitude, longitude = float(params['lat']), float(params['lng'])
+        else:
+            latitude, longitude = Profile.objects.filter(user=request.user).values_list(
+                'latitude', 'longitude'
+            ).first() or (None, None)
+    except ValueError:
+        raise ValidationError({'error': 'lat, lng, radius and nearest must be numbers'})
+    
+    if latitude is None or longitude is None:
+        raise ValidationError({'error': 'lat and lng are required (your profile has no location)'})
+    if not -90 <= latitude <= 90 or not -180 <= longitude <= 180:
+        raise ValidationError({'error': 'lat or lng is out of range'})
+    if radius is not None and not 0 < radius <= MAX_RADIUS_KM:
+        raise ValidationError({'error': f'radius must be between 0 and {MAX_RADIUS_KM} km'})
+    if nearest is not None and not 0 < nearest <= MAX_NEAREST:
+        raise ValidationError({'error': f'nearest must be between 1 and {MAX_NEAREST}'})
+    return latitude, longitude, radius, nearest
+
+
+def interest_params(request):
+    """?interests= で指定された興味タグ（カンマ区切り）の集合を取得（指定がなければ None）"""
+    names = interests.parse(request.query_params.get('interests', ''))
+    if not names:
+        return None
+    if len(names) > interests.MAX_FILTER_TAGS:
+        raise ValidationError({'error': f'interests accepts at most {interests.MAX_FILTER_TAGS} tags'})
+    return names
+
+
+class InterestFilter(filters.BaseFilterBackend):
+    """興味タグフィルタ（指定したタグをすべて持つプロフィールに絞り込む）"""
+    
+    def filter_queryset(self, request, queryset, view):
+        names = interest_params(request)
+        if names is None:
+            return queryset
+        return interests.filter_profiles(queryset, names)
+
+
+class ProximityFilter(filters.BaseFilterBackend):
+    """近傍検索フィルタ（近い順に並べ替える）"""
+    
+    def filter_queryset(self, request, queryset, view):
+        params = proximity_params(request)
+        if params is None:
+            return queryset
+        
+        latitude, longitude, radius, nearest = params
+        user_ids = [
+            user_id for user_id, distance in geo.nearby(
+                latitude, longitude, radius_km=radius, k=nearest,
+                exclude={request.user.id}, queryset=queryset
+            )
+        ]
+        if not user_ids:
+            return queryset.none()
+        
+        distance_order = Case(
+            *[When(user_id=user_id, then=position) for position, user_id in enumerate(user_ids)],
+            output_field=IntegerField()
+        )
+        return queryset.filter(user_id__in=user_ids).order_by(distance_order)
+
+
+class ProfileSearchFilter(filters.SearchFilter):
+    """全文検索フィルタ（?search= に一致したプロフィールを関連度順に並べる）"""
+    
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '').strip()
+        if not query:
+            return queryset
+        return search.get_backend().search(queryset, query)
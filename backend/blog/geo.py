@@ -0,0 +1,57 @@
+"""
+プロフィールの近傍検索
+
+Profile.geohash の前方一致で中心セルと周囲8セルだけを読み、
+距離は取得した行に対してのみ計算する。
+"""
+from functools import reduce
+from operator import or_
+
+from django.db.models import Q
+
+from . import geohash
+from .models import Profile
+
+KNN_START_PRECISION = 6
+
+
+def _cell_rows(queryset, latitude, longitude, precision):
+    cells = geohash.neighbors(latitude, longitude, precision)
+    condition = reduce(or_, (Q(geohash__startswith=cell) for cell in cells))
+    return queryset.filter(condition).values_list('user_id', 'latitude', 'longitude')
+
+
+def _with_distance(rows, latitude, longitude, exclude):
+    return sorted(
+        (geohash.distance_km(latitude, longitude, lat, lng), user_id)
+        for user_id, lat, lng in rows if user_id not in exclude
+    )
+
+
+def nearby(latitude, longitude, radius_km=None, k=None, exclude=(), queryset=None):
+    """近い順に (ユーザーID, 距離km) の組を返す
+
+    radius_km を指定するとその半径以内、k を指定すると最大 k 件（k近傍）。
+    """
+    if queryset is None:
+        queryset = Profile.objects.all()
+    exclude = set(exclude)
+
+    if radius_km is not None:
+        precision = geohash.precision_for_radius(radius_km, latitude)
+        rows = _cell_rows(queryset, latitude, longitude, precision)
+        found = [
+            (distance, user_id)
+            for distance, user_id in _with_distance(rows, latitude, longitude, exclude)
+            if distance <= radius_km
+        ]
+        return [(user_id, distance) for distance, user_id in found[:k]]
+
+    # k近傍: セルを粗くしながら、確実に覆える範囲に k 件入るまで広げる
+    for precision in range(KNN_START_PRECISION, 0, -1):
+        rows = _cell_rows(queryset, latitude, longitude, precision)
+        found = _with_distance(rows, latitude, longitude, exclude)
+        covered_km = min(geohash.cell_size_km(precision, latitude))
+        if k is not None and sum(1 for distance, _ in found if distance <= covered_km) >= k:
+            break
+    return [(user_id, distance) for distance, user_id in found[:k]]
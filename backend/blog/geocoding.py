@@ -0,0 +1,45 @@
+"""
+同梱の地名テーブル（blog/data/locations.csv）による簡易ジオコーディング
+
+外部APIを使わず、自由記述の居住地を都道府県・主要都市の代表座標に変換する。
+"""
+import csv
+import unicodedata
+from functools import lru_cache
+from pathlib import Path
+
+LOCATIONS_CSV = Path(__file__).resolve().parent / 'data' / 'locations.csv'
+
+
+def normalize(text):
+    """全角・半角や大文字小文字、空白の違いを吸収"""
+    return ''.join(unicodedata.normalize('NFKC', text or '').casefold().split())
+
+
+@lru_cache(maxsize=None)
+def load_table():
+    """地名 → (緯度, 経度) の対応表を読み込む"""
+    with open(LOCATIONS_CSV, encoding='utf-8') as f:
+        return {
+            normalize(row['name']): (float(row['latitude']), float(row['longitude']))
+            for row in csv.DictReader(f)
+        }
+
+
+@lru_cache(maxsize=4096)
+def geocode(location):
+    """居住地の文字列を座標に変換（見つからなければ None）
+
+    完全一致がなければ、文字列に含まれる最も長い地名を使う
+    （例: 「大阪府堺市」→ 大阪府）。
+    """
+    text = normalize(location)
+    if not text:
+        return None
+    table = load_table()
+    if text in table:
+        return table[text]
+    matches = [name for name in table if len(name) >= 2 and name in text]
+    if not matches:
+        return None
+    return table[max(matches, key=len)]
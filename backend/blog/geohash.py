@@ -0,0 +1,81 @@
+"""
+ジオハッシュ（緯度経度を文字列のセルに分割する空間バケット）
+
+同じ接頭辞を持つジオハッシュは同じセルに含まれるため、
+インデックス付きの文字列カラムに対する前方一致で近傍セルだけを読める。
+"""
+import math
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+PRECISION = 9
+EARTH_RADIUS_KM = 6371.0088
+
+
+def encode(latitude, longitude, precision=PRECISION):
+    """緯度経度をジオハッシュに変換"""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bit = 0
+    value = 0
+    even = True
+    while len(chars) < precision:
+        target, coordinate = (lng_range, longitude) if even else (lat_range, latitude)
+        middle = (target[0] + target[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            target[0] = middle
+        else:
+            target[1] = middle
+        even = not even
+        bit += 1
+        if bit == 5:
+            chars.append(BASE32[value])
+            bit = 0
+            value = 0
+    return ''.join(chars)
+
+
+def cell_size_km(precision, latitude=0.0):
+    """指定精度のセルの高さ・幅（km）を返す"""
+    bits = precision * 5
+    lng_bits = (bits + 1) // 2
+    lat_bits = bits // 2
+    height = 180.0 / (2 ** lat_bits) * 110.574
+    width = 360.0 / (2 ** lng_bits) * 111.320 * max(math.cos(math.radians(latitude)), 0.01)
+    return height, width
+
+
+def precision_for_radius(radius_km, latitude=0.0):
+    """半径を覆える（セルの短辺が半径以上になる）最も細かい精度を返す"""
+    for precision in range(PRECISION, 0, -1):
+        if min(cell_size_km(precision, latitude)) >= radius_km:
+            return precision
+    return 1
+
+
+def neighbors(latitude, longitude, precision):
+    """中心セルと周囲8セルのジオハッシュを返す"""
+    height, width = cell_size_km(precision, latitude)
+    lat_step = height / 110.574
+    lng_step = width / (111.320 * max(math.cos(math.radians(latitude)), 0.01))
+    cells = []
+    for lat_offset in (-1, 0, 1):
+        for lng_offset in (-1, 0, 1):
+            lat = min(max(latitude + lat_offset * lat_step, -90.0), 90.0)
+            lng = (longitude + lng_offset * lng_step + 180.0) % 360.0 - 180.0
+            cell = encode(lat, lng, precision)
+            if cell not in cells:
+                cells.append(cell)
+    return cells
+
+
+def distance_km(lat1, lng1, lat2, lng2):
+    """2点間の大円距離（km）"""
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
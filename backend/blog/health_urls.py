@@ -1,6 +1,11 @@
 from django.urls import path
 from django.http import JsonResponse
 from django.db import connection
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+
+from . import profilecache
 
 
 def health_check(request):
@@ -27,9 +32,17 @@ def readiness_check(request):
         }, status=503)
 
 
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def cache_stats(request):
+    """プロフィールキャッシュのヒット数・ミス数（スタッフのみ。プロセス内キャッシュではこのプロセスの分）"""
+    return Response({'profile_fragments': profilecache.stats()})
+
+
 urlpatterns = [
     path('', health_check, name='health'),
     path('ready/', readiness_check, name='readiness'),
+    path('cache/', cache_stats, name='cache-stats'),
 ]
 
 
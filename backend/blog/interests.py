@@ -0,0 +1,86 @@
+"""
+興味タグ
+
+Profile.interests（カンマ区切りの自由入力）を正規化したタグ（Interest）に分け、
+ProfileInterest で結ぶ。タグごとのプロフィール数は Interest.profile_count に持ち、
+プロフィールの保存時（sync）と削除時に、ランキングや検索の索引と同じシグナルで増減させる。
+タグ名は MySQL では utf8mb4_bin で比較する（Python と同じく別の文字列は別のタグになる）。
+タグでの絞り込みは、プロフィール数の少ないタグから (interest, profile) インデックスを
+引く部分問い合わせを重ね、その積集合を DB に取らせる。
+"""
+from django.db import transaction
+from django.db.models import Count, F
+
+from .models import Interest, Profile, ProfileInterest
+from .ranking import parse_interests
+
+MAX_FILTER_TAGS = 10
+FACET_LIMIT = 50
+NAME_LENGTH = Interest._meta.get_field('name').max_length
+
+
+def parse(interests):
+    """カンマ区切りの興味をタグ名の集合に変換（ランキングと同じ正規化）"""
+    # 切り詰めて末尾が空白になった名前は、PAD SPACE の照合順序で空白なしの名前と衝突するので除く
+    return {name[:NAME_LENGTH].rstrip() for name in parse_interests(interests)}
+
+
+def sync(profile):
+    """プロフィールの興味タグを Profile.interests に合わせ、タグごとのプロフィール数を増減させる"""
+    names = parse(profile.interests)
+    with transaction.atomic():
+        # 同じプロフィールの同時更新で二重に数えないよう、プロフィールの行をロックする
+        Profile.objects.select_for_update().filter(pk=profile.pk).first()
+        current = dict(
+            ProfileInterest.objects.filter(profile=profile).values_list('interest__name', 'interest_id')
+        )
+        added = names - current.keys()
+        removed = [interest_id for name, interest_id in current.items() if name not in names]
+        if added:
+            Interest.objects.bulk_create([Interest(name=name) for name in added], ignore_conflicts=True)
+            added_ids = list(Interest.objects.filter(name__in=added).values_list('id', flat=True))
+            ProfileInterest.objects.bulk_create([
+                ProfileInterest(profile=profile, interest_id=interest_id) for interest_id in added_ids
+            ])
+            Interest.objects.filter(id__in=added_ids).update(profile_count=F('profile_count') + 1)
+        if removed:
+            ProfileInterest.objects.filter(profile=profile, interest_id__in=removed).delete()
+            Interest.objects.filter(id__in=removed).update(profile_count=F('profile_count') - 1)
+
+
+def profile_deleted(profile):
+    """削除されるプロフィールのタグのプロフィール数を減らす（対応はカスケードで消える）"""
+    Interest.objects.filter(profile_links__profile=profile).update(profile_count=F('profile_count') - 1)
+
+
+def filter_profiles(queryset, names):
+    """指定したタグをすべて持つプロフィールに絞り込む（存在しないタグがあれば空）"""
+    interest_ids = list(
+        Interest.objects.filter(name__in=names).order_by('profile_count').values_list('id', flat=True)
+    )
+    if len(interest_ids) < len(names):
+        return queryset.none()
+    for interest_id in interest_ids:
+        queryset = queryset.filter(
+            id__in=ProfileInterest.objects.filter(interest_id=interest_id).values('profile_id')
+        )
+    return queryset
+
+
+def facets(names=None, prefix=None, limit=FACET_LIMIT):
+    """タグとプロフィール数を多い順に返す
+
+    names を指定すると、それらのタグをすべて持つプロフィールの中で
+    一緒に付いているタグを数える（事前集計ではなくその場で数える）。
+    """
+    if names:
+        profiles = filter_profiles(Profile.objects.all(), names)
+        tags = Interest.objects.filter(profile_links__profile__in=profiles.values('id')).exclude(
+            name__in=names
+        ).annotate(count=Count('profile_links'))
+    else:
+        tags = Interest.objects.filter(profile_count__gt=0).annotate(count=F('profile_count'))
+    if prefix:
+        prefix = prefix.strip().casefold()
+        tags = tags.filter(name__startswith=prefix)
+    return list(tags.order_by('-count', 'name').values('name', 'count')[:limit])
@@ -0,0 +1,41 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from blog.messagearchive import CHUNK_SIZE, archive_match
+from blog.models import Match
+
+
+class Command(BaseCommand):
+    """古いメッセージを圧縮チャンクに移すコマンド"""
+    help = '保持期間を過ぎた既読メッセージをマッチングごとの圧縮チャンク（MessageChunk）に移します'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.MESSAGE_RETENTION_DAYS, help='Message テーブルに残す日数')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='1チャンクのメッセージ数')
+        parser.add_argument('--batch-size', type=int, default=500, help='一度に読み込むマッチング数')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        archived = 0
+        matches = 0
+        last_id = 0
+        while True:
+            match_ids = list(
+                Match.objects.filter(id__gt=last_id, deleted_at__isnull=True).order_by('id').values_list(
+                    'id', flat=True
+                )[:options['batch_size']]
+            )
+            if not match_ids:
+                break
+            for match_id in match_ids:
+                count = archive_match(match_id, cutoff, options['chunk_size'])
+                if count:
+                    archived += count
+                    matches += 1
+            last_id = match_ids[-1]
+            self.stdout.write(f'{archived} messages archived (up to match {last_id})')
+
+        self.stdout.write(self.style.SUCCESS(f'Archived {archived} messages from {matches} matches'))
@@ -0,0 +1,78 @@
+import csv
+import gzip
+from collections import defaultdict
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from blog.models import SwipeEvent, SwipeArchive
+from blog.swipelog import encode_ids, decode_ids
+
+
+class Command(BaseCommand):
+    """古いスワイプイベントを圧縮ファイルに移して削除するコマンド"""
+    help = '保持期間を過ぎたスワイプイベントを gzip 圧縮した CSV にアーカイブします'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.SWIPE_EVENT_RETENTION_DAYS, help='保持する日数')
+        parser.add_argument('--batch-size', type=int, default=5000, help='一度に移すイベント数')
+        parser.add_argument('--output-dir', default=settings.SWIPE_ARCHIVE_DIR, help='アーカイブの出力先')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        output_dir = Path(options['output_dir'])
+        output_dir.mkdir(parents=True, exist_ok=True)
+        path = output_dir / f'swipe_events_{timezone.now():%Y%m%d%H%M%S}.csv.gz'
+
+        archived = 0
+        with gzip.open(path, 'wt', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['id', 'actor_id', 'target_id', 'action', 'created_at'])
+            while True:
+                rows = list(
+                    SwipeEvent.objects.filter(created_at__lt=cutoff).order_by('id').values_list(
+                        'id', 'actor_id', 'target_id', 'action', 'created_at'
+                    )[:options['batch_size']]
+                )
+                if not rows:
+                    break
+
+                # 先にファイルへ書き出してから削除する（途中で落ちても再実行で続きから移せる）
+                writer.writerows(
+                    (event_id, actor_id, target_id, action, int(created_at.timestamp()))
+                    for event_id, actor_id, target_id, action, created_at in rows
+                )
+                f.flush()
+
+                passed = defaultdict(set)
+                for event_id, actor_id, target_id, action, created_at in rows:
+                    if action == SwipeEvent.PASS:
+                        passed[actor_id].add(target_id)
+
+                with transaction.atomic():
+                    self.merge_passed(passed)
+                    SwipeEvent.objects.filter(id__in=[row[0] for row in rows]).delete()
+
+                archived += len(rows)
+                self.stdout.write(f'{archived} events archived')
+
+        if not archived:
+            path.unlink()
+            self.stdout.write('No events to archive')
+            return
+        self.stdout.write(self.style.SUCCESS(f'Archived {archived} events to {path}'))
+
+    def merge_passed(self, passed):
+        """パスした相手をユーザーごとの圧縮集合に統合"""
+        archives = {
+            archive.user_id: archive
+            for archive in SwipeArchive.objects.select_for_update().filter(user_id__in=passed)
+        }
+        for user_id, target_ids in passed.items():
+            archive = archives.get(user_id) or SwipeArchive(user_id=user_id)
+            archive.passed_targets = encode_ids(decode_ids(archive.passed_targets) | target_ids)
+            archive.save()
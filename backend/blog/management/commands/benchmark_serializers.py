@@ -0,0 +1,83 @@
+import json
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from blog.fastserializers import LikeValuesSerializer, MessageValuesSerializer, ProfileCardSerializer
+from blog.models import Profile, Like, Match, Message
+from blog.serializers import LikeSerializer, MessageSerializer, ProfileListSerializer
+
+
+class Command(BaseCommand):
+    """一覧のシリアライズを通常のシリアライザと高速シリアライザで比較するベンチマーク"""
+    help = (
+        'プロフィール・いいね・メッセージの一覧を ModelSerializer と .values() の高速シリアライザで'
+        'シリアライズする時間（問い合わせ込み）を比較します（一時データを作成し、最後にロールバックします）'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[10, 100, 1000], help='一覧の件数（複数指定可）')
+        parser.add_argument('--repeat', type=int, default=5, help='件数ごとの計測回数（中央値を表示）')
+
+    def handle(self, *args, **options):
+        rows = sorted(options['rows'])
+        with transaction.atomic():
+            viewer = self.create_data(rows[-1])
+            likes = Like.objects.filter(to_user=viewer).select_related(
+                'from_user', 'to_user', 'from_user__profile', 'to_user__profile'
+            ).with_mutual().order_by('-created_at')
+            messages = Message.objects.filter(match__members__user=viewer).select_related(
+                'match', 'sender', 'sender__profile'
+            ).with_read_state().order_by('created_at')
+            profiles = Profile.objects.select_related('user').order_by('id')
+            cases = [
+                ('profiles', profiles, ProfileListSerializer, ProfileCardSerializer),
+                ('likes', likes, LikeSerializer, LikeValuesSerializer),
+                ('messages', messages, MessageSerializer, MessageValuesSerializer),
+            ]
+            for name, queryset, serializer_class, fast_serializer_class in cases:
+                for n in rows:
+                    current = self.measure(
+                        lambda: serializer_class(list(queryset[:n]), many=True).data, options['repeat']
+                    )
+                    fast_queryset = fast_serializer_class().queryset(queryset)
+                    fast = self.measure(
+                        lambda: fast_serializer_class().serialize(fast_queryset[:n]), options['repeat']
+                    )
+                    same = json.dumps(current[1]) == json.dumps(fast[1])
+                    self.stdout.write(
+                        f'{name:<9} {n:>5} rows: serializer {current[0]:8.2f}ms  '
+                        f'fast {fast[0]:8.2f}ms  x{current[0] / fast[0]:5.1f}  '
+                        f'{"same output" if same else "OUTPUT DIFFERS"}'
+                    )
+            transaction.set_rollback(True)
+        self.stdout.write(self.style.SUCCESS('Benchmark finished (temporary data rolled back)'))
+
+    def measure(self, serialize, repeat):
+        """中央値（ミリ秒）と最後の出力を返す"""
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            data = serialize()
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings), data
+
+    def create_data(self, count):
+        """count 人のユーザーから viewer へのいいねと、count 件のメッセージを作成"""
+        prefix = f'bench-{time.time_ns()}'
+        viewer = User.objects.create(username=f'{prefix}-viewer')
+        users = User.objects.bulk_create([User(username=f'{prefix}-{i}') for i in range(count)])
+        Profile.objects.bulk_create([
+            Profile(user=user, display_name=f'Bench {i}', age=20 + i % 30, location='東京', bio='ベンチマーク用')
+            for i, user in enumerate(users)
+        ])
+        Like.objects.bulk_create([Like(from_user=user, to_user=viewer) for user in users])
+        match, created = Match.create_match(viewer, users[0])
+        Message.objects.bulk_create([
+            Message(match=match, sender=viewer if i % 2 else users[0], content=f'message {i}')
+            for i in range(count)
+        ])
+        return viewer
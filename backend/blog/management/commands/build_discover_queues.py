@@ -0,0 +1,33 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from blog.discover import QUEUE_SIZE, refill_queue
+
+
+class Command(BaseCommand):
+    """全ユーザーのおすすめ候補キューを補充するコマンド（定期実行用）"""
+    help = 'おすすめ候補キューをバックグラウンドで構築・補充します'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=QUEUE_SIZE, help='ユーザーごとのキュー件数')
+        parser.add_argument('--batch-size', type=int, default=500, help='一度に読み込むユーザー数')
+        parser.add_argument('--user', type=int, action='append', dest='user_ids', help='対象ユーザーID（複数指定可）')
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(is_active=True, profile__isnull=False).order_by('id')
+        if options['user_ids']:
+            users = users.filter(id__in=options['user_ids'])
+
+        processed = 0
+        last_id = 0
+        while True:
+            batch = list(users.filter(id__gt=last_id)[:options['batch_size']])
+            if not batch:
+                break
+            for user in batch:
+                refill_queue(user, options['size'])
+            processed += len(batch)
+            last_id = batch[-1].id
+            self.stdout.write(f'{processed} users processed')
+
+        self.stdout.write(self.style.SUCCESS(f'Discover queues refilled for {processed} users'))
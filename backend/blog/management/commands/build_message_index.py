@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from blog.messagearchive import decode_messages
+from blog.messagesearch import rebuild
+from blog.models import Message, MessageChunk
+
+
+class Command(BaseCommand):
+    """メッセージ検索の索引を作り直すコマンド（導入時・不整合時用）"""
+    help = 'Message とアーカイブ済みチャンクのメッセージ検索索引（MessageTerm）を作り直します'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000, help='一度に読み込むメッセージ数')
+
+    def handle(self, *args, **options):
+        indexed = 0
+        last_id = 0
+        while True:
+            batch = list(
+                Message.objects.filter(id__gt=last_id).order_by('id').only('id', 'match_id', 'content')[
+                    :options['batch_size']
+                ]
+            )
+            if not batch:
+                break
+            rebuild(batch)
+            indexed += len(batch)
+            last_id = batch[-1].id
+            self.stdout.write(f'{indexed} messages indexed')
+
+        for chunk in MessageChunk.objects.order_by('id').iterator(chunk_size=16):
+            messages = decode_messages(chunk.match_id, chunk.data)
+            rebuild(messages)
+            indexed += len(messages)
+            self.stdout.write(f'{indexed} messages indexed (archive chunk {chunk.id})')
+
+        self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} messages'))
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+
+from blog.geocoding import geocode
+from blog.geohash import encode as encode_geohash
+from blog.models import Profile
+
+
+class Command(BaseCommand):
+    """自由記述の居住地から座標を一括設定するコマンド"""
+    help = '同梱の地名テーブルを使って既存プロフィールの居住地をジオコーディングします'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='一度に更新するプロフィール数')
+        parser.add_argument('--overwrite', action='store_true', help='座標設定済みのプロフィールも更新する')
+
+    def handle(self, *args, **options):
+        profiles = Profile.objects.exclude(location='').order_by('id')
+        if not options['overwrite']:
+            profiles = profiles.filter(latitude__isnull=True)
+
+        geocoded = 0
+        unresolved = 0
+        last_id = 0
+        while True:
+            batch = list(
+                profiles.filter(id__gt=last_id).only('id', 'location', 'latitude', 'longitude', 'geohash')[:options['batch_size']]
+            )
+            if not batch:
+                break
+
+            updated = []
+            for profile in batch:
+                coordinates = geocode(profile.location)
+                if coordinates is None:
+                    unresolved += 1
+                    continue
+                profile.latitude, profile.longitude = coordinates
+                profile.geohash = encode_geohash(*coordinates)
+                updated.append(profile)
+
+            Profile.objects.bulk_update(updated, ['latitude', 'longitude', 'geohash'])
+            geocoded += len(updated)
+            last_id = batch[-1].id
+            self.stdout.write(f'{geocoded} geocoded, {unresolved} unresolved')
+
+        self.stdout.write(self.style.SUCCESS(f'Geocoded {geocoded} profiles ({unresolved} unresolved)'))
@@ -0,0 +1,95 @@
+import asyncio
+import time
+from urllib.parse import urlsplit
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework_simplejwt.tokens import AccessToken
+
+
+class Command(BaseCommand):
+    """リアルタイム配信（SSE）に多数の待機接続を張る負荷試験コマンド"""
+    help = '/api/blog/events/ に指定数の接続を張って保持し、接続成功数と受信数を表示します（ASGI サーバーを起動しておくこと）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000/api/blog/events/', help='SSE エンドポイントの URL')
+        parser.add_argument('--connections', type=int, default=2000, help='張る接続数')
+        parser.add_argument('--duration', type=float, default=60.0, help='接続を保持する秒数')
+        parser.add_argument('--ramp', type=int, default=500, help='1秒あたりに張る接続数')
+        parser.add_argument('--username', required=True, help='トークンを発行するユーザー名')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f"User {options['username']} not found")
+        token = str(AccessToken.for_user(user))
+
+        url = urlsplit(options['url'])
+        if url.scheme != 'http':
+            raise CommandError('Only http:// URLs are supported')
+        self.host = url.hostname
+        self.port = url.port or 80
+        self.request = (
+            f'GET {url.path}?token={token} HTTP/1.1\r\n'
+            f'Host: {url.netloc}\r\nAccept: text/event-stream\r\n\r\n'
+        ).encode()
+        self.stats = {'connected': 0, 'failed': 0, 'closed': 0, 'events': 0, 'pings': 0}
+        self.latencies = []
+
+        asyncio.run(self.run(options['connections'], options['duration'], options['ramp']))
+
+        latencies = sorted(self.latencies)
+        p50 = latencies[len(latencies) // 2] * 1000 if latencies else 0
+        p99 = latencies[int(len(latencies) * 0.99)] * 1000 if latencies else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"connected {self.stats['connected']}/{options['connections']} "
+            f"(failed {self.stats['failed']}, closed early {self.stats['closed']}), "
+            f"first byte p50 {p50:.1f}ms p99 {p99:.1f}ms, "
+            f"events {self.stats['events']}, pings {self.stats['pings']}"
+        ))
+
+    async def run(self, connections, duration, ramp):
+        deadline = time.monotonic() + duration
+        tasks = []
+        for i in range(connections):
+            tasks.append(asyncio.create_task(self.hold(deadline)))
+            if ramp and (i + 1) % ramp == 0:
+                await asyncio.sleep(1)
+        await asyncio.gather(*tasks)
+
+    async def hold(self, deadline):
+        """接続を張り、期限まで SSE を読み続ける"""
+        started = time.monotonic()
+        try:
+            reader, writer = await asyncio.open_connection(self.host, self.port)
+            writer.write(self.request)
+            await writer.drain()
+            status_line = await reader.readline()
+        except OSError:
+            self.stats['failed'] += 1
+            return
+        if b' 200 ' not in status_line:
+            self.stats['failed'] += 1
+            writer.close()
+            return
+        self.stats['connected'] += 1
+        self.latencies.append(time.monotonic() - started)
+
+        try:
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                line = await asyncio.wait_for(reader.readline(), remaining)
+                if not line:
+                    self.stats['closed'] += 1
+                    break
+                if line.startswith(b'event:'):
+                    self.stats['events'] += 1
+                elif line.startswith(b': ping'):
+                    self.stats['pings'] += 1
+        except (asyncio.TimeoutError, OSError):
+            pass
+        finally:
+            writer.close()
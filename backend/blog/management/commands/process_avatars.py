@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from blog.avatars import pending_profiles, process
+
+
+class Command(BaseCommand):
+    """プロフィール画像の縮小版を作るコマンド"""
+    help = '縮小版がない（または画像が差し替えられた）プロフィール画像を縮小して保存します（--loop で常駐）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help='一度に読み込むプロフィール数')
+        parser.add_argument('--loop', action='store_true', help='処理するものがなくなっても終了せずに待機する')
+        parser.add_argument('--sleep', type=float, default=5.0, help='--loop 時の待機秒数')
+
+    def handle(self, *args, **options):
+        processed = 0
+        failed = 0
+        while True:
+            # 作成待ちの (avatar_pending, id) インデックスを先頭から batch_size 件だけ読む（処理済みは外れる）
+            batch = list(pending_profiles().order_by('id')[:options['batch_size']])
+            if not batch:
+                if not options['loop']:
+                    break
+                time.sleep(options['sleep'])
+                continue
+            for profile in batch:
+                if process(profile):
+                    processed += 1
+                else:
+                    failed += 1
+                    self.stderr.write(f'Could not process avatar of profile {profile.id}: {profile.avatar.name}')
+            self.stdout.write(f'{processed} avatars processed')
+
+        self.stdout.write(self.style.SUCCESS(f'Processed {processed} avatars ({failed} failed)'))
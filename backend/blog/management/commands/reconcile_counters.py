@@ -0,0 +1,29 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from blog.counters import rebuild
+
+
+class Command(BaseCommand):
+    """ユーザーごとの集計値を実データから数え直すコマンド"""
+    help = 'いいね・マッチング・未読メッセージ数の集計値を一括で再計算し、ずれを修正します'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='一度に再計算するユーザー数')
+
+    def handle(self, *args, **options):
+        processed = 0
+        drifted = 0
+        last_id = 0
+        while True:
+            user_ids = list(
+                User.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:options['batch_size']]
+            )
+            if not user_ids:
+                break
+            drifted += rebuild(user_ids)
+            processed += len(user_ids)
+            last_id = user_ids[-1]
+            self.stdout.write(f'{processed} users processed, {drifted} drifted')
+
+        self.stdout.write(self.style.SUCCESS(f'Reconciled counters for {processed} users ({drifted} fixed)'))
@@ -0,0 +1,57 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Sum
+
+from blog.models import PurgeJob
+from blog.purge import BATCH_SIZE, claim_job, run_job
+
+
+class Command(BaseCommand):
+    """マッチング解除・退会に伴う削除ジョブを処理するコマンド"""
+    help = '積まれた削除ジョブを一定件数ずつ処理します（--loop で常駐）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='1トランザクションで削除する行数')
+        parser.add_argument('--max-jobs', type=int, default=None, help='処理するジョブ数の上限')
+        parser.add_argument('--loop', action='store_true', help='ジョブがなくなっても終了せずに待機する')
+        parser.add_argument('--sleep', type=float, default=5.0, help='--loop 時の待機秒数')
+        parser.add_argument('--status', action='store_true', help='ジョブの状態ごとの件数と削除行数を表示して終了')
+
+    def handle(self, *args, **options):
+        if options['status']:
+            self.show_status()
+            return
+
+        processed = 0
+        while options['max_jobs'] is None or processed < options['max_jobs']:
+            job = claim_job()
+            if job is None:
+                if not options['loop']:
+                    break
+                time.sleep(options['sleep'])
+                continue
+
+            started = time.monotonic()
+            try:
+                run_job(job, options['batch_size'])
+            except Exception as e:
+                self.stderr.write(f'{job} failed (attempt {job.attempts}): {e}')
+            else:
+                self.stdout.write(
+                    f'{job}: {job.deleted_rows} rows in {job.batches} batches '
+                    f'({time.monotonic() - started:.1f}s)'
+                )
+            processed += 1
+
+        self.stdout.write(self.style.SUCCESS(f'Processed {processed} jobs'))
+
+    def show_status(self):
+        """状態ごとのジョブ数・バッチ数・削除行数を表示"""
+        rows = PurgeJob.objects.order_by().values('status').annotate(
+            jobs=Count('id'), batches=Sum('batches'), deleted_rows=Sum('deleted_rows')
+        )
+        for row in rows:
+            self.stdout.write(
+                f"{row['status']}: {row['jobs']} jobs, {row['batches']} batches, {row['deleted_rows']} rows"
+            )
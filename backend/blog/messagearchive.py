@@ -0,0 +1,140 @@
+"""
+メッセージのコールドアーカイブ
+
+Message テーブル（と (match, created_at) インデックス）をメモリに収まる
+大きさに保つため、古いメッセージを archive_messages コマンドでマッチングごとの
+圧縮チャンク（MessageChunk）に移す。移すのはマッチングの先頭から連続する
+「保持期間を過ぎていて受信者が既読」のメッセージだけなので、
+アーカイブは常に Message に残っているメッセージより古い。
+by_match はどのモードでも Message に残っている範囲を越えると
+チャンクから透過的に読み出す。
+"""
+import json
+import zlib
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Max, Min
+
+from .models import Message, MessageChunk
+
+CHUNK_SIZE = getattr(settings, 'MESSAGE_CHUNK_SIZE', 500)
+
+
+def encode_messages(messages):
+    """(ID, 送信者ID, 本文, 送信日時) の列を zlib 圧縮した JSON に変換"""
+    rows = [
+        [message_id, sender_id, content, created_at.timestamp()]
+        for message_id, sender_id, content, created_at in messages
+    ]
+    return zlib.compress(json.dumps(rows, ensure_ascii=False).encode('utf-8'))
+
+
+def decode_messages(match_id, data):
+    """encode_messages() で圧縮したメッセージを（未保存の）Message として復元"""
+    return [
+        Message(
+            id=message_id, match_id=match_id, sender_id=sender_id, content=content,
+            created_at=datetime.fromtimestamp(timestamp, tz=dt_timezone.utc)
+        )
+        for message_id, sender_id, content, timestamp in json.loads(zlib.decompress(bytes(data)))
+    ]
+
+
+def archivable_until(match_id, cutoff):
+    """アーカイブしてよい最大のメッセージID（なければ 0）
+
+    保持期間を過ぎたメッセージのうち、最初の未読メッセージより前までに限る。
+    """
+    messages = Message.objects.filter(match_id=match_id)
+    last_old_id = messages.filter(created_at__lt=cutoff).aggregate(last_id=Max('id'))['last_id']
+    if last_old_id is None:
+        return 0
+    first_unread_id = messages.unread().filter(id__lte=last_old_id).aggregate(first_id=Min('id'))['first_id']
+    if first_unread_id is not None:
+        return first_unread_id - 1
+    return last_old_id
+
+
+def archive_match(match_id, cutoff, chunk_size=CHUNK_SIZE):
+    """マッチングの古いメッセージをチャンクに移し、移した件数を返す"""
+    until_id = archivable_until(match_id, cutoff)
+    archived = 0
+    while until_id:
+        rows = list(
+            Message.objects.filter(match_id=match_id, id__lte=until_id).order_by('id').values_list(
+                'id', 'sender_id', 'content', 'created_at'
+            )[:chunk_size]
+        )
+        if not rows:
+            break
+        with transaction.atomic():
+            MessageChunk.objects.create(
+                match_id=match_id,
+                first_message_id=rows[0][0],
+                last_message_id=rows[-1][0],
+                message_count=len(rows),
+                data=encode_messages(rows),
+            )
+            Message.objects.filter(id__in=[row[0] for row in rows]).delete()
+        archived += len(rows)
+    return archived
+
+
+def _attach(messages, match):
+    """復元したメッセージに送信者・既読状態を付ける（シリアライズ用）"""
+    if not messages:
+        return messages
+    users = User.objects.select_related('profile').in_bulk({message.sender_id for message in messages})
+    read_ids = {
+        member.partner_id: member.last_read_message_id for member in match.members.all()
+    }
+    for message in messages:
+        message.match = match
+        message.sender = users.get(message.sender_id)
+        # アーカイブするのは既読のメッセージだけ（参加者が解除済みなどで行がなくても既読とみなす）
+        message.recipient_read_id = read_ids.get(message.sender_id, message.id)
+    return messages
+
+
+def find(match, message_id):
+    """アーカイブからメッセージを1件探す（なければ None）"""
+    chunk = MessageChunk.objects.filter(
+        match=match, first_message_id__lte=message_id, last_message_id__gte=message_id
+    ).first()
+    if chunk is None:
+        return None
+    for message in decode_messages(match.id, chunk.data):
+        if message.id == message_id:
+            return _attach([message], match)[0]
+    return None
+
+
+def before(match, message_id, limit):
+    """message_id より古い（None なら最新からの）アーカイブ済みメッセージを新しい順に最大 limit 件返す"""
+    found = []
+    chunks = MessageChunk.objects.filter(match=match).order_by('-last_message_id')
+    if message_id is not None:
+        chunks = chunks.filter(first_message_id__lt=message_id)
+    for chunk in chunks.iterator(chunk_size=4):
+        messages = [
+            message for message in decode_messages(match.id, chunk.data)
+            if message_id is None or message.id < message_id
+        ]
+        found.extend(reversed(messages))
+        if len(found) >= limit:
+            break
+    return _attach(found[:limit], match)
+
+
+def after(match, message_id, limit):
+    """message_id より新しいアーカイブ済みメッセージを古い順に最大 limit 件返す"""
+    found = []
+    chunks = MessageChunk.objects.filter(match=match, last_message_id__gt=message_id).order_by('last_message_id')
+    for chunk in chunks.iterator(chunk_size=4):
+        found.extend(message for message in decode_messages(match.id, chunk.data) if message.id > message_id)
+        if len(found) >= limit:
+            break
+    return _attach(found[:limit], match)
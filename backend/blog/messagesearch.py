@@ -0,0 +1,143 @@
+"""
+自分の会話内のメッセージ検索
+
+メッセージ本文を n-gram（search.ngrams と同じバイグラム）に分割して
+MessageTerm に保存し、検索語の n-gram の転置リストを (gram, match, message_id) の
+インデックスで自分のマッチングに絞って引き、GROUP BY / HAVING で積集合を取る。
+候補は新しい順に少しずつ読むので、古いメッセージが切り捨てられることはない。
+本文は候補を確認するときだけ読み、Message.content を走査しない。
+1回の検索で確認する候補は MAX_CANDIDATES 件までで、打ち切った場合も
+has_more と続きの before_id（next_before_id）を返す。
+索引はメッセージの作成・編集時に作り直し、削除時（メッセージ削除・マッチングの削除ジョブ）に
+取り除く。アーカイブ済みのメッセージは索引に残り、本文はチャンクから読む。
+"""
+from collections import namedtuple
+
+from django.db import transaction
+from django.db.models import Count
+
+from . import blocks, messagearchive
+from .models import MatchMember, Message, MessageChunk, MessageTerm
+from .search import NGRAM_SIZE, ngrams, normalize, split_terms
+
+MAX_CANDIDATES = 5000
+
+SearchResult = namedtuple('SearchResult', ['messages', 'has_more', 'next_before_id'])
+
+
+class QueryTooShort(ValueError):
+    pass
+
+
+def index_message(message):
+    """メッセージを索引に追加"""
+    MessageTerm.objects.bulk_create([
+        MessageTerm(gram=gram, match_id=message.match_id, message_id=message.id)
+        for gram in set(ngrams(message.content))
+    ])
+
+
+def index_messages(messages):
+    """メッセージをまとめて索引に追加（build_message_index 用）"""
+    MessageTerm.objects.bulk_create([
+        MessageTerm(gram=gram, match_id=message.match_id, message_id=message.id)
+        for message in messages
+        for gram in set(ngrams(message.content))
+    ], batch_size=5000)
+
+
+def unindex_messages(message_ids):
+    """メッセージを索引から外す"""
+    MessageTerm.objects.filter(message_id__in=list(message_ids)).delete()
+
+
+def _candidate_ids(grams, match_ids, before_id, limit):
+    """すべての n-gram を含むメッセージIDを新しい順に最大 limit 件返す（転置リストの積集合を DB で取る）"""
+    postings = MessageTerm.objects.filter(gram__in=grams, match_id__in=match_ids)
+    if before_id is not None:
+        postings = postings.filter(message_id__lt=before_id)
+    return list(
+        postings.values('message_id')
+        .annotate(gram_count=Count('gram', distinct=True))
+        .filter(gram_count=len(grams))
+        .order_by('-message_id')
+        .values_list('message_id', flat=True)[:limit]
+    )
+
+
+def _archived(message_ids, matches):
+    """アーカイブ済みの候補メッセージをチャンクから読む"""
+    found = []
+    chunks = MessageChunk.objects.filter(
+        match_id__in=list(matches), first_message_id__lte=max(message_ids), last_message_id__gte=min(message_ids)
+    )
+    for chunk in chunks.iterator(chunk_size=4):
+        messages = [
+            message for message in messagearchive.decode_messages(chunk.match_id, chunk.data)
+            if message.id in message_ids
+        ]
+        if messages:
+            found.extend(messagearchive._attach(messages, matches[chunk.match_id]))
+    return found
+
+
+def search(user, query, match_id=None, before_id=None, limit=20):
+    """自分のマッチングのメッセージからすべての検索語を含むものを新しい順に返す
+
+    SearchResult(メッセージのリスト, 続きがあるか, 続きを読むときの before_id) を返す。
+    before_id を指定するとそれより古いものだけ。検索語が n-gram より短いと QueryTooShort。
+    """
+    terms = split_terms(query)
+    if not terms or any(len(term) < NGRAM_SIZE for term in terms):
+        raise QueryTooShort(f'Each search term must be at least {NGRAM_SIZE} characters')
+
+    # ブロック関係にある相手との会話は検索しない
+    members = MatchMember.objects.filter(user=user).exclude(partner__in=blocks.blocked_user_ids(user.id))
+    if match_id is not None:
+        members = members.filter(match_id=match_id)
+    matches = {member.match_id: member.match for member in members.select_related('match')}
+    if not matches:
+        return SearchResult([], False, None)
+
+    grams = list(set(ngrams(' '.join(terms))))
+    hot = Message.objects.filter(match_id__in=list(matches)).select_related(
+        'match', 'sender', 'sender__profile'
+    ).with_read_state()
+
+    # n-gram の一致だけでは語順が保証されないので本文で確認し、新しい順に limit + 1 件まで集める
+    results = []
+    scanned = 0
+    cursor = before_id
+    batch_size = limit * 4
+    while len(results) <= limit:
+        if scanned >= MAX_CANDIDATES:
+            # 確認した最後の候補の続きから読めるようにして打ち切る
+            return SearchResult(results[:limit], True, cursor)
+        batch = _candidate_ids(grams, list(matches), cursor, batch_size)
+        if not batch:
+            break
+        scanned += len(batch)
+        found = {message.id: message for message in hot.filter(id__in=batch)}
+        missing = set(batch) - set(found)
+        if missing:
+            found.update((message.id, message) for message in _archived(missing, matches))
+        for message_id in batch:
+            message = found.get(message_id)
+            if message is not None and all(term in normalize(message.content) for term in terms):
+                results.append(message)
+                if len(results) > limit:
+                    break
+            cursor = message_id
+        if len(batch) < batch_size:
+            break
+
+    if len(results) > limit:
+        return SearchResult(results[:limit], True, results[limit - 1].id)
+    return SearchResult(results, False, None)
+
+
+@transaction.atomic
+def rebuild(messages):
+    """メッセージの索引を作り直す"""
+    unindex_messages([message.id for message in messages])
+    index_messages(messages)
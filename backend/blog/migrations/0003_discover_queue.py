@@ -0,0 +1,45 @@
+# Generated by Django 5.0.1 on 2026-10-18 01:27
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0002_block'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DiscoverQueue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_profile_id', models.PositiveBigIntegerField(default=0, verbose_name='走査済みプロフィールID')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新日時')),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='discover_queue', to=settings.AUTH_USER_MODEL, verbose_name='ユーザー')),
+            ],
+            options={
+                'verbose_name': 'おすすめ候補キュー',
+                'verbose_name_plural': 'おすすめ候補キュー',
+            },
+        ),
+        migrations.CreateModel(
+            name='DiscoverCandidate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='作成日時')),
+                ('candidate', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='候補ユーザー')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='discover_candidates', to=settings.AUTH_USER_MODEL, verbose_name='ユーザー')),
+            ],
+            options={
+                'verbose_name': 'おすすめ候補',
+                'verbose_name_plural': 'おすすめ候補',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['user', 'id'], name='blog_discov_user_id_221578_idx')],
+                'unique_together': {('user', 'candidate')},
+            },
+        ),
+    ]
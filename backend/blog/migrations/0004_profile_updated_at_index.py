@@ -0,0 +1,19 @@
+# Generated by Django 5.0.1 on 2026-10-18 01:32
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0003_discover_queue'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='profile',
+            index=models.Index(fields=['updated_at'], name='blog_profil_updated_00132f_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+from django.db import migrations
+
+FULLTEXT_INDEX_NAME = 'blog_profile_fulltext'
+
+
+def create_fulltext_index(apps, schema_editor):
+    """MySQL の場合のみ ngram パーサー付きの FULLTEXT インデックスを作成"""
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    schema_editor.execute(
+        f'CREATE FULLTEXT INDEX {FULLTEXT_INDEX_NAME} '
+        'ON blog_profile (display_name, bio, interests, location) WITH PARSER ngram'
+    )
+
+
+def drop_fulltext_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    schema_editor.execute(f'DROP INDEX {FULLTEXT_INDEX_NAME} ON blog_profile')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0005_profile_coordinates'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fulltext_index, drop_fulltext_index),
+    ]
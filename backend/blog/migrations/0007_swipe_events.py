@@ -0,0 +1,44 @@
+# Generated by Django 5.0.1 on 2026-10-18 01:39
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0006_profile_fulltext_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SwipeArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('passed_targets', models.BinaryField(default=b'', verbose_name='パス済みユーザーID（圧縮）')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新日時')),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='swipe_archive', to=settings.AUTH_USER_MODEL, verbose_name='ユーザー')),
+            ],
+            options={
+                'verbose_name': 'スワイプアーカイブ',
+                'verbose_name_plural': 'スワイプアーカイブ',
+            },
+        ),
+        migrations.CreateModel(
+            name='SwipeEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('action', models.PositiveSmallIntegerField(choices=[(1, 'いいね'), (2, 'パス')], verbose_name='操作')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='日時')),
+                ('actor', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='操作したユーザー')),
+                ('target', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='相手')),
+            ],
+            options={
+                'verbose_name': 'スワイプイベント',
+                'verbose_name_plural': 'スワイプイベント',
+                'indexes': [models.Index(fields=['actor', 'target'], name='blog_swipee_actor_i_b21137_idx'), models.Index(fields=['created_at'], name='blog_swipee_created_9fb78b_idx')],
+            },
+        ),
+    ]
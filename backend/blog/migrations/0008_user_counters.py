@@ -0,0 +1,32 @@
+# Generated by Django 5.0.1 on 2026-10-18 01:41
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('blog', '0007_swipe_events'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserCounters',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='counters', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='ユーザー')),
+                ('likes_sent', models.IntegerField(default=0, verbose_name='送信したいいね数')),
+                ('likes_received', models.IntegerField(default=0, verbose_name='受信したいいね数')),
+                ('pending_likes', models.IntegerField(default=0, verbose_name='未承認のいいね数')),
+                ('matches', models.IntegerField(default=0, verbose_name='マッチング数')),
+                ('unread_messages', models.IntegerField(default=0, verbose_name='未読メッセージ数')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新日時')),
+            ],
+            options={
+                'verbose_name': 'ユーザー集計',
+                'verbose_name_plural': 'ユーザー集計',
+            },
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.0.1 on 2026-10-18 01:43
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def create_members(apps, schema_editor):
+    """既存のマッチングから隣接リストを作成"""
+    Match = apps.get_model('blog', 'Match')
+    MatchMember = apps.get_model('blog', 'MatchMember')
+    members = []
+    for match_id, user1_id, user2_id, created_at in Match.objects.values_list(
+        'id', 'user1_id', 'user2_id', 'created_at'
+    ).iterator(chunk_size=2000):
+        members.append(MatchMember(match_id=match_id, user_id=user1_id, partner_id=user2_id, created_at=created_at))
+        members.append(MatchMember(match_id=match_id, user_id=user2_id, partner_id=user1_id, created_at=created_at))
+        if len(members) >= 2000:
+            MatchMember.objects.bulk_create(members)
+            members = []
+    MatchMember.objects.bulk_create(members)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0008_user_counters'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MatchMember',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(verbose_name='マッチング日時')),
+                ('match', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='members', to='blog.match', verbose_name='マッチング')),
+                ('partner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='相手')),
+                ('user', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='match_members', to=settings.AUTH_USER_MODEL, verbose_name='ユーザー')),
+            ],
+            options={
+                'verbose_name': 'マッチング参加者',
+                'verbose_name_plural': 'マッチング参加者',
+                'indexes': [models.Index(fields=['user', 'created_at'], name='blog_matchm_user_id_e3ec76_idx')],
+                'unique_together': {('user', 'partner')},
+            },
+        ),
+        migrations.RunPython(create_members, migrations.RunPython.noop),
+    ]
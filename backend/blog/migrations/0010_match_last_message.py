@@ -0,0 +1,49 @@
+# Generated by Django 5.0.1 on 2026-10-18 01:44
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_last_message(apps, schema_editor):
+    """既存のマッチングの最新メッセージ欄を埋める"""
+    Match = apps.get_model('blog', 'Match')
+    Message = apps.get_model('blog', 'Message')
+    latest = Message.objects.order_by('match_id', '-created_at', '-id')
+    current_match_id = None
+    for match_id, sender_id, content, created_at in latest.values_list(
+        'match_id', 'sender_id', 'content', 'created_at'
+    ).iterator(chunk_size=2000):
+        if match_id == current_match_id:
+            continue
+        current_match_id = match_id
+        Match.objects.filter(pk=match_id).update(
+            last_message_content=content[:100], last_message_sender=sender_id, last_message_at=created_at
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0009_match_members'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='match',
+            name='last_message_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='最新メッセージ日時'),
+        ),
+        migrations.AddField(
+            model_name='match',
+            name='last_message_content',
+            field=models.CharField(blank=True, max_length=100, verbose_name='最新メッセージ'),
+        ),
+        migrations.AddField(
+            model_name='match',
+            name='last_message_sender',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='最新メッセージの送信者'),
+        ),
+        migrations.RunPython(fill_last_message, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.0.1 on 2026-10-18 01:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0010_match_last_message'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='match',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='解除日時'),
+        ),
+        migrations.CreateModel(
+            name='PurgeJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('match', 'マッチング解除'), ('user', '退会')], max_length=10, verbose_name='種類')),
+                ('target_id', models.BigIntegerField(verbose_name='対象ID')),
+                ('status', models.CharField(choices=[('pending', '待機中'), ('running', '処理中'), ('done', '完了'), ('failed', '失敗')], default='pending', max_length=10, verbose_name='状態')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='試行回数')),
+                ('batches', models.PositiveIntegerField(default=0, verbose_name='処理したバッチ数')),
+                ('deleted_rows', models.PositiveIntegerField(default=0, verbose_name='削除した行数')),
+                ('last_error', models.TextField(blank=True, verbose_name='最後のエラー')),
+                ('locked_until', models.DateTimeField(blank=True, null=True, verbose_name='ロック期限')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='作成日時')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='開始日時')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='完了日時')),
+            ],
+            options={
+                'verbose_name': '削除ジョブ',
+                'verbose_name_plural': '削除ジョブ',
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['status', 'id'], name='blog_purgej_status_783ac9_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.0.1 on 2026-10-18 01:53
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def fill_read_watermark(apps, schema_editor):
+    """既読フラグから既読位置を作る（相手のメッセージのうち既読の最大ID）"""
+    Message = apps.get_model('blog', 'Message')
+    MatchMember = apps.get_model('blog', 'MatchMember')
+    read = Message.objects.filter(is_read=True).order_by().values('match_id', 'sender_id').annotate(last_id=Max('id'))
+    for row in read.iterator(chunk_size=2000):
+        MatchMember.objects.filter(match_id=row['match_id'], partner_id=row['sender_id']).update(
+            last_read_message_id=row['last_id']
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0011_purge_jobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='matchmember',
+            name='last_read_message_id',
+            field=models.BigIntegerField(default=0, verbose_name='既読位置（メッセージID）'),
+        ),
+        migrations.RunPython(fill_read_watermark, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='message',
+            name='is_read',
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.0.1 on 2026-10-18 01:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0012_read_watermark'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MessageChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('first_message_id', models.BigIntegerField(verbose_name='最初のメッセージID')),
+                ('last_message_id', models.BigIntegerField(verbose_name='最後のメッセージID')),
+                ('message_count', models.PositiveIntegerField(verbose_name='メッセージ数')),
+                ('data', models.BinaryField(verbose_name='メッセージ（圧縮）')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='作成日時')),
+                ('match', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='message_chunks', to='blog.match', verbose_name='マッチング')),
+            ],
+            options={
+                'verbose_name': 'メッセージアーカイブ',
+                'verbose_name_plural': 'メッセージアーカイブ',
+                'indexes': [models.Index(fields=['match', 'last_message_id'], name='blog_messag_match_i_71142b_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.0.1 on 2026-10-18 01:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0013_message_chunks'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MessageTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('gram', models.CharField(max_length=8, verbose_name='n-gram')),
+                ('message_id', models.BigIntegerField(verbose_name='メッセージID')),
+                ('match', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='blog.match', verbose_name='マッチング')),
+            ],
+            options={
+                'verbose_name': 'メッセージ索引',
+                'verbose_name_plural': 'メッセージ索引',
+                'indexes': [models.Index(fields=['gram', 'match', 'message_id'], name='blog_messag_gram_ed3880_idx'), models.Index(fields=['message_id'], name='blog_messag_message_ad8498_idx')],
+            },
+        ),
+    ]
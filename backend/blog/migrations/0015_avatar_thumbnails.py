@@ -0,0 +1,23 @@
+# Generated by Django 5.0.1 on 2026-10-18 01:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0014_message_terms'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='avatar_source',
+            field=models.CharField(blank=True, editable=False, max_length=100, verbose_name='縮小版の元画像'),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='avatar_thumbnails',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='プロフィール画像（縮小版）'),
+        ),
+    ]
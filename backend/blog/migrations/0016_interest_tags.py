@@ -0,0 +1,103 @@
+# Generated by Django 5.0.1 on 2026-10-18 02:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+BATCH_SIZE = 1000
+
+
+def use_binary_collation(apps, schema_editor):
+    """MySQL の場合のみタグ名を utf8mb4_bin にする（既定の照合順序ではかなや大文字小文字の違うタグが衝突する）"""
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    schema_editor.execute(
+        'ALTER TABLE blog_interest MODIFY name varchar(50) CHARACTER SET utf8mb4 COLLATE utf8mb4_bin NOT NULL'
+    )
+
+
+def create_interest_tags(apps, schema_editor):
+    """既存の Profile.interests（カンマ区切り）から興味タグを BATCH_SIZE 件ずつ作成"""
+    Profile = apps.get_model('blog', 'Profile')
+    Interest = apps.get_model('blog', 'Interest')
+    ProfileInterest = apps.get_model('blog', 'ProfileInterest')
+    last_id = 0
+    while True:
+        rows = list(
+            Profile.objects.filter(id__gt=last_id).exclude(interests='').order_by('id').values_list(
+                'id', 'interests'
+            )[:BATCH_SIZE]
+        )
+        if not rows:
+            break
+        tags = {
+            profile_id: {term.strip().casefold()[:50].rstrip() for term in interests.split(',') if term.strip()}
+            for profile_id, interests in rows
+        }
+        names = set().union(*tags.values())
+        Interest.objects.bulk_create([Interest(name=name) for name in names], ignore_conflicts=True)
+        interest_ids = dict(Interest.objects.filter(name__in=names).values_list('name', 'id'))
+        ProfileInterest.objects.bulk_create([
+            ProfileInterest(profile_id=profile_id, interest_id=interest_ids[name])
+            for profile_id, profile_names in tags.items()
+            for name in profile_names
+        ], ignore_conflicts=True)
+        last_id = rows[-1][0]
+
+    # タグごとのプロフィール数は最後にまとめて数える
+    Interest.objects.update(profile_count=Coalesce(Subquery(
+        ProfileInterest.objects.filter(interest=OuterRef('pk')).order_by().values('interest').annotate(
+            count=Count('id')
+        ).values('count')
+    ), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0015_avatar_thumbnails'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Interest',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True, verbose_name='タグ')),
+                ('profile_count', models.PositiveIntegerField(default=0, verbose_name='プロフィール数')),
+            ],
+            options={
+                'verbose_name': '興味タグ',
+                'verbose_name_plural': '興味タグ',
+                'indexes': [models.Index(fields=['-profile_count', 'name'], name='blog_intere_profile_9cd12b_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ProfileInterest',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('interest', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='profile_links', to='blog.interest', verbose_name='興味タグ')),
+                ('profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='interest_links', to='blog.profile', verbose_name='プロフィール')),
+            ],
+            options={
+                'verbose_name': 'プロフィールの興味タグ',
+                'verbose_name_plural': 'プロフィールの興味タグ',
+            },
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='interest_tags',
+            field=models.ManyToManyField(blank=True, related_name='profiles', through='blog.ProfileInterest', to='blog.interest', verbose_name='興味タグ'),
+        ),
+        migrations.AddIndex(
+            model_name='profileinterest',
+            index=models.Index(fields=['interest', 'profile'], name='blog_profil_interes_72a79c_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='profileinterest',
+            unique_together={('profile', 'interest')},
+        ),
+        migrations.RunPython(use_binary_collation, migrations.RunPython.noop),
+        migrations.RunPython(create_interest_tags, migrations.RunPython.noop),
+    ]
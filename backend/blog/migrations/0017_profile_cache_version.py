@@ -0,0 +1,18 @@
+# Generated by Django 5.0.1 on 2026-10-18 02:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0016_interest_tags'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='cache_version',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='キャッシュのバージョン'),
+        ),
+    ]
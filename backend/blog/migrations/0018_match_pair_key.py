@@ -0,0 +1,41 @@
+# Generated by Django 5.0.1 on 2026-10-18 02:14
+
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+def fill_pair_keys(apps, schema_editor):
+    """有効な（解除されていない）マッチングにペアのキーを BATCH_SIZE 件ずつ設定"""
+    Match = apps.get_model('blog', 'Match')
+    last_id = 0
+    while True:
+        matches = list(
+            Match.objects.filter(id__gt=last_id, deleted_at__isnull=True).order_by('id').only('id', 'user1', 'user2')[:BATCH_SIZE]
+        )
+        if not matches:
+            break
+        for match in matches:
+            match.pair_key = f'{match.user1_id}:{match.user2_id}'
+        Match.objects.bulk_update(matches, ['pair_key'])
+        last_id = matches[-1].id
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0017_profile_cache_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='match',
+            name='pair_key',
+            field=models.CharField(blank=True, max_length=41, null=True, unique=True, verbose_name='ペアのキー'),
+        ),
+        migrations.RunPython(fill_pair_keys, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='match',
+            unique_together=set(),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.0.1 on 2026-10-18 02:20
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0018_match_pair_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PubSubEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('channel', models.CharField(max_length=100, verbose_name='チャンネル')),
+                ('payload', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder, verbose_name='内容')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='作成日時')),
+            ],
+            options={
+                'verbose_name': 'pub/sub イベント',
+                'verbose_name_plural': 'pub/sub イベント',
+            },
+        ),
+    ]
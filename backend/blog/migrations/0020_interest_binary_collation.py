@@ -0,0 +1,23 @@
+# Generated by Django 5.0.1 on 2026-10-18 02:48
+
+from django.db import migrations
+
+
+def use_binary_collation(apps, schema_editor):
+    """0016 を既に適用した MySQL のタグ名も utf8mb4_bin にする（0016 と同じ変更なので再適用しても同じ）"""
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    schema_editor.execute(
+        'ALTER TABLE blog_interest MODIFY name varchar(50) CHARACTER SET utf8mb4 COLLATE utf8mb4_bin NOT NULL'
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0019_pubsub_events'),
+    ]
+
+    operations = [
+        migrations.RunPython(use_binary_collation, migrations.RunPython.noop),
+    ]
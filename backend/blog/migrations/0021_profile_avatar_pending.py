@@ -0,0 +1,34 @@
+# Generated by Django 5.0.1 on 2026-10-18 02:54
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+
+
+def mark_pending_avatars(apps, schema_editor):
+    """縮小版がない、または元画像が差し替えられたプロフィールを作成待ちにする"""
+    Profile = apps.get_model('blog', 'Profile')
+    Profile.objects.exclude(avatar='').exclude(avatar__isnull=True).exclude(
+        avatar_source=F('avatar')
+    ).update(avatar_pending=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0020_interest_binary_collation'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='avatar_pending',
+            field=models.BooleanField(default=False, editable=False, verbose_name='縮小版の作成待ち'),
+        ),
+        migrations.RunPython(mark_pending_avatars, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='profile',
+            index=models.Index(fields=['avatar_pending', 'id'], name='blog_profil_avatar__083af6_idx'),
+        ),
+    ]
@@ -1,5 +1,9 @@
 from django.db import models
+from django.core.validators import MinValueValidator, MaxValueValidator
 from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models.functions import Coalesce
+from .geohash import encode as encode_geohash
 
 
 class Profile(models.Model):
@@ -16,9 +20,23 @@ class Profile(models.Model):
     age = models.PositiveIntegerField('年齢', null=True, blank=True)
     gender = models.CharField('性別', max_length=10, choices=GENDER_CHOICES, blank=True)
     location = models.CharField('居住地', max_length=100, blank=True)
+    latitude = models.FloatField(
+        '緯度', null=True, blank=True, validators=[MinValueValidator(-90), MaxValueValidator(90)]
+    )
+    longitude = models.FloatField(
+        '経度', null=True, blank=True, validators=[MinValueValidator(-180), MaxValueValidator(180)]
+    )
+    geohash = models.CharField('ジオハッシュ', max_length=12, blank=True, db_index=True, editable=False)
     
     avatar = models.ImageField('プロフィール画像', upload_to='avatars/', blank=True, null=True)
+    avatar_thumbnails = models.JSONField('プロフィール画像（縮小版）', default=dict, blank=True, editable=False)
+    avatar_source = models.CharField('縮小版の元画像', max_length=100, blank=True, editable=False)
+    avatar_pending = models.BooleanField('縮小版の作成待ち', default=False, editable=False)
     interests = models.TextField('興味・趣味', blank=True, help_text='カンマ区切りで入力')
+    interest_tags = models.ManyToManyField(
+        'Interest', verbose_name='興味タグ', through='ProfileInterest', related_name='profiles', blank=True
+    )
+    cache_version = models.PositiveIntegerField('キャッシュのバージョン', default=0, editable=False)
     
     created_at = models.DateTimeField('作成日時', auto_now_add=True)
     updated_at = models.DateTimeField('更新日時', auto_now=True)
@@ -26,10 +44,39 @@ class Profile(models.Model):
     class Meta:
         verbose_name = 'プロフィール'
         verbose_name_plural = 'プロフィール'
+        indexes = [
+            models.Index(fields=['updated_at']),
+            # process_avatars は作成待ちのプロフィールだけを ID 順に読む
+            models.Index(fields=['avatar_pending', 'id']),
+        ]
     
     def __str__(self):
         return f'{self.display_name} ({self.user.username})'
     
+    def save(self, *args, **kwargs):
+        # 座標から近傍検索用のジオハッシュを更新
+        if self.latitude is not None and self.longitude is not None:
+            self.geohash = encode_geohash(self.latitude, self.longitude)
+        else:
+            self.geohash = ''
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'latitude', 'longitude'} & set(update_fields):
+            kwargs['update_fields'] = update_fields = {*update_fields, 'geohash'}
+        # 元画像が縮小版の元と食い違えば縮小版の作成待ちにする（process_avatars が読む）
+        self.avatar_pending = bool(self.avatar) and self.avatar.name != self.avatar_source
+        if update_fields is not None and {'avatar', 'avatar_source'} & set(update_fields):
+            kwargs['update_fields'] = update_fields = {*update_fields, 'avatar_pending'}
+        # 保存のたびにバージョンを上げ、シリアライズ済みのキャッシュ（profilecache）を無効にする
+        bump_version = not self._state.adding
+        if bump_version:
+            self.cache_version = models.F('cache_version') + 1
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'cache_version'}
+        super().save(*args, **kwargs)
+        if bump_version:
+            # 新しい値は読み直さず遅延読み込みにしておき、参照されたときにだけ問い合わせる
+            del self.__dict__['cache_version']
+    
     @property
     def interests_list(self):
         """興味をリスト形式で返す"""
@@ -38,12 +85,59 @@ class Profile(models.Model):
         return []
 
 
+class Interest(models.Model):
+    """興味タグ（Profile.interests を正規化したもの）"""
+    name = models.CharField('タグ', max_length=50, unique=True)
+    profile_count = models.PositiveIntegerField('プロフィール数', default=0)
+    
+    class Meta:
+        verbose_name = '興味タグ'
+        verbose_name_plural = '興味タグ'
+        indexes = [
+            models.Index(fields=['-profile_count', 'name']),
+        ]
+    
+    def __str__(self):
+        return f'{self.name} ({self.profile_count})'
+
+
+class ProfileInterest(models.Model):
+    """プロフィールと興味タグの対応（タグからプロフィールを引く (interest, profile) インデックス付き）"""
+    profile = models.ForeignKey(Profile, verbose_name='プロフィール', on_delete=models.CASCADE, related_name='interest_links')
+    interest = models.ForeignKey(
+        Interest, verbose_name='興味タグ', on_delete=models.CASCADE, related_name='profile_links', db_index=False
+    )
+    
+    class Meta:
+        verbose_name = 'プロフィールの興味タグ'
+        verbose_name_plural = 'プロフィールの興味タグ'
+        unique_together = ['profile', 'interest']
+        indexes = [
+            models.Index(fields=['interest', 'profile']),
+        ]
+    
+    def __str__(self):
+        return f'{self.profile_id} - {self.interest_id}'
+
+
+class LikeQuerySet(models.QuerySet):
+    def with_mutual(self):
+        """相互いいねかどうかを mutual として一括で付与（1行ごとの問い合わせを避ける）"""
+        return self.annotate(
+            mutual=models.Exists(
+                Like.objects.filter(from_user=models.OuterRef('to_user'), to_user=models.OuterRef('from_user'))
+            )
+        )
+
+
 class Like(models.Model):
     """いいねモデル"""
     from_user = models.ForeignKey(User, verbose_name='送信者', on_delete=models.CASCADE, related_name='likes_sent')
     to_user = models.ForeignKey(User, verbose_name='受信者', on_delete=models.CASCADE, related_name='likes_received')
     created_at = models.DateTimeField('作成日時', auto_now_add=True)
     
+    objects = LikeQuerySet.as_manager()
+    
     class Meta:
         verbose_name = 'いいね'
         verbose_name_plural = 'いいね'
@@ -58,7 +152,9 @@ class Like(models.Model):
         return f'{self.from_user.username} → {self.to_user.username}'
     
     def is_mutual(self):
-        """相互いいねかどうかを判定"""
+        """相互いいねかどうかを判定（with_mutual() で取得済みならその値を使う）"""
+        if hasattr(self, 'mutual'):
+            return self.mutual
         return Like.objects.filter(
             from_user=self.to_user,
             to_user=self.from_user
@@ -67,14 +163,24 @@ class Like(models.Model):
 
 class Match(models.Model):
     """マッチングモデル（相互いいね）"""
+    LAST_MESSAGE_LENGTH = 100
+    
     user1 = models.ForeignKey(User, verbose_name='ユーザー1', on_delete=models.CASCADE, related_name='matches_as_user1')
     user2 = models.ForeignKey(User, verbose_name='ユーザー2', on_delete=models.CASCADE, related_name='matches_as_user2')
     created_at = models.DateTimeField('マッチング日時', auto_now_add=True)
+    # 受信箱の一覧表示用に最新メッセージを非正規化して持つ
+    last_message_content = models.CharField('最新メッセージ', max_length=LAST_MESSAGE_LENGTH, blank=True)
+    last_message_sender = models.ForeignKey(User, verbose_name='最新メッセージの送信者', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    last_message_at = models.DateTimeField('最新メッセージ日時', null=True, blank=True)
+    # 解除済み（メッセージはバックグラウンドの PurgeJob で削除する）
+    deleted_at = models.DateTimeField('解除日時', null=True, blank=True)
+    # 有効なマッチングの "user1:user2"（一意）。解除時に NULL にして、
+    # 削除ジョブの完了を待たずに同じ2人のマッチングを作り直せるようにする
+    pair_key = models.CharField('ペアのキー', max_length=41, unique=True, null=True, blank=True)
     
     class Meta:
         verbose_name = 'マッチング'
         verbose_name_plural = 'マッチング'
-        unique_together = ['user1', 'user2']
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['user1', 'user2']),
@@ -84,13 +190,66 @@ class Match(models.Model):
     def __str__(self):
         return f'{self.user1.username} ⇄ {self.user2.username}'
     
+    @staticmethod
+    def build_pair_key(user1_id, user2_id):
+        """2人のユーザーIDから有効なマッチングのキーを作る（順序は問わない）"""
+        return f'{min(user1_id, user2_id)}:{max(user1_id, user2_id)}'
+    
     @classmethod
     def create_match(cls, user1, user2):
         """マッチングを作成（user1 < user2の順序で保存）"""
         if user1.id > user2.id:
             user1, user2 = user2, user1
-        match, created = cls.objects.get_or_create(user1=user1, user2=user2)
+        match, created = cls.objects.get_or_create(
+            pair_key=cls.build_pair_key(user1.id, user2.id), defaults={'user1': user1, 'user2': user2}
+        )
+        if created:
+            MatchMember.objects.bulk_create(match.build_members(), ignore_conflicts=True)
         return match, created
+    
+    def set_last_message(self, message):
+        """最新メッセージの欄を更新（message が None なら空にする）"""
+        self.last_message_content = message.content[:self.LAST_MESSAGE_LENGTH] if message else ''
+        self.last_message_sender_id = message.sender_id if message else None
+        self.last_message_at = message.created_at if message else None
+        Match.objects.filter(pk=self.pk).update(
+            last_message_content=self.last_message_content,
+            last_message_sender=self.last_message_sender_id,
+            last_message_at=self.last_message_at,
+        )
+    
+    def build_members(self):
+        """両方の参加者から引けるように隣接リストの行を2つ作る（未保存）"""
+        return [
+            MatchMember(match=self, user_id=self.user1_id, partner_id=self.user2_id, created_at=self.created_at),
+            MatchMember(match=self, user_id=self.user2_id, partner_id=self.user1_id, created_at=self.created_at),
+        ]
+
+
+class MatchMember(models.Model):
+    """マッチングの隣接リスト（参加者ごとに1行）
+
+    Match を user1 / user2 の OR で探すと片側しかインデックスを使えないため、
+    両方の参加者について1行ずつ持ち、(user, created_at) の範囲スキャンで
+    自分のマッチングを引けるようにする。Match の削除でカスケード削除される。
+    """
+    match = models.ForeignKey(Match, verbose_name='マッチング', on_delete=models.CASCADE, related_name='members')
+    user = models.ForeignKey(User, verbose_name='ユーザー', on_delete=models.CASCADE, related_name='match_members', db_index=False)
+    partner = models.ForeignKey(User, verbose_name='相手', on_delete=models.CASCADE, related_name='+')
+    created_at = models.DateTimeField('マッチング日時')
+    # このIDまでの相手のメッセージを既読とみなす（既読位置）
+    last_read_message_id = models.BigIntegerField('既読位置（メッセージID）', default=0)
+    
+    class Meta:
+        verbose_name = 'マッチング参加者'
+        verbose_name_plural = 'マッチング参加者'
+        unique_together = ['user', 'partner']
+        indexes = [
+            models.Index(fields=['user', 'created_at']),
+        ]
+    
+    def __str__(self):
+        return f'{self.user_id} → {self.partner_id}'
 
 
 class Block(models.Model):
@@ -114,14 +273,34 @@ class Block(models.Model):
         return f'{self.blocker.username} → {self.blocked.username}'
 
 
+class MessageQuerySet(models.QuerySet):
+    def with_read_state(self):
+        """受信者の既読位置を recipient_read_id として一括で付与（is_read の判定用）"""
+        return self.annotate(
+            recipient_read_id=Coalesce(
+                models.Subquery(
+                    MatchMember.objects.filter(
+                        match=models.OuterRef('match'), partner=models.OuterRef('sender')
+                    ).values('last_read_message_id')[:1]
+                ),
+                0
+            )
+        )
+    
+    def unread(self):
+        """受信者の既読位置より新しいメッセージ"""
+        return self.with_read_state().filter(id__gt=models.F('recipient_read_id'))
+
+
 class Message(models.Model):
     """メッセージモデル"""
     match = models.ForeignKey(Match, verbose_name='マッチング', on_delete=models.CASCADE, related_name='messages')
     sender = models.ForeignKey(User, verbose_name='送信者', on_delete=models.CASCADE, related_name='sent_messages')
     content = models.TextField('メッセージ内容')
-    is_read = models.BooleanField('既読', default=False)
     created_at = models.DateTimeField('送信日時', auto_now_add=True)
     
+    objects = MessageQuerySet.as_manager()
+    
     class Meta:
         verbose_name = 'メッセージ'
         verbose_name_plural = 'メッセージ'
@@ -132,3 +311,213 @@ class Message(models.Model):
     
     def __str__(self):
         return f'{self.sender.username}: {self.content[:30]}'
+    
+    @property
+    def is_read(self):
+        """受信者の既読位置（MatchMember.last_read_message_id）以前なら既読"""
+        read_id = getattr(self, 'recipient_read_id', None)
+        if read_id is None:
+            read_id = MatchMember.objects.filter(
+                match_id=self.match_id, partner_id=self.sender_id
+            ).values_list('last_read_message_id', flat=True).first() or 0
+        return self.id <= read_id
+
+
+class MessageChunk(models.Model):
+    """アーカイブ済みメッセージの圧縮チャンク（マッチングごと・ID順の連続区間）
+
+    古くて既読のメッセージは archive_messages コマンドで Message から移し、
+    (ID, 送信者ID, 本文, 送信日時) の列を zlib 圧縮して保存する。
+    """
+    match = models.ForeignKey(Match, verbose_name='マッチング', on_delete=models.CASCADE, related_name='message_chunks')
+    first_message_id = models.BigIntegerField('最初のメッセージID')
+    last_message_id = models.BigIntegerField('最後のメッセージID')
+    message_count = models.PositiveIntegerField('メッセージ数')
+    data = models.BinaryField('メッセージ（圧縮）')
+    created_at = models.DateTimeField('作成日時', auto_now_add=True)
+    
+    class Meta:
+        verbose_name = 'メッセージアーカイブ'
+        verbose_name_plural = 'メッセージアーカイブ'
+        indexes = [
+            models.Index(fields=['match', 'last_message_id']),
+        ]
+    
+    def __str__(self):
+        return f'{self.match_id}: {self.first_message_id}-{self.last_message_id}'
+
+
+class MessageTerm(models.Model):
+    """メッセージ検索用の n-gram 転置索引（メッセージ内の n-gram ごとに1行）
+
+    アーカイブ済みのメッセージも検索できるよう message_id は外部キーにしない。
+    """
+    gram = models.CharField('n-gram', max_length=8)
+    match = models.ForeignKey(Match, verbose_name='マッチング', on_delete=models.CASCADE, related_name='+')
+    message_id = models.BigIntegerField('メッセージID')
+    
+    class Meta:
+        verbose_name = 'メッセージ索引'
+        verbose_name_plural = 'メッセージ索引'
+        indexes = [
+            models.Index(fields=['gram', 'match', 'message_id']),
+            models.Index(fields=['message_id']),
+        ]
+    
+    def __str__(self):
+        return f'{self.gram}: {self.message_id}'
+
+
+class DiscoverQueue(models.Model):
+    """おすすめ候補キューの状態モデル"""
+    user = models.OneToOneField(User, verbose_name='ユーザー', on_delete=models.CASCADE, related_name='discover_queue')
+    last_profile_id = models.PositiveBigIntegerField('走査済みプロフィールID', default=0)
+    updated_at = models.DateTimeField('更新日時', auto_now=True)
+    
+    class Meta:
+        verbose_name = 'おすすめ候補キュー'
+        verbose_name_plural = 'おすすめ候補キュー'
+    
+    def __str__(self):
+        return f'{self.user.username} (<= {self.last_profile_id})'
+
+
+class DiscoverCandidate(models.Model):
+    """おすすめ候補モデル（ユーザーごとの事前計算済みキュー）"""
+    user = models.ForeignKey(User, verbose_name='ユーザー', on_delete=models.CASCADE, related_name='discover_candidates')
+    candidate = models.ForeignKey(User, verbose_name='候補ユーザー', on_delete=models.CASCADE, related_name='+')
+    created_at = models.DateTimeField('作成日時', auto_now_add=True)
+    
+    class Meta:
+        verbose_name = 'おすすめ候補'
+        verbose_name_plural = 'おすすめ候補'
+        unique_together = ['user', 'candidate']
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['user', 'id']),
+        ]
+    
+    def __str__(self):
+        return f'{self.user.username} → {self.candidate.username}'
+
+
+class SwipeEvent(models.Model):
+    """スワイプイベント（追記専用のログ）"""
+    LIKE = 1
+    PASS = 2
+    ACTION_CHOICES = [
+        (LIKE, 'いいね'),
+        (PASS, 'パス'),
+    ]
+    
+    actor = models.ForeignKey(User, verbose_name='操作したユーザー', on_delete=models.CASCADE, related_name='+', db_index=False)
+    target = models.ForeignKey(User, verbose_name='相手', on_delete=models.CASCADE, related_name='+')
+    action = models.PositiveSmallIntegerField('操作', choices=ACTION_CHOICES)
+    created_at = models.DateTimeField('日時', auto_now_add=True)
+    
+    class Meta:
+        verbose_name = 'スワイプイベント'
+        verbose_name_plural = 'スワイプイベント'
+        indexes = [
+            # 「XがYを見たか」の判定用
+            models.Index(fields=['actor', 'target']),
+            models.Index(fields=['created_at']),
+        ]
+    
+    def __str__(self):
+        return f'{self.actor_id} → {self.target_id} ({self.get_action_display()})'
+
+
+class SwipeArchive(models.Model):
+    """アーカイブ済みスワイプの要約（ユーザーごとのパス済み相手IDの圧縮集合）"""
+    user = models.OneToOneField(User, verbose_name='ユーザー', on_delete=models.CASCADE, related_name='swipe_archive')
+    passed_targets = models.BinaryField('パス済みユーザーID（圧縮）', default=b'')
+    updated_at = models.DateTimeField('更新日時', auto_now=True)
+    
+    class Meta:
+        verbose_name = 'スワイプアーカイブ'
+        verbose_name_plural = 'スワイプアーカイブ'
+    
+    def __str__(self):
+        return f'{self.user.username}'
+
+
+class UserCounters(models.Model):
+    """ユーザーごとの集計値（バッジ表示用に増減で更新する非正規化カウンタ）"""
+    user = models.OneToOneField(User, verbose_name='ユーザー', on_delete=models.CASCADE, primary_key=True, related_name='counters')
+    likes_sent = models.IntegerField('送信したいいね数', default=0)
+    likes_received = models.IntegerField('受信したいいね数', default=0)
+    pending_likes = models.IntegerField('未承認のいいね数', default=0)
+    matches = models.IntegerField('マッチング数', default=0)
+    unread_messages = models.IntegerField('未読メッセージ数', default=0)
+    updated_at = models.DateTimeField('更新日時', auto_now=True)
+    
+    COUNTER_FIELDS = ['likes_sent', 'likes_received', 'pending_likes', 'matches', 'unread_messages']
+    
+    class Meta:
+        verbose_name = 'ユーザー集計'
+        verbose_name_plural = 'ユーザー集計'
+    
+    def __str__(self):
+        return f'{self.user_id}'
+
+
+class PurgeJob(models.Model):
+    """バックグラウンド削除ジョブ（run_purge_jobs コマンドで処理する）
+
+    解除したマッチングのメッセージや退会ユーザーのデータを一定件数ずつ削除する。
+    進捗はバッチごとに保存するため、途中で落ちても再実行で続きから処理できる。
+    """
+    MATCH = 'match'
+    USER = 'user'
+    KIND_CHOICES = [
+        (MATCH, 'マッチング解除'),
+        (USER, '退会'),
+    ]
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, '待機中'),
+        (RUNNING, '処理中'),
+        (DONE, '完了'),
+        (FAILED, '失敗'),
+    ]
+    
+    kind = models.CharField('種類', max_length=10, choices=KIND_CHOICES)
+    target_id = models.BigIntegerField('対象ID')
+    status = models.CharField('状態', max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveIntegerField('試行回数', default=0)
+    batches = models.PositiveIntegerField('処理したバッチ数', default=0)
+    deleted_rows = models.PositiveIntegerField('削除した行数', default=0)
+    last_error = models.TextField('最後のエラー', blank=True)
+    locked_until = models.DateTimeField('ロック期限', null=True, blank=True)
+    created_at = models.DateTimeField('作成日時', auto_now_add=True)
+    started_at = models.DateTimeField('開始日時', null=True, blank=True)
+    finished_at = models.DateTimeField('完了日時', null=True, blank=True)
+    
+    class Meta:
+        verbose_name = '削除ジョブ'
+        verbose_name_plural = '削除ジョブ'
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['status', 'id']),
+        ]
+    
+    def __str__(self):
+        return f'{self.get_kind_display()} #{self.target_id} ({self.get_status_display()})'
+
+
+class PubSubEvent(models.Model):
+    """プロセス間で受け渡す pub/sub のイベント（DatabaseBroker 用。短時間で削除する）"""
+    channel = models.CharField('チャンネル', max_length=100)
+    payload = models.JSONField('内容', encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField('作成日時', auto_now_add=True, db_index=True)
+    
+    class Meta:
+        verbose_name = 'pub/sub イベント'
+        verbose_name_plural = 'pub/sub イベント'
+    
+    def __str__(self):
+        return f'{self.channel} #{self.pk}'
@@ -0,0 +1,109 @@
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(CursorPagination):
+    """カーソル（キーセット）ページネーション
+
+    OFFSET と COUNT(*) を使わず、並び順のキーより後ろ（前）を
+    インデックスの範囲検索で取得する。カーソルは不透明な文字列として返す。
+    並び順はビューの cursor_ordering で指定する。
+    """
+    ordering = '-created_at'
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    def get_ordering(self, request, queryset, view):
+        ordering = getattr(view, 'cursor_ordering', None) or self.ordering
+        if isinstance(ordering, str):
+            return (ordering,)
+        return tuple(ordering)
+
+
+class NoCountPagination(PageNumberPagination):
+    """COUNT(*) を発行しないページ番号ページネーション
+
+    page_size + 1 件だけ取得して次ページの有無を判定する。
+    検索・任意の並び替えなどキーセットにできない一覧向け。
+    """
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        try:
+            self.page_number = int(request.query_params.get(self.page_query_param, 1))
+        except ValueError:
+            self.page_number = 0
+        if self.page_number < 1:
+            raise NotFound(self.invalid_page_message.format(
+                page_number=request.query_params.get(self.page_query_param), message='Invalid page.'
+            ))
+
+        offset = (self.page_number - 1) * page_size
+        rows = list(queryset[offset:offset + page_size + 1])
+        self.has_next = len(rows) > page_size
+        return rows[:page_size]
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema['properties'].pop('count', None)
+        return response_schema
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.page_query_param, self.page_number + 1)
+
+    def get_previous_link(self):
+        if self.page_number <= 1:
+            return None
+        url = self.request.build_absolute_uri()
+        if self.page_number == 2:
+            return remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.page_query_param, self.page_number - 1)
+
+
+class StandardPagination(PageNumberPagination):
+    """既定のページ番号ページネーション（count・page・previous を返す。page_size も指定できる）"""
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+
+# ?pagination= でクライアントが選べるページネーション
+PAGINATION_MODES = {'cursor': KeysetPagination, 'nocount': NoCountPagination}
+
+
+class ActionPaginationMixin:
+    """アクション・クエリパラメータごとにページネーションクラスを切り替えるMixin
+
+    既定は pagination_class。action_pagination_classes = {'inbox': KeysetPagination} で
+    アクションごとの既定を、pagination_modes = PAGINATION_MODES で ?pagination=cursor /
+    ?pagination=nocount によるオプトインを指定する（知らない値は既定のまま）。
+    """
+    action_pagination_classes = {}
+    pagination_modes = {}
+    pagination_query_param = 'pagination'
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            pagination_class = self.action_pagination_classes.get(self.action, self.pagination_class)
+            mode = self.request.query_params.get(self.pagination_query_param)
+            pagination_class = self.pagination_modes.get(mode, pagination_class)
+            self._paginator = pagination_class() if pagination_class else None
+        return self._paginator
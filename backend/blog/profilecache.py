@@ -0,0 +1,81 @@
+"""
+シリアライズ済みプロフィール（ProfileListSerializer の出力）の読み込み時キャッシュ
+
+キーはプロフィールIDとバージョン（Profile.cache_version。保存のたびに増える）で、
+古いバージョンの断片は参照されなくなって期限切れで消えるので削除はしない。
+一覧ではページ分のキーを get_many 1回で引き、なかった分だけシリアライズして
+set_many で保存する。ModelSerializer（ProfileListSerializer）と高速シリアライザ
+（fastserializers.ProfileCardSerializer）は同じ断片を共有する。
+Django のキャッシュフレームワーク（CACHES['default']）を使う。
+ヒット数・ミス数はキャッシュ上のカウンタに数え、stats() で読める。
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+TIMEOUT = getattr(settings, 'PROFILE_CACHE_TIMEOUT', 3600)
+KEY_PREFIX = 'profile-fragment'
+HITS_KEY = f'{KEY_PREFIX}:hits'
+MISSES_KEY = f'{KEY_PREFIX}:misses'
+# シリアライズ中に引いた断片を入れておくシリアライザの context のキー
+CONTEXT_KEY = '_profile_fragments'
+
+
+def key(profile_id, version):
+    return f'{KEY_PREFIX}:{profile_id}:{version}'
+
+
+def cache_key(profile):
+    return key(profile.pk, profile.cache_version)
+
+
+def _incr(key, delta):
+    if not delta:
+        return
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        cache.add(key, 0, timeout=None)
+        cache.incr(key, delta)
+
+
+def get_many(versions, load):
+    """{プロフィールID: バージョン} の断片を {キー: データ} で返す
+
+    なかった分は load(プロフィールIDの列) が返す {プロフィールID: データ} で作って保存する
+    （削除されていて load が返さなかったプロフィールは結果に含まない）。
+    """
+    keys = {key(profile_id, version): profile_id for profile_id, version in versions.items()}
+    if not keys:
+        return {}
+    found = cache.get_many(list(keys))
+    missing_ids = [profile_id for cache_key, profile_id in keys.items() if cache_key not in found]
+    missing = {}
+    if missing_ids:
+        missing = {key(profile_id, versions[profile_id]): data for profile_id, data in load(missing_ids).items()}
+    if missing:
+        cache.set_many(missing, TIMEOUT)
+    _incr(HITS_KEY, len(found))
+    _incr(MISSES_KEY, len(missing))
+    found.update(missing)
+    return found
+
+
+def fragments(profiles, serialize):
+    """プロフィールの断片を {キー: データ} で返す（なかった分は serialize(profile) で作って保存）"""
+    profiles = {profile.pk: profile for profile in profiles if profile is not None}
+    return get_many(
+        {profile_id: profile.cache_version for profile_id, profile in profiles.items()},
+        lambda profile_ids: {profile_id: serialize(profiles[profile_id]) for profile_id in profile_ids}
+    )
+
+
+def stats():
+    """ヒット数・ミス数・ヒット率"""
+    hits = cache.get(HITS_KEY, 0)
+    misses = cache.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {'hits': hits, 'misses': misses, 'hit_rate': hits / total if total else None}
+
+
+def reset_stats():
+    cache.delete_many([HITS_KEY, MISSES_KEY])
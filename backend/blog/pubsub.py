@@ -0,0 +1,217 @@
+"""
+リアルタイム通知の pub/sub
+
+チャンネル（ユーザーごとの 'user:<ID>'）にイベントを publish すると、
+そのチャンネルを subscribe している接続（/api/blog/events/ の SSE）に届く。
+バックエンドは設定 PUBSUB_BACKEND（Broker のサブクラスのパス）で差し替えられる。
+既定の InMemoryBroker は単一プロセス用（開発・テスト・1ノード構成）で、他のプロセス
+（別のワーカーや run_purge_jobs など）で publish したイベントは届かない。
+複数プロセス・複数ノードでは DatabaseBroker を使う。イベントを PubSubEvent に書き、
+購読者のいるプロセスごとに1本のスレッドがテーブルを読んで自分の接続に配る
+（外部のブローカーは不要。Redis などを使う実装も Broker を継承して作れる）。
+"""
+import asyncio
+import logging
+import threading
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import PubSubEvent
+
+logger = logging.getLogger(__name__)
+
+MAX_QUEUE = 100
+POLL_INTERVAL = getattr(settings, 'PUBSUB_POLL_INTERVAL', 0.5)
+RETENTION = getattr(settings, 'PUBSUB_RETENTION', 60)
+# ID の欠番（先に採番されてまだコミットされていない行）を読み直す秒数と、一度に控える最大数
+GAP_TIMEOUT = 5
+MAX_GAPS = 1000
+
+
+def user_channel(user_id):
+    """ユーザー宛てのチャンネル名"""
+    return f'user:{user_id}'
+
+
+class Subscription:
+    """購読（接続1本ぶんのイベントキュー）"""
+
+    def __init__(self, broker, channels, max_queue=MAX_QUEUE):
+        self.broker = broker
+        self.channels = list(channels)
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(max_queue)
+
+    def put(self, event):
+        """イベントを積む（任意のスレッドから呼べる）"""
+        self.loop.call_soon_threadsafe(self._put, event)
+
+    def _put(self, event):
+        # 読み出しが追いつかない接続は古いイベントから捨てる
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(event)
+
+    async def get(self, timeout=None):
+        """次のイベントを待つ（timeout 秒で届かなければ None）"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class Broker:
+    """pub/sub バックエンドのインターフェース
+
+    publish() は同期コード（ビュー・シグナル）から、subscribe() は
+    イベントループ上の非同期ビューから呼ばれる。
+    """
+
+    def publish(self, channel, event):
+        raise NotImplementedError
+
+    def subscribe(self, channels):
+        """channels を購読する Subscription を返す"""
+        raise NotImplementedError
+
+    def unsubscribe(self, subscription):
+        raise NotImplementedError
+
+
+class InMemoryBroker(Broker):
+    """プロセス内の pub/sub（単一プロセス用）"""
+
+    def __init__(self):
+        self.subscriptions = defaultdict(set)
+        self.lock = threading.Lock()
+
+    def publish(self, channel, event):
+        with self.lock:
+            subscriptions = list(self.subscriptions.get(channel, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.put(event)
+            except RuntimeError:
+                # 接続のイベントループが終了している
+                self.unsubscribe(subscription)
+
+    def subscribe(self, channels):
+        subscription = Subscription(self, channels)
+        with self.lock:
+            for channel in subscription.channels:
+                self.subscriptions[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            for channel in subscription.channels:
+                subscriptions = self.subscriptions.get(channel)
+                if subscriptions is not None:
+                    subscriptions.discard(subscription)
+                    if not subscriptions:
+                        del self.subscriptions[channel]
+
+    def connection_count(self):
+        """購読中の接続数"""
+        with self.lock:
+            return len({subscription for subscriptions in self.subscriptions.values() for subscription in subscriptions})
+
+
+class DatabaseBroker(InMemoryBroker):
+    """PubSubEvent テーブルを介した pub/sub（複数プロセス・複数ノード用）
+
+    publish() は行を INSERT するだけで、配信はどのプロセスでもポーリングのスレッドが行う。
+    ポーリングは最初の subscribe() で始まり、POLL_INTERVAL 秒ごとに前回より後の行を読む。
+    RETENTION 秒より古い行はポーリングのついでに削除する。
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.last_id = None
+        # 欠番のID: 読み直しを諦める時刻
+        self.gaps = {}
+        self.last_pruned = 0
+        self.poller = None
+
+    def publish(self, channel, event):
+        PubSubEvent.objects.create(channel=channel, payload=event)
+
+    def subscribe(self, channels):
+        subscription = super().subscribe(channels)
+        self.start()
+        return subscription
+
+    def start(self):
+        with self.lock:
+            if self.poller is None:
+                self.poller = threading.Thread(target=self.run, name='pubsub-poller', daemon=True)
+                self.poller.start()
+
+    def run(self):
+        while True:
+            try:
+                close_old_connections()
+                self.poll()
+            except Exception:
+                logger.exception('pub/sub polling failed')
+            time.sleep(POLL_INTERVAL)
+
+    def poll(self):
+        """前回より後のイベントをこのプロセスの購読者に配り、配った件数を返す"""
+        if self.last_id is None:
+            # 購読を始める前のイベントは配らない
+            self.last_id = PubSubEvent.objects.aggregate(last_id=Max('id'))['last_id'] or 0
+            return 0
+
+        now = time.monotonic()
+        self.gaps = {event_id: until for event_id, until in self.gaps.items() if until > now}
+        rows = list(
+            PubSubEvent.objects.filter(Q(id__gt=self.last_id) | Q(id__in=list(self.gaps))).order_by('id').values_list(
+                'id', 'channel', 'payload'
+            )
+        )
+        for event_id, channel, payload in rows:
+            self.gaps.pop(event_id, None)
+            if self.last_id + 1 < event_id <= self.last_id + MAX_GAPS:
+                for missing_id in range(self.last_id + 1, event_id):
+                    self.gaps.setdefault(missing_id, now + GAP_TIMEOUT)
+            self.last_id = max(self.last_id, event_id)
+            super().publish(channel, payload)
+
+        if now - self.last_pruned > RETENTION:
+            self.last_pruned = now
+            PubSubEvent.objects.filter(created_at__lt=timezone.now() - timedelta(seconds=RETENTION)).delete()
+        return len(rows)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    """設定（PUBSUB_BACKEND）のブローカーを取得（プロセス内で共有）"""
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                _broker = import_string(getattr(settings, 'PUBSUB_BACKEND', 'blog.pubsub.InMemoryBroker'))()
+    return _broker
+
+
+def publish_to_users(user_ids, event):
+    """ユーザーにイベントを送る（トランザクション中ならコミット後に送る）"""
+    def send():
+        broker = get_broker()
+        for user_id in user_ids:
+            broker.publish(user_channel(user_id), event)
+    transaction.on_commit(send)
@@ -0,0 +1,167 @@
+"""
+マッチング解除・ブロック・退会に伴うデータの削除
+
+長く続いた会話のメッセージをリクエスト中にカスケード削除すると、
+行ロックを長時間保持してしまう。リクエスト中は関係を見えなくするだけ
+（Match.deleted_at の設定と隣接リストの削除、ユーザーの無効化）にとどめ、
+メッセージやいいねは PurgeJob として積んで run_purge_jobs コマンドが
+BATCH_SIZE 件ずつ、バッチごとのトランザクションで削除する。
+解除時には Match.pair_key を空けるので、削除の完了を待たずに同じ2人で再マッチングできる。
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from accounts.authentication import invalidate_user
+
+from . import counters, events
+from .models import (
+    Profile, Like, Match, MatchMember, Message, Block,
+    DiscoverCandidate, SwipeEvent, PurgeJob, MessageTerm,
+)
+
+BATCH_SIZE = getattr(settings, 'PURGE_BATCH_SIZE', 1000)
+LEASE = timedelta(seconds=getattr(settings, 'PURGE_JOB_LEASE', 300))
+MAX_ATTEMPTS = 5
+
+
+def hide_match(match):
+    """マッチングを解除済みにして一覧から外し、メッセージの削除ジョブを積む
+
+    既に解除済みなら None を返す。
+    """
+    with transaction.atomic(), counters.batch():
+        if not Match.objects.filter(pk=match.pk, deleted_at__isnull=True).update(
+            deleted_at=timezone.now(), pair_key=None
+        ):
+            return None
+        # 集計値はここで減らす（後でマッチングを削除するときはシグナルで二重に数えない）
+        unread = counters.unread_counts(match)
+        MatchMember.objects.filter(match=match).delete()
+        counters.bump([match.user1_id, match.user2_id], matches=-1)
+        for user_id, count in unread.items():
+            counters.bump([user_id], unread_messages=-count)
+        events.match_hidden(match)
+        return PurgeJob.objects.create(kind=PurgeJob.MATCH, target_id=match.pk)
+
+
+def deactivate_user(user):
+    """退会：ユーザーを無効化してプロフィールとマッチングを隠し、削除ジョブを積む"""
+    with transaction.atomic():
+        User.objects.filter(pk=user.pk).update(is_active=False)
+        user.is_active = False
+        # 一括更新はシグナルを送らないので、認証済みユーザーのキャッシュはここで無効にする
+        invalidate_user(user.pk)
+        # プロフィールを消すと discover・検索・近傍検索・ランキングから外れる
+        Profile.objects.filter(user=user).delete()
+        for match in Match.objects.filter(members__user=user):
+            hide_match(match)
+        return PurgeJob.objects.create(kind=PurgeJob.USER, target_id=user.pk)
+
+
+def _delete_in_batches(queryset, batch_size, progress=None):
+    """主キー順に batch_size 件ずつ削除し、削除した行数を返す"""
+    total = 0
+    while True:
+        ids = list(queryset.order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return total
+        with transaction.atomic():
+            deleted, _ = queryset.model.objects.filter(pk__in=ids).delete()
+            if progress is not None:
+                progress(deleted)
+        total += deleted
+
+
+def purge_match(match_id, batch_size=BATCH_SIZE, progress=None):
+    """解除済みマッチングのメッセージと検索索引を削除し、最後にマッチング自体を削除する"""
+    total = 0
+    for queryset in (
+        Message.objects.filter(match_id=match_id),
+        MessageTerm.objects.filter(match_id=match_id),
+    ):
+        total += _delete_in_batches(queryset, batch_size, progress)
+    with transaction.atomic():
+        deleted, _ = Match.objects.filter(pk=match_id, deleted_at__isnull=False).delete()
+        if progress is not None:
+            progress(deleted)
+    return total + deleted
+
+
+def purge_user(user_id, batch_size=BATCH_SIZE, progress=None):
+    """退会ユーザーのデータを削除し、最後にユーザー自体を削除する
+
+    いいねはシグナルで相手側の集計値とおすすめ候補を更新しながら消し、
+    その後に（いいね削除で積まれ得る）おすすめ候補を消す。
+    """
+    total = 0
+    for queryset in (
+        Like.objects.filter(from_user=user_id),
+        Like.objects.filter(to_user=user_id),
+    ):
+        total += _delete_in_batches(queryset, batch_size, progress)
+    for match_id in Match.objects.filter(Q(user1=user_id) | Q(user2=user_id)).values_list('id', flat=True):
+        Match.objects.filter(pk=match_id, deleted_at__isnull=True).update(deleted_at=timezone.now(), pair_key=None)
+        total += purge_match(match_id, batch_size, progress)
+    for queryset in (
+        SwipeEvent.objects.filter(actor=user_id),
+        SwipeEvent.objects.filter(target=user_id),
+        DiscoverCandidate.objects.filter(user=user_id),
+        DiscoverCandidate.objects.filter(candidate=user_id),
+        Block.objects.filter(Q(blocker=user_id) | Q(blocked=user_id)),
+    ):
+        total += _delete_in_batches(queryset, batch_size, progress)
+    with transaction.atomic():
+        deleted, _ = User.objects.filter(pk=user_id, is_active=False).delete()
+        if progress is not None:
+            progress(deleted)
+    return total + deleted
+
+
+def claim_job():
+    """処理するジョブを1件取得してロックを取る（ロック期限切れの処理中ジョブも再開する）"""
+    now = timezone.now()
+    with transaction.atomic():
+        job = PurgeJob.objects.select_for_update(skip_locked=True).filter(
+            Q(locked_until__isnull=True) | Q(locked_until__lt=now),
+            status__in=[PurgeJob.PENDING, PurgeJob.RUNNING],
+        ).order_by('id').first()
+        if job is None:
+            return None
+        job.status = PurgeJob.RUNNING
+        job.attempts += 1
+        job.locked_until = now + LEASE
+        job.started_at = job.started_at or now
+        job.save()
+    return job
+
+
+def run_job(job, batch_size=BATCH_SIZE):
+    """ジョブを実行する（進捗とロック期限はバッチごとに保存）"""
+    def progress(deleted):
+        job.batches += 1
+        job.deleted_rows += deleted
+        job.locked_until = timezone.now() + LEASE
+        job.save(update_fields=['batches', 'deleted_rows', 'locked_until'])
+
+    try:
+        if job.kind == PurgeJob.MATCH:
+            purge_match(job.target_id, batch_size, progress)
+        else:
+            purge_user(job.target_id, batch_size, progress)
+    except Exception as e:
+        job.status = PurgeJob.FAILED if job.attempts >= MAX_ATTEMPTS else PurgeJob.PENDING
+        job.last_error = str(e)
+        job.locked_until = None
+        job.save(update_fields=['status', 'last_error', 'locked_until'])
+        raise
+
+    job.status = PurgeJob.DONE
+    job.locked_until = None
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'locked_until', 'finished_at'])
+    return job
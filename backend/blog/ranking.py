@@ -0,0 +1,246 @@
+"""
+興味・趣味の類似度によるおすすめランキング
+
+Profile.interests を語彙（興味ごとの語ID）に変換し、プロフィールごとの
+疎ベクトル（語IDの集合）と語ごとの転置リストをプロセス内に保持する。
+自分の興味の転置リストを np.bincount で集計して全候補の共通語数を
+一度に求め、Jaccard / コサイン類似度の上位 K 件を返す。
+索引は Profile の保存・削除で差分更新し、他プロセスでの更新は
+updated_at を使って定期的に取り込む。他プロセスでの削除・退会は updated_at では
+届かないため、rank() で上位の候補を DB で確かめ、いなくなったユーザーをその場で索引から外す。
+"""
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+
+from .models import Profile
+
+SYNC_INTERVAL = getattr(settings, 'RANKING_SYNC_INTERVAL', 5)
+GENDER_CODES = {code: i + 1 for i, (code, label) in enumerate(Profile.GENDER_CHOICES)}
+METRICS = ('jaccard', 'cosine')
+
+
+def parse_interests(interests):
+    """カンマ区切りの興味を正規化した集合に変換"""
+    if not interests:
+        return set()
+    return {term.strip().casefold() for term in interests.split(',') if term.strip()}
+
+
+class InterestIndex:
+    """興味ベクトルのインメモリ索引"""
+
+    def __init__(self, capacity=1024):
+        self.vocabulary = {}
+        self.locations = {}
+        self.rows = {}
+        self.row_terms = []
+        self.postings = {}
+        self.posting_arrays = {}
+        self.size = 0
+        self.user_ids = np.zeros(capacity, dtype=np.int64)
+        self.counts = np.zeros(capacity, dtype=np.int32)
+        self.ages = np.zeros(capacity, dtype=np.int32)
+        self.genders = np.zeros(capacity, dtype=np.int8)
+        self.location_codes = np.zeros(capacity, dtype=np.int32)
+        self.active = np.zeros(capacity, dtype=bool)
+        self.synced_at = None
+        self.checked_at = 0.0
+        self.lock = threading.RLock()
+
+    def _grow(self):
+        capacity = len(self.user_ids) * 2
+        for name in ('user_ids', 'counts', 'ages', 'genders', 'location_codes', 'active'):
+            array = getattr(self, name)
+            grown = np.zeros(capacity, dtype=array.dtype)
+            grown[:len(array)] = array
+            setattr(self, name, grown)
+
+    def _vectorize(self, interests):
+        """興味の集合を語IDの集合に変換（未知の語は語彙に追加）"""
+        term_ids = set()
+        for term in parse_interests(interests):
+            if term not in self.vocabulary:
+                self.vocabulary[term] = len(self.vocabulary)
+            term_ids.add(self.vocabulary[term])
+        return frozenset(term_ids)
+
+    def _posting(self, term_id):
+        """語の転置リストを NumPy 配列で取得（更新されるまでキャッシュ）"""
+        array = self.posting_arrays.get(term_id)
+        if array is None:
+            array = np.fromiter(self.postings.get(term_id, ()), dtype=np.int64)
+            self.posting_arrays[term_id] = array
+        return array
+
+    def _set_terms(self, row, term_ids):
+        old_term_ids = self.row_terms[row]
+        for term_id in old_term_ids - term_ids:
+            self.postings[term_id].discard(row)
+            self.posting_arrays.pop(term_id, None)
+        for term_id in term_ids - old_term_ids:
+            self.postings.setdefault(term_id, set()).add(row)
+            self.posting_arrays.pop(term_id, None)
+        self.row_terms[row] = term_ids
+
+    def add(self, user_id, age, gender, location, interests):
+        """プロフィールを索引に追加・更新"""
+        with self.lock:
+            row = self.rows.get(user_id)
+            if row is None:
+                if self.size == len(self.user_ids):
+                    self._grow()
+                row = self.size
+                self.size += 1
+                self.rows[user_id] = row
+                self.row_terms.append(frozenset())
+
+            location = (location or '').strip()
+            if location and location not in self.locations:
+                self.locations[location] = len(self.locations) + 1
+
+            term_ids = self._vectorize(interests)
+            self._set_terms(row, term_ids)
+            self.user_ids[row] = user_id
+            self.counts[row] = len(term_ids)
+            self.ages[row] = age if age is not None else -1
+            self.genders[row] = GENDER_CODES.get(gender, 0)
+            self.location_codes[row] = self.locations.get(location, 0)
+            self.active[row] = True
+
+    def remove(self, user_id):
+        """プロフィールを索引から外す（行は再利用しない）"""
+        with self.lock:
+            row = self.rows.get(user_id)
+            if row is not None:
+                self._set_terms(row, frozenset())
+                self.active[row] = False
+
+    def rank(self, user_id, k, exclude=(), min_age=None, max_age=None,
+             gender=None, location=None, metric='jaccard'):
+        """類似度の高い順にユーザーIDと類似度の組を最大 k 件返す"""
+        with self.lock:
+            n = self.size
+            if not n or k <= 0:
+                return []
+
+            mask = self.active[:n].copy()
+            if min_age is not None:
+                mask &= self.ages[:n] >= min_age
+            if max_age is not None:
+                mask &= (self.ages[:n] >= 0) & (self.ages[:n] <= max_age)
+            if gender:
+                mask &= self.genders[:n] == GENDER_CODES.get(gender, -1)
+            if location:
+                mask &= self.location_codes[:n] == self.locations.get(location.strip(), -1)
+            if exclude:
+                mask &= ~np.isin(self.user_ids[:n], np.fromiter(exclude, dtype=np.int64))
+
+            my_row = self.rows.get(user_id)
+            my_terms = frozenset()
+            if my_row is not None:
+                mask[my_row] = False
+                my_terms = self.row_terms[my_row]
+
+            # 共通の興味を持つ候補だけを採点する
+            rows = np.zeros(0, dtype=np.int64)
+            common = np.zeros(0, dtype=np.int64)
+            if my_terms:
+                postings = np.concatenate([self._posting(term_id) for term_id in my_terms])
+                common = np.bincount(postings, minlength=n)[:n]
+                rows = np.flatnonzero(mask & (common > 0))
+                common = common[rows]
+
+            counts = self.counts[rows]
+            if metric == 'cosine':
+                denominator = np.sqrt(counts * float(len(my_terms)))
+            else:
+                denominator = (counts + len(my_terms) - common).astype(np.float64)
+            scores = np.divide(
+                common, denominator, out=np.zeros(len(rows), dtype=np.float64), where=denominator > 0
+            )
+
+            if len(rows) > k:
+                top = np.argpartition(-scores, k - 1)[:k]
+                rows, scores = rows[top], scores[top]
+            user_ids = self.user_ids[rows]
+            # 類似度の降順、同点はユーザーIDの昇順
+            order = np.lexsort((user_ids, -scores))
+            ranked = [(int(user_ids[i]), float(scores[i])) for i in order]
+
+            # 共通の興味を持つ候補が k 件に満たなければ類似度 0 の候補で埋める
+            if len(ranked) < k:
+                mask[rows] = False
+                rest = self.user_ids[np.flatnonzero(mask)[:k - len(ranked)]]
+                ranked += [(int(user_id), 0.0) for user_id in rest]
+            return ranked
+
+    def load(self, queryset):
+        """プロフィールを一括で読み込む"""
+        for user_id, age, gender, location, interests, updated_at in queryset.values_list(
+            'user_id', 'age', 'gender', 'location', 'interests', 'updated_at'
+        ).iterator(chunk_size=2000):
+            self.add(user_id, age, gender, location, interests)
+            if self.synced_at is None or updated_at > self.synced_at:
+                self.synced_at = updated_at
+
+    def sync(self):
+        """他プロセスで更新されたプロフィールを取り込む（SYNC_INTERVAL 秒ごと）"""
+        now = time.monotonic()
+        if now - self.checked_at < SYNC_INTERVAL:
+            return
+        self.checked_at = now
+        queryset = Profile.objects.all()
+        if self.synced_at is not None:
+            queryset = queryset.filter(updated_at__gt=self.synced_at)
+        self.load(queryset)
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """プロセス内で共有する索引を取得（初回は全件から構築）"""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                index = InterestIndex()
+                index.sync()
+                _index = index
+    _index.sync()
+    return _index
+
+
+def rank(user_id, k, **filters):
+    """索引の上位 k 件から、プロフィールが削除された・無効化されたユーザーを除いて返す
+
+    除いたユーザーは索引から外し、空いた分は次の候補で埋める。
+    """
+    index = get_index()
+    while True:
+        ranked = index.rank(user_id, k, **filters)
+        user_ids = [ranked_id for ranked_id, score in ranked]
+        live = set(
+            Profile.objects.filter(user_id__in=user_ids, user__is_active=True).values_list('user_id', flat=True)
+        )
+        stale = set(user_ids) - live
+        if not stale:
+            return ranked
+        for stale_id in stale:
+            index.remove(stale_id)
+
+
+def update_profile(profile):
+    """保存されたプロフィールを索引に反映（索引が未構築なら何もしない）"""
+    if _index is not None:
+        _index.add(profile.user_id, profile.age, profile.gender, profile.location, profile.interests)
+
+
+def remove_profile(profile):
+    """削除されたプロフィールを索引から外す"""
+    if _index is not None:
+        _index.remove(profile.user_id)
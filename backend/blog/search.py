@@ -0,0 +1,201 @@
+"""
+プロフィールの全文検索
+
+日本語の文章は単語の区切りがないため、文字 n-gram（既定はバイグラム）で
+転置索引を作る。MySQL では ngram パーサー付きの FULLTEXT インデックス
+（マイグレーション 0006 で作成）を使い、それ以外（SQLite でのテストなど）は
+プロセス内の転置索引にフォールバックする。
+"""
+import math
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, When, IntegerField
+from django.db.models.expressions import RawSQL
+
+from .models import Profile
+
+SEARCH_FIELDS = ('display_name', 'bio', 'interests', 'location')
+NGRAM_SIZE = 2
+MAX_RESULTS = 1000
+SYNC_INTERVAL = getattr(settings, 'SEARCH_SYNC_INTERVAL', 5)
+
+_separator = re.compile(r'[\s,、。・/|]+')
+
+
+def normalize(text):
+    """全角・半角や大文字小文字の違いを吸収"""
+    return unicodedata.normalize('NFKC', text or '').casefold()
+
+
+def split_terms(query):
+    """検索語を区切り文字で分割"""
+    return [term for term in _separator.split(normalize(query)) if term]
+
+
+def ngrams(text, size=NGRAM_SIZE):
+    """文字列を n-gram に分割（区切り文字をまたがない・短い語はそのまま）"""
+    grams = []
+    for term in split_terms(text):
+        if len(term) <= size:
+            grams.append(term)
+        else:
+            grams.extend(term[i:i + size] for i in range(len(term) - size + 1))
+    return grams
+
+
+class InProcessIndex:
+    """n-gram 転置索引（プロセス内）"""
+
+    def __init__(self):
+        self.postings = defaultdict(dict)
+        self.documents = {}
+        self.synced_at = None
+        self.checked_at = 0.0
+        self.lock = threading.RLock()
+
+    def add(self, profile_id, texts):
+        """プロフィールを索引に追加・更新"""
+        with self.lock:
+            self.remove(profile_id)
+            text = '\n'.join(normalize(text) for text in texts)
+            for gram, count in Counter(ngrams(text)).items():
+                self.postings[gram][profile_id] = count
+            self.documents[profile_id] = text
+
+    def remove(self, profile_id):
+        """プロフィールを索引から外す"""
+        with self.lock:
+            text = self.documents.pop(profile_id, None)
+            if text is None:
+                return
+            for gram in set(ngrams(text)):
+                postings = self.postings.get(gram)
+                if postings is not None:
+                    postings.pop(profile_id, None)
+                    if not postings:
+                        del self.postings[gram]
+
+    def search(self, query, limit=MAX_RESULTS):
+        """すべての検索語を含むプロフィールを TF-IDF の降順で返す"""
+        terms = split_terms(query)
+        if not terms:
+            return []
+        with self.lock:
+            grams = set(ngrams(' '.join(term for term in terms if len(term) >= NGRAM_SIZE)))
+            postings = sorted((self.postings.get(gram, {}) for gram in grams), key=len)
+            if postings:
+                # 最も短い転置リストから候補を絞り込む
+                candidates = set(postings[0])
+                for posting in postings[1:]:
+                    candidates.intersection_update(posting)
+                    if not candidates:
+                        return []
+            else:
+                # n-gram より短い検索語だけの場合は全件を走査する
+                candidates = self.documents.keys()
+
+            total = len(self.documents)
+            scores = []
+            for profile_id in candidates:
+                # n-gram の一致だけでは語順が保証されないので原文で確認する
+                text = self.documents[profile_id]
+                if not all(term in text for term in terms):
+                    continue
+                score = sum(
+                    (1 + math.log(posting[profile_id])) * math.log(1 + total / len(posting))
+                    for posting in postings
+                ) + sum(text.count(term) for term in terms if len(term) < NGRAM_SIZE)
+                scores.append((score, profile_id))
+            scores.sort(key=lambda item: (-item[0], item[1]))
+            return [(profile_id, score) for score, profile_id in scores[:limit]]
+
+    def load(self, queryset):
+        """プロフィールを一括で読み込む"""
+        for row in queryset.values_list('id', 'updated_at', *SEARCH_FIELDS).iterator(chunk_size=2000):
+            profile_id, updated_at, texts = row[0], row[1], row[2:]
+            self.add(profile_id, texts)
+            if self.synced_at is None or updated_at > self.synced_at:
+                self.synced_at = updated_at
+
+    def sync(self):
+        """他プロセスで更新されたプロフィールを取り込む（SYNC_INTERVAL 秒ごと）"""
+        now = time.monotonic()
+        if now - self.checked_at < SYNC_INTERVAL:
+            return
+        self.checked_at = now
+        queryset = Profile.objects.all()
+        if self.synced_at is not None:
+            queryset = queryset.filter(updated_at__gt=self.synced_at)
+        self.load(queryset)
+
+
+class InProcessBackend:
+    """プロセス内の転置索引を使う検索バックエンド"""
+    _index = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def get_index(cls):
+        if cls._index is None:
+            with cls._lock:
+                if cls._index is None:
+                    index = InProcessIndex()
+                    index.sync()
+                    cls._index = index
+        cls._index.sync()
+        return cls._index
+
+    def search(self, queryset, query):
+        ranked = self.get_index().search(query)
+        if not ranked:
+            return queryset.none()
+        relevance = Case(
+            *[When(id=profile_id, then=position) for position, (profile_id, score) in enumerate(ranked)],
+            output_field=IntegerField()
+        )
+        return queryset.filter(id__in=[profile_id for profile_id, score in ranked]).order_by(relevance)
+
+
+class MySQLFulltextBackend:
+    """MySQL の FULLTEXT（ngram パーサー）インデックスを使う検索バックエンド"""
+
+    def search(self, queryset, query):
+        # 各検索語をフレーズ検索にして AND で結合する
+        terms = [term.replace('"', '') for term in split_terms(query)]
+        against = ' '.join(f'+"{term}"' for term in terms if term)
+        if not against:
+            return queryset.none()
+        match = 'MATCH ({}) AGAINST (%s IN BOOLEAN MODE)'.format(
+            ', '.join(f'{Profile._meta.db_table}.{field}' for field in SEARCH_FIELDS)
+        )
+        return queryset.annotate(
+            search_relevance=RawSQL(match, (against,))
+        ).filter(search_relevance__gt=0).order_by('-search_relevance')
+
+
+def get_backend():
+    """設定（PROFILE_SEARCH_BACKEND）とDBの種類から検索バックエンドを選ぶ"""
+    backend = getattr(settings, 'PROFILE_SEARCH_BACKEND', 'auto')
+    if backend == 'auto':
+        backend = 'mysql' if connection.vendor == 'mysql' else 'inprocess'
+    if backend == 'mysql':
+        return MySQLFulltextBackend()
+    return InProcessBackend()
+
+
+def update_profile(profile):
+    """保存されたプロフィールをプロセス内の索引に反映（未構築なら何もしない）"""
+    if InProcessBackend._index is not None:
+        InProcessBackend._index.add(profile.id, [getattr(profile, field) for field in SEARCH_FIELDS])
+
+
+def remove_profile(profile):
+    """削除されたプロフィールをプロセス内の索引から外す"""
+    if InProcessBackend._index is not None:
+        InProcessBackend._index.remove(profile.id)
@@ -1,6 +1,12 @@
 from rest_framework import serializers
+from rest_framework.fields import SkipField
 from django.contrib.auth.models import User
-from .models import Profile, Like, Match, Message, Block
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import models
+from .models import Profile, Like, Match, MatchMember, Message, Block
+from . import profilecache
+from .avatars import avatar_url, avatar_urls
+from .geocoding import geocode
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -16,21 +22,61 @@ class ProfileSerializer(serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
     username = serializers.CharField(source='user.username', read_only=True)
     interests_list = serializers.ListField(read_only=True)
+    avatar_urls = serializers.SerializerMethodField()
     
     class Meta:
         model = Profile
         fields = [
             'id', 'user', 'username', 'display_name', 'bio', 'age', 'gender',
-            'location', 'avatar', 'interests', 'interests_list',
+            'location', 'latitude', 'longitude', 'avatar', 'avatar_urls', 'interests', 'interests_list',
             'created_at', 'updated_at'
         ]
         read_only_fields = ['id', 'user', 'created_at', 'updated_at']
+    
+    def get_avatar_urls(self, obj):
+        return avatar_urls(obj, self.context.get('request'))
+    
+    def validate(self, attrs):
+        # 座標の指定がなく居住地だけが変わった場合は同梱の地名テーブルから補完
+        if 'location' in attrs and 'latitude' not in attrs and 'longitude' not in attrs:
+            attrs['latitude'], attrs['longitude'] = geocode(attrs['location']) or (None, None)
+        return attrs
+
+
+class ProfileFragmentListSerializer(serializers.ListSerializer):
+    """一覧に含まれるプロフィールの断片をページ単位でまとめてキャッシュから引く ListSerializer
+
+    要素がプロフィールならそれ自体を、そうでなければ ProfileListSerializer の
+    フィールドが指すプロフィールを集め、get_many 1回で引いて context に入れておく。
+    """
+    def to_representation(self, data):
+        items = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        if isinstance(self.child, ProfileListSerializer):
+            fields, profiles = [self.child], items
+        else:
+            fields = [field for field in self.child.fields.values() if isinstance(field, ProfileListSerializer)]
+            profiles = [self.nested_profile(field, item) for item in items for field in fields]
+        if fields:
+            self.context.setdefault(profilecache.CONTEXT_KEY, {}).update(
+                profilecache.fragments(profiles, fields[0].serialize)
+            )
+        return super().to_representation(items)
+    
+    def nested_profile(self, field, item):
+        try:
+            return field.get_attribute(item)
+        except (SkipField, AttributeError, ObjectDoesNotExist):
+            return None
 
 
 class ProfileListSerializer(serializers.ModelSerializer):
-    """プロフィール一覧用シリアライザ（軽量版）"""
+    """プロフィール一覧用シリアライザ（軽量版）
+
+    出力はプロフィールIDとバージョンをキーにキャッシュする（profilecache）。
+    """
     username = serializers.CharField(source='user.username', read_only=True)
     user_id = serializers.IntegerField(source='user.id', read_only=True)
+    avatar = serializers.SerializerMethodField()
     
     class Meta:
         model = Profile
@@ -38,6 +84,26 @@ class ProfileListSerializer(serializers.ModelSerializer):
             'id', 'user_id', 'username', 'display_name', 'age', 'gender',
             'location', 'avatar', 'bio'
         ]
+        list_serializer_class = ProfileFragmentListSerializer
+    
+    def to_representation(self, instance):
+        key = profilecache.cache_key(instance)
+        data = self.context.get(profilecache.CONTEXT_KEY, {}).get(key)
+        if data is None:
+            data = profilecache.fragments([instance], self.serialize)[key]
+        # 断片はリクエストによらない形（画像は相対 URL）で持ち、ここで絶対 URL にする
+        request = self.context.get('request')
+        if request is not None and data['avatar']:
+            data = {**data, 'avatar': request.build_absolute_uri(data['avatar'])}
+        return data
+    
+    def serialize(self, instance):
+        """キャッシュせずにシリアライズ"""
+        return super().to_representation(instance)
+    
+    def get_avatar(self, obj):
+        # 一覧のカードには元画像ではなく縮小版を返す
+        return avatar_url(obj)
 
 
 class LikeSerializer(serializers.ModelSerializer):
@@ -50,11 +116,27 @@ class LikeSerializer(serializers.ModelSerializer):
         model = Like
         fields = ['id', 'from_user', 'to_user', 'from_user_profile', 'to_user_profile', 'is_mutual', 'created_at']
         read_only_fields = ['id', 'from_user', 'created_at']
+        list_serializer_class = ProfileFragmentListSerializer
     
     def get_is_mutual(self, obj):
         return obj.is_mutual()
 
 
+class SwipeSerializer(serializers.Serializer):
+    """スワイプ（いいね / パス）1件分のシリアライザ"""
+    ACTION_CHOICES = ['like', 'pass']
+    
+    to_user = serializers.IntegerField()
+    action = serializers.ChoiceField(choices=ACTION_CHOICES)
+
+
+class SwipeBatchSerializer(serializers.Serializer):
+    """スワイプ一括送信用シリアライザ"""
+    MAX_SWIPES = 100
+    
+    swipes = SwipeSerializer(many=True, allow_empty=False, max_length=MAX_SWIPES)
+
+
 class MatchSerializer(serializers.ModelSerializer):
     """マッチングシリアライザ"""
     user1_profile = ProfileListSerializer(source='user1.profile', read_only=True)
@@ -64,6 +146,26 @@ class MatchSerializer(serializers.ModelSerializer):
         model = Match
         fields = ['id', 'user1', 'user2', 'user1_profile', 'user2_profile', 'created_at']
         read_only_fields = ['id', 'created_at']
+        list_serializer_class = ProfileFragmentListSerializer
+
+
+class InboxSerializer(serializers.ModelSerializer):
+    """受信箱（会話一覧）シリアライザ：相手のプロフィール・最新メッセージ・未読数"""
+    match_id = serializers.IntegerField(read_only=True)
+    partner_profile = ProfileListSerializer(source='partner.profile', read_only=True)
+    last_message = serializers.CharField(source='match.last_message_content', read_only=True)
+    last_message_sender = serializers.IntegerField(source='match.last_message_sender_id', read_only=True)
+    last_message_at = serializers.DateTimeField(source='match.last_message_at', read_only=True)
+    last_activity_at = serializers.DateTimeField(read_only=True)
+    unread_count = serializers.IntegerField(read_only=True)
+    
+    class Meta:
+        model = MatchMember
+        fields = [
+            'match_id', 'partner', 'partner_profile', 'last_message', 'last_message_sender',
+            'last_message_at', 'last_activity_at', 'unread_count', 'created_at'
+        ]
+        list_serializer_class = ProfileFragmentListSerializer
 
 
 class MessageSerializer(serializers.ModelSerializer):
@@ -83,12 +185,15 @@ class MessageSerializer(serializers.ModelSerializer):
         """送信者の表示名を取得（プロフィールがない場合はユーザー名を返す）"""
         try:
             return obj.sender.profile.display_name
-        except:
+        except Profile.DoesNotExist:
             return obj.sender.username
 
 
 class MessageCreateSerializer(serializers.ModelSerializer):
     """メッセージ作成用シリアライザ"""
+    # 解除済みのマッチングには送信できない
+    match = serializers.PrimaryKeyRelatedField(queryset=Match.objects.filter(deleted_at__isnull=True))
+    
     class Meta:
         model = Message
         fields = ['match', 'content']
@@ -103,5 +208,6 @@ class BlockSerializer(serializers.ModelSerializer):
         model = Block
         fields = ['id', 'blocker', 'blocked', 'blocked_username', 'blocked_profile', 'reason', 'created_at']
         read_only_fields = ['id', 'blocker', 'created_at']
+        list_serializer_class = ProfileFragmentListSerializer
 
 
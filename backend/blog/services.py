@@ -0,0 +1,166 @@
+from collections import namedtuple
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Q
+
+from . import counters, events, swipelog
+from .models import Like, Match, MatchMember, Message, DiscoverCandidate, SwipeEvent
+
+LikeResult = namedtuple('LikeResult', ['like', 'created', 'match', 'match_created'])
+SwipeResult = namedtuple('SwipeResult', ['liked', 'already_liked', 'passed', 'invalid', 'matches'])
+
+
+def like_user(from_user, to_user_id):
+    """いいねを送り、相互いいねになればマッチングを作成する
+
+    1トランザクションで次の順に実行する（相手が存在しなければ User.DoesNotExist）。
+    1. 2人のユーザー行をID順に FOR UPDATE で取得（存在確認と、同じ2人の間の処理の直列化）
+    2. 双方向のいいねを1回の SELECT で取得
+    3. 自分のいいねがなければ INSERT、相手からのいいねがあればマッチングを作成
+
+    同時に送り合った場合も、後からロックを取った側が相手のいいねを必ず読むので
+    マッチングの作り漏れや unique_together の衝突は起きない。
+    いいねとマッチングのシグナルによる集計値の加算は、最後に1回の UPDATE でまとめて行う。
+    """
+    with transaction.atomic(), counters.batch():
+        users = {
+            user.id: user
+            for user in User.objects.select_for_update().filter(
+                id__in=[from_user.id, to_user_id], is_active=True
+            ).order_by('id')
+        }
+        if to_user_id not in users:
+            raise User.DoesNotExist('User not found')
+        to_user = users[to_user_id]
+
+        like = None
+        is_mutual = False
+        for existing in Like.objects.select_for_update().filter(
+            Q(from_user=from_user, to_user=to_user) | Q(from_user=to_user, to_user=from_user)
+        ):
+            if existing.from_user_id == from_user.id:
+                like = existing
+            else:
+                is_mutual = True
+
+        created = like is None
+        if created:
+            # 相互かどうかは読んだばかりなので、集計値のシグナルで数え直させない
+            like = Like(from_user=from_user, to_user=to_user)
+            like.mutual = is_mutual
+            like.save()
+            swipelog.record(from_user, [to_user.id], SwipeEvent.LIKE)
+        like.mutual = is_mutual
+
+        match, match_created = None, False
+        if is_mutual:
+            match, match_created = Match.create_match(from_user, to_user)
+
+        return LikeResult(like, created, match, match_created)
+
+
+def swipe(from_user, swipes, excluded=frozenset()):
+    """いいね / パスの判定をまとめて反映する
+
+    swipes は (相手のユーザーID, 'like' or 'pass') の列（同じ相手は最後の判定を使う）。
+    excluded（ブロック関係にあるユーザーIDなど）の相手は存在しないユーザーと同じく invalid にする。
+    相手の存在確認とロック、双方向のいいねの取得、いいねの一括 INSERT、
+    新しいマッチングの一括作成をそれぞれ1回の問い合わせで行う。
+    """
+    decisions = {}
+    for to_user_id, action in swipes:
+        decisions[to_user_id] = action
+    decisions.pop(from_user.id, None)
+
+    with transaction.atomic(), counters.batch():
+        # like_user() と同じくユーザー行をID順にロックして相互いいねの判定を直列化
+        valid_ids = set(
+            User.objects.select_for_update().filter(
+                id__in=[from_user.id, *decisions], is_active=True
+            ).order_by('id').values_list('id', flat=True)
+        ) - set(excluded)
+        invalid = sorted(user_id for user_id in decisions if user_id not in valid_ids)
+        like_ids = {user_id for user_id, action in decisions.items() if action == 'like' and user_id in valid_ids}
+        pass_ids = {user_id for user_id, action in decisions.items() if action == 'pass' and user_id in valid_ids}
+
+        already_liked = set()
+        liked_me = set()
+        for liker_id, liked_id in Like.objects.filter(
+            Q(from_user=from_user, to_user__in=like_ids) | Q(from_user__in=like_ids, to_user=from_user)
+        ).values_list('from_user_id', 'to_user_id'):
+            if liker_id == from_user.id:
+                already_liked.add(liked_id)
+            else:
+                liked_me.add(liker_id)
+
+        liked = like_ids - already_liked
+        Like.objects.bulk_create(
+            [Like(from_user=from_user, to_user_id=user_id) for user_id in sorted(liked)],
+            ignore_conflicts=True
+        )
+        swipelog.record(from_user, sorted(liked), SwipeEvent.LIKE)
+        swipelog.record(from_user, sorted(pass_ids), SwipeEvent.PASS)
+
+        matches = []
+        matched_ids = liked & liked_me
+        if matched_ids:
+            Match.objects.bulk_create(
+                [
+                    Match(
+                        user1_id=min(from_user.id, user_id), user2_id=max(from_user.id, user_id),
+                        pair_key=Match.build_pair_key(from_user.id, user_id)
+                    )
+                    for user_id in sorted(matched_ids)
+                ],
+                ignore_conflicts=True
+            )
+            # 作成したばかりで隣接リストの行がまだないのでペアのキーで引く（解除済みのマッチングは含まない）
+            matches = list(Match.objects.filter(
+                pair_key__in=[Match.build_pair_key(from_user.id, user_id) for user_id in matched_ids]
+            ))
+            MatchMember.objects.bulk_create(
+                [member for match in matches for member in match.build_members()],
+                ignore_conflicts=True
+            )
+
+        # bulk_create ではシグナルが送られないので候補キューと集計値はここで更新する
+        DiscoverCandidate.objects.filter(user=from_user, candidate__in=liked | pass_ids).delete()
+        counters.bump(
+            [from_user.id],
+            likes_sent=len(liked), pending_likes=-len(matched_ids), matches=len(matched_ids)
+        )
+        counters.bump(liked - matched_ids, likes_received=1, pending_likes=1)
+        counters.bump(matched_ids, likes_received=1, matches=1)
+        for match in matches:
+            events.match_created(match)
+
+    return SwipeResult(sorted(liked), sorted(already_liked), sorted(pass_ids), invalid, matches)
+
+
+def mark_read(user, match_id, message_id=None):
+    """マッチングの既読位置を message_id まで進める（省略時は最新のメッセージまで）
+
+    既読位置は MatchMember.last_read_message_id の1回の UPDATE で進め、
+    新たに既読になった相手のメッセージ数だけ未読数を減らす。
+    既読位置を返す（自分のマッチングでなければ MatchMember.DoesNotExist、
+    message_id がこのマッチングのメッセージでなければ Message.DoesNotExist）。
+    """
+    messages = Message.objects.filter(match_id=match_id)
+    with transaction.atomic():
+        member = MatchMember.objects.select_for_update().get(match_id=match_id, user=user)
+        if message_id is None:
+            message_id = messages.order_by('-id').values_list('id', flat=True).first() or 0
+        elif not messages.filter(id=message_id).exists():
+            raise Message.DoesNotExist('Message not found in this match')
+
+        if message_id <= member.last_read_message_id:
+            return member.last_read_message_id
+
+        newly_read = messages.filter(
+            id__gt=member.last_read_message_id, id__lte=message_id, sender=member.partner_id
+        ).count()
+        MatchMember.objects.filter(pk=member.pk).update(last_read_message_id=message_id)
+        counters.bump([user.id], unread_messages=-newly_read)
+        events.messages_read(member.match_id, member.partner_id, message_id)
+    return message_id
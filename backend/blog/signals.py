@@ -0,0 +1,175 @@
+from django.contrib.auth.models import User
+from django.db.models import F
+from django.db.models.signals import post_save, pre_delete, post_delete
+from django.dispatch import receiver
+
+from . import blocks, counters, discover, events, interests, messagesearch, ranking, search
+from .models import Profile, Like, Match, Message, Block
+
+
+def _deleting_user(origin):
+    """ユーザー削除のカスケードによる削除かどうかを判定"""
+    return isinstance(origin, User) or getattr(origin, 'model', None) is User
+
+
+@receiver(post_save, sender=Like)
+def remove_liked_candidate(sender, instance, created, **kwargs):
+    """いいねしたユーザーをおすすめ候補から外す"""
+    if created:
+        discover.dequeue(instance.from_user, instance.to_user)
+
+
+@receiver(post_delete, sender=Like)
+def restore_unliked_candidate(sender, instance, origin=None, **kwargs):
+    """いいねが取り消されたユーザーをおすすめ候補に戻す"""
+    if _deleting_user(origin):
+        return
+    discover.enqueue(instance.from_user, instance.to_user)
+
+
+@receiver(post_save, sender=Block)
+def remove_blocked_candidates(sender, instance, created, **kwargs):
+    """ブロック関係にあるユーザーを双方のおすすめ候補から外す"""
+    if created:
+        discover.dequeue(instance.blocker, instance.blocked)
+        discover.dequeue(instance.blocked, instance.blocker)
+
+
+@receiver(post_delete, sender=Block)
+def restore_unblocked_candidates(sender, instance, origin=None, **kwargs):
+    """ブロック解除されたユーザーを双方のおすすめ候補に戻す"""
+    if _deleting_user(origin):
+        return
+    discover.enqueue(instance.blocker, instance.blocked)
+    discover.enqueue(instance.blocked, instance.blocker)
+
+
+@receiver(post_save, sender=Block)
+@receiver(post_delete, sender=Block)
+def invalidate_blocked_users(sender, instance, **kwargs):
+    """ブロックの作成・解除で双方の除外セットのキャッシュを消す"""
+    blocks.invalidate(instance.blocker_id, instance.blocked_id)
+
+
+@receiver(post_save, sender=User)
+def bump_profile_cache_version(sender, instance, created, update_fields=None, **kwargs):
+    """ユーザー名はシリアライズ済みプロフィールに含まれるので、ユーザーの保存でもバージョンを上げる"""
+    if created or (update_fields is not None and 'username' not in update_fields):
+        return
+    Profile.objects.filter(user_id=instance.pk).update(cache_version=F('cache_version') + 1)
+
+
+@receiver(post_save, sender=Profile)
+def update_interest_index(sender, instance, **kwargs):
+    """興味・属性の変更をランキング索引に反映する"""
+    ranking.update_profile(instance)
+
+
+@receiver(post_delete, sender=Profile)
+def remove_from_interest_index(sender, instance, **kwargs):
+    """削除されたプロフィールをランキング索引から外す"""
+    ranking.remove_profile(instance)
+
+
+@receiver(post_save, sender=Profile)
+def sync_interest_tags(sender, instance, update_fields=None, **kwargs):
+    """興味の変更を興味タグに反映する（興味を含まない update_fields の保存では何もしない）"""
+    if update_fields is None or 'interests' in update_fields:
+        interests.sync(instance)
+
+
+@receiver(pre_delete, sender=Profile)
+def uncount_profile_interests(sender, instance, **kwargs):
+    """削除されるプロフィールを興味タグごとのプロフィール数から引く"""
+    interests.profile_deleted(instance)
+
+
+@receiver(post_save, sender=Profile)
+def update_search_index(sender, instance, **kwargs):
+    """プロフィールの変更を全文検索の索引に反映する"""
+    search.update_profile(instance)
+
+
+@receiver(post_delete, sender=Profile)
+def remove_from_search_index(sender, instance, **kwargs):
+    """削除されたプロフィールを全文検索の索引から外す"""
+    search.remove_profile(instance)
+
+
+@receiver(post_save, sender=Like)
+def count_created_like(sender, instance, created, **kwargs):
+    """いいね作成を集計値に反映する（作成側が mutual を設定していれば問い合わせない）"""
+    if created:
+        is_mutual = getattr(instance, 'mutual', None)
+        if is_mutual is None:
+            is_mutual = _reverse_like_exists(instance)
+        counters.like_created(instance.from_user_id, instance.to_user_id, is_mutual)
+
+
+def _reverse_like_exists(like):
+    return Like.objects.filter(from_user=like.to_user_id, to_user=like.from_user_id).exists()
+
+
+@receiver(pre_delete, sender=Like)
+def collect_mutual_of_like(sender, instance, origin=None, **kwargs):
+    """削除前に相互いいねだったかを控えておく（双方向をまとめて削除する場合に必要）"""
+    if not _deleting_user(origin):
+        instance._was_mutual = _reverse_like_exists(instance)
+
+
+@receiver(post_delete, sender=Like)
+def count_deleted_like(sender, instance, origin=None, **kwargs):
+    """いいね削除を集計値に反映する（ユーザー削除時は reconcile_counters に任せる）"""
+    if _deleting_user(origin):
+        return
+    counters.like_deleted(
+        instance.from_user_id, instance.to_user_id,
+        getattr(instance, '_was_mutual', False), _reverse_like_exists(instance)
+    )
+
+
+@receiver(post_save, sender=Match)
+def count_created_match(sender, instance, created, **kwargs):
+    """マッチング作成を集計値に反映し、両方の参加者に通知する"""
+    if created:
+        counters.bump([instance.user1_id, instance.user2_id], matches=1)
+        events.match_created(instance)
+
+
+@receiver(pre_delete, sender=Match)
+def collect_unread_of_match(sender, instance, origin=None, **kwargs):
+    """カスケード削除されるメッセージの未読数を削除前に控えておく"""
+    if not _deleting_user(origin) and instance.deleted_at is None:
+        instance._unread_counts = counters.unread_counts(instance)
+
+
+@receiver(post_delete, sender=Match)
+def count_deleted_match(sender, instance, origin=None, **kwargs):
+    """マッチング削除（と未読メッセージの削除）を集計値に反映する
+
+    解除済み（deleted_at あり）のマッチングは解除時に反映済みなので何もしない。
+    """
+    if _deleting_user(origin) or instance.deleted_at is not None:
+        return
+    counters.bump([instance.user1_id, instance.user2_id], matches=-1)
+    for user_id, count in getattr(instance, '_unread_counts', {}).items():
+        counters.bump([user_id], unread_messages=-count)
+
+
+@receiver(post_save, sender=Message)
+def count_created_message(sender, instance, created, **kwargs):
+    """新着メッセージを受信者の未読数に反映し、両方の参加者に配信する"""
+    if created:
+        match = instance.match
+        recipient_id = match.user2_id if instance.sender_id == match.user1_id else match.user1_id
+        counters.bump([recipient_id], unread_messages=1)
+        events.message_created(instance)
+
+
+@receiver(post_save, sender=Message)
+def index_saved_message(sender, instance, created, update_fields=None, **kwargs):
+    """新着メッセージを索引に追加し、編集されたメッセージは索引を作り直す"""
+    if created:
+        messagesearch.index_message(instance)
+    elif update_fields is None or 'content' in update_fields:
+        messagesearch.rebuild([instance])
@@ -0,0 +1,69 @@
+"""
+スワイプイベントのログ
+
+SwipeEvent は追記専用で、一定期間を過ぎたイベントは
+archive_swipe_events コマンドで圧縮ファイルに移して削除する。
+削除後もおすすめから除外できるよう、パスした相手のIDは
+ユーザーごとに SwipeArchive へ圧縮した集合として残す。
+"""
+import zlib
+
+from .models import SwipeEvent, SwipeArchive
+
+
+def encode_ids(user_ids):
+    """ユーザーIDの集合を差分 + 可変長整数 + zlib で圧縮"""
+    data = bytearray()
+    previous = 0
+    for user_id in sorted(set(user_ids)):
+        delta = user_id - previous
+        previous = user_id
+        while delta >= 0x80:
+            data.append((delta & 0x7f) | 0x80)
+            delta >>= 7
+        data.append(delta)
+    return zlib.compress(bytes(data)) if data else b''
+
+
+def decode_ids(data):
+    """encode_ids() で圧縮したユーザーIDの集合を復元"""
+    user_ids = set()
+    if not data:
+        return user_ids
+    previous = 0
+    delta = 0
+    shift = 0
+    for byte in zlib.decompress(bytes(data)):
+        delta |= (byte & 0x7f) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        previous += delta
+        user_ids.add(previous)
+        delta = 0
+        shift = 0
+    return user_ids
+
+
+def record(actor, target_ids, action):
+    """スワイプイベントを追記"""
+    SwipeEvent.objects.bulk_create([
+        SwipeEvent(actor=actor, target_id=target_id, action=action) for target_id in target_ids
+    ])
+
+
+def passed_user_ids(user, user_ids=None):
+    """パスした相手のユーザーID（アーカイブ済みを含む）
+
+    user_ids を指定するとその中だけを調べる。
+    """
+    events = SwipeEvent.objects.filter(actor=user, action=SwipeEvent.PASS)
+    if user_ids is not None:
+        events = events.filter(target__in=user_ids)
+    passed = set(events.values_list('target_id', flat=True))
+
+    archived = SwipeArchive.objects.filter(user=user).values_list('passed_targets', flat=True).first()
+    archived = decode_ids(archived)
+    if user_ids is not None:
+        archived &= set(user_ids)
+    return passed | archived
@@ -0,0 +1,65 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from accounts.authentication import CachedJWTAuthentication, invalidate_user, user_cache, version_key
+from blog.models import Profile
+
+
+class CachedAuthenticationTests(TestCase):
+    """認証済みユーザーのキャッシュ（プロフィールの作成と、無効化の即時反映）"""
+
+    def setUp(self):
+        cache.clear()
+        user_cache.clear()
+        self.user = User.objects.create_user('alice', password='x')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+
+    def test_me_creates_missing_profile(self):
+        response = self.client.get('/api/blog/profiles/me/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(Profile.objects.filter(user=self.user).exists())
+
+        # 作成でキャッシュが消え、次はプロフィール付きで読み直される
+        response = self.client.get('/api/blog/profiles/me/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNotNone(user_cache.get(self.user.id, cache.get(version_key(self.user.id))).profile)
+
+    def test_cache_hit_runs_no_user_query(self):
+        Profile.objects.create(user=self.user, display_name='alice')
+        self.client.get('/api/blog/profiles/me/')
+        authentication = CachedJWTAuthentication()
+        token = authentication.get_validated_token(str(AccessToken.for_user(self.user)))
+        with self.assertNumQueries(0):
+            user = authentication.get_user(token)
+        self.assertEqual(user.profile.display_name, 'alice')
+
+    def test_deactivation_invalidates(self):
+        Profile.objects.create(user=self.user, display_name='alice')
+        self.assertEqual(self.client.get('/api/blog/profiles/me/').status_code, 200)
+        self.assertEqual(self.client.delete('/api/auth/me/').status_code, 204)
+        self.assertEqual(self.client.get('/api/blog/profiles/me/').status_code, 401)
+
+    def test_invalidation_from_another_process(self):
+        Profile.objects.create(user=self.user, display_name='alice')
+        self.assertEqual(self.client.get('/api/blog/profiles/me/').status_code, 200)
+
+        # 別のプロセスでの無効化: 共有キャッシュのバージョンだけが上がり、このプロセスのキャッシュは残る
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        with mock.patch('accounts.authentication.user_cache.invalidate'):
+            invalidate_user(self.user.pk)
+        self.assertEqual(self.client.get('/api/blog/profiles/me/').status_code, 401)
+
+    def test_password_change_reloads_user(self):
+        Profile.objects.create(user=self.user, display_name='alice')
+        self.client.get('/api/blog/profiles/me/')
+        self.user.set_password('changed')
+        self.user.save()
+        self.client.get('/api/blog/profiles/me/')
+        version = cache.get(version_key(self.user.id))
+        self.assertEqual(user_cache.get(self.user.id, version).password, self.user.password)
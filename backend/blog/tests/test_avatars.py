@@ -0,0 +1,273 @@
+import io
+import shutil
+import struct
+import tempfile
+import zlib
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from rest_framework.test import APIClient
+
+from blog import avatars
+from blog.avatars import SIZES, AvatarTooLarge, InvalidAvatar, render
+from blog.models import Profile
+
+
+def encode(image, format, **params):
+    buffer = io.BytesIO()
+    image.save(buffer, format, **params)
+    buffer.seek(0)
+    return Image.open(buffer)
+
+
+def image_bytes(size=(64, 48), format='PNG'):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, (0, 128, 255)).save(buffer, format)
+    return buffer.getvalue()
+
+
+def forged_png(width, height):
+    """ヘッダー（IHDR）だけが大きな画像を名乗る PNG（画素データは 1x1）"""
+    data = bytearray(image_bytes((1, 1)))
+    struct.pack_into('>II', data, 16, width, height)
+    struct.pack_into('>I', data, 29, zlib.crc32(bytes(data[12:29])))
+    return bytes(data)
+
+
+def upload(data):
+    return avatars.receive(io.BytesIO(data))
+
+
+class UnreadableStream:
+    def read(self, size=-1):
+        raise AssertionError('本文を読んではいけない')
+
+
+class ReceiveTests(SimpleTestCase):
+    """アップロードの受け取り（バイト数の上限）"""
+
+    def test_declared_length_over_limit(self):
+        with self.assertRaises(AvatarTooLarge):
+            avatars.receive(UnreadableStream(), avatars.MAX_UPLOAD_SIZE + 1)
+
+    def test_body_over_limit_without_length(self):
+        with mock.patch('blog.avatars.MAX_UPLOAD_SIZE', 1000), self.assertRaises(AvatarTooLarge):
+            avatars.receive(io.BytesIO(b'x' * 1001))
+
+    def test_empty_body(self):
+        with self.assertRaises(InvalidAvatar):
+            avatars.receive(io.BytesIO(b''))
+        with self.assertRaises(InvalidAvatar):
+            avatars.receive(None)
+
+    def test_body_is_rewound(self):
+        data = image_bytes()
+        with avatars.receive(io.BytesIO(data), len(data)) as received:
+            self.assertEqual(received.read(), data)
+
+
+class InspectTests(SimpleTestCase):
+    """画像の検査（形式・画素数・壊れたデータ）"""
+
+    def test_valid_images(self):
+        for format, extension in [('PNG', 'png'), ('JPEG', 'jpg'), ('GIF', 'gif'), ('WEBP', 'webp')]:
+            with self.subTest(format=format), upload(image_bytes(format=format)) as received:
+                self.assertEqual(avatars.inspect(received), extension)
+                # 検査の後は先頭から読み直せる
+                self.assertEqual(received.tell(), 0)
+
+    def test_rejects_non_image(self):
+        with upload(b'<?php echo "hello"; ?>') as received, self.assertRaises(InvalidAvatar):
+            avatars.inspect(received)
+
+    def test_rejects_unsupported_format(self):
+        with upload(image_bytes(format='BMP')) as received, self.assertRaises(InvalidAvatar):
+            avatars.inspect(received)
+
+    def test_rejects_spoofed_header(self):
+        # PNG のシグネチャと IHDR の後が壊れている
+        data = image_bytes((256, 256))
+        with upload(data[:40] + b'\0' * 200) as received, self.assertRaises(InvalidAvatar):
+            avatars.inspect(received)
+        # JPEG のマーカーで始まるだけのデータ
+        with upload(b'\xff\xd8\xff\xe0' + b'x' * 100) as received, self.assertRaises(InvalidAvatar):
+            avatars.inspect(received)
+
+    def test_rejects_too_many_pixels_before_decoding(self):
+        with upload(forged_png(6000, 6000)) as received:
+            with mock.patch.object(Image.Image, 'load', side_effect=AssertionError('デコードしてはいけない')):
+                with self.assertRaises(AvatarTooLarge):
+                    avatars.inspect(received)
+        # Pillow の上限も超える大きさ
+        with upload(forged_png(100_000, 100_000)) as received, self.assertRaises(AvatarTooLarge):
+            avatars.inspect(received)
+
+
+class RenderTests(SimpleTestCase):
+    """縮小版の生成（縮小してから向きの補正・透過の合成を行う）"""
+
+    def test_exif_orientation_after_reduce(self):
+        image = Image.new('RGB', (4400, 2200), (255, 0, 0))
+        exif = image.getexif()
+        # 時計回りに90度回して表示する
+        exif[0x0112] = 6
+        rendered = render(encode(image, 'PNG', exif=exif))
+        with Image.open(io.BytesIO(rendered['large'])) as large:
+            self.assertEqual(large.size, (SIZES['large'] // 2, SIZES['large']))
+
+    def test_palette_transparency(self):
+        image = Image.new('P', (2400, 2400), 0)
+        image.putpalette([0, 0, 0, 255, 0, 0])
+        image.paste(1, (0, 0, 1200, 2400))
+        rendered = render(encode(image, 'PNG', transparency=0))
+        with Image.open(io.BytesIO(rendered['medium'])) as medium:
+            self.assertGreater(medium.getpixel((10, 10))[0], 200)
+            # 透過部分は白で埋める
+            self.assertEqual(min(medium.getpixel((500, 10))), 255)
+
+    def test_rejects_too_many_pixels_before_decoding(self):
+        # reduce は元の大きさのまま全体をデコードするので、その前に断る
+        image = encode(Image.new('RGB', (1200, 1200)), 'PNG')
+        with mock.patch('blog.avatars.MAX_PIXELS', 1_000_000), self.assertRaises(AvatarTooLarge):
+            render(image)
+        with self.assertRaises(AvatarTooLarge):
+            render(Image.open(io.BytesIO(forged_png(6000, 6000))))
+
+    def test_jpeg_pixels_are_counted_after_draft(self):
+        # JPEG は draft で縮小してデコードするので、縮小後の画素数で判定する
+        image = encode(Image.new('RGB', (2400, 2400)), 'JPEG')
+        with mock.patch('blog.avatars.MAX_PIXELS', 2_000_000):
+            rendered = render(image)
+        self.assertEqual(set(rendered), set(SIZES))
+
+
+class StoredAvatarTestCase(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.user = User.objects.create_user('alice', password='x')
+        self.profile = Profile.objects.create(user=self.user, display_name='alice')
+
+
+class AcceptTests(StoredAvatarTestCase):
+    """アップロードの受け付け（API 経由）"""
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def put(self, data, content_type='image/png'):
+        return self.client.generic('PUT', '/api/blog/profiles/me/avatar/', data, content_type=content_type)
+
+    def test_accepts_image(self):
+        response = self.put(image_bytes())
+        self.assertEqual(response.status_code, 200, response.content)
+        self.profile.refresh_from_db()
+        self.assertTrue(self.profile.avatar.name.endswith('.png'))
+        # 縮小版ができるまでは元画像を返す
+        self.assertIn(self.profile.avatar.name, response.json()['avatar_urls']['small'])
+
+    def test_extension_comes_from_content(self):
+        # Content-Type や名前ではなく中身の形式で保存する
+        response = self.put(image_bytes(format='JPEG'), content_type='image/png')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.profile.refresh_from_db()
+        self.assertTrue(self.profile.avatar.name.endswith('.jpg'))
+
+    def test_rejects_non_image(self):
+        response = self.put(b'GIF89a not really', content_type='image/gif')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('error', response.json())
+        self.profile.refresh_from_db()
+        self.assertFalse(self.profile.avatar)
+
+    def test_rejects_oversized(self):
+        with mock.patch('blog.avatars.MAX_UPLOAD_SIZE', 1000):
+            response = self.put(image_bytes((512, 512)))
+        self.assertEqual(response.status_code, 413)
+        response = self.put(forged_png(6000, 6000))
+        self.assertEqual(response.status_code, 413)
+        self.profile.refresh_from_db()
+        self.assertFalse(self.profile.avatar)
+
+
+class ProcessTests(StoredAvatarTestCase):
+    """縮小版の作成（process_avatars）"""
+
+    def store_avatar(self, data, name='avatar.png'):
+        self.profile.avatar.save(name, ContentFile(data))
+        return self.profile
+
+    def test_creates_thumbnails(self):
+        profile = self.store_avatar(image_bytes((1200, 900)))
+        self.assertTrue(Profile.objects.get(pk=profile.pk).avatar_pending)
+        self.assertTrue(avatars.process(profile))
+        profile.refresh_from_db()
+        self.assertEqual(set(profile.avatar_thumbnails), set(SIZES))
+        self.assertEqual(profile.avatar_source, profile.avatar.name)
+        self.assertFalse(profile.avatar_pending)
+        self.assertFalse(avatars.pending_profiles().exists())
+
+    def test_replaced_avatar_is_pending_again(self):
+        profile = self.store_avatar(image_bytes())
+        avatars.process(profile)
+        # 保存し直しただけでは作成待ちにならない
+        profile.save(update_fields=['display_name'])
+        self.assertFalse(avatars.pending_profiles().exists())
+        self.store_avatar(image_bytes(), 'other.png')
+        self.assertEqual(list(avatars.pending_profiles()), [profile])
+
+    def test_too_many_pixels_is_marked_processed(self):
+        # 検査の前に保存された画像でも、デコードせずに縮小版なしで処理済みにする
+        profile = self.store_avatar(forged_png(6000, 6000))
+        with mock.patch.object(Image.Image, 'load', side_effect=AssertionError('デコードしてはいけない')):
+            self.assertFalse(avatars.process(profile))
+        profile.refresh_from_db()
+        self.assertEqual(profile.avatar_thumbnails, {})
+        self.assertEqual(profile.avatar_source, profile.avatar.name)
+
+    def test_unreadable_image_is_marked_processed(self):
+        profile = self.store_avatar(b'not an image')
+        self.assertFalse(avatars.process(profile))
+        profile.refresh_from_db()
+        self.assertEqual(profile.avatar_source, profile.avatar.name)
+
+
+class Stop(Exception):
+    pass
+
+
+class ProcessAvatarsCommandTests(StoredAvatarTestCase):
+    """process_avatars コマンド"""
+
+    def test_processes_pending_in_batches(self):
+        profiles = [self.profile]
+        for i in range(2):
+            user = User.objects.create_user(f'user{i}', password='x')
+            profiles.append(Profile.objects.create(user=user, display_name=user.username))
+        for profile in profiles:
+            profile.avatar.save('avatar.png', ContentFile(image_bytes()))
+        out = io.StringIO()
+        call_command('process_avatars', '--batch-size', '2', stdout=out)
+        self.assertIn('Processed 3 avatars', out.getvalue())
+        self.assertFalse(avatars.pending_profiles().exists())
+
+    def test_idle_loop_reads_only_pending_index(self):
+        self.profile.avatar.save('avatar.png', ContentFile(image_bytes()))
+        avatars.process(self.profile)
+        # 作成待ちがなければ、1回の待機につき作成待ちのインデックスを1回引くだけ
+        with mock.patch('blog.management.commands.process_avatars.time.sleep', side_effect=Stop):
+            with CaptureQueriesContext(connection) as queries, self.assertRaises(Stop):
+                call_command('process_avatars', '--loop', stdout=io.StringIO())
+        self.assertEqual(len(queries), 1)
+        self.assertIn('avatar_pending', queries[0]['sql'])
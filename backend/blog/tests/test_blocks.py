@@ -0,0 +1,39 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from blog import blocks
+from blog.models import Block, Profile
+
+
+class StaleBlockCacheTests(TestCase):
+    """他のプロセスの古い除外セットが残っていても、書き込みではブロックが破られないこと"""
+
+    def setUp(self):
+        cache.clear()
+        self.alice = User.objects.create_user('alice', password='x')
+        self.bob = User.objects.create_user('bob', password='x')
+        for user in (self.alice, self.bob):
+            Profile.objects.create(user=user, display_name=user.username)
+        Block.objects.create(blocker=self.bob, blocked=self.alice)
+        # ブロック前に読み込まれた（削除が届かなかった）集合を再現する
+        cache.set(blocks.cache_key(self.alice.id), frozenset(), blocks.TIMEOUT)
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+
+    def test_like(self):
+        response = self.client.post('/api/blog/likes/', {'to_user': self.bob.id}, format='json')
+        self.assertEqual(response.status_code, 404)
+
+    def test_swipe(self):
+        response = self.client.post(
+            '/api/blog/likes/swipes/', {'swipes': [{'to_user': self.bob.id, 'action': 'like'}]}, format='json'
+        )
+        self.assertEqual(response.data['invalid'], [self.bob.id])
+
+    def test_invalidated_on_block(self):
+        cache.delete(blocks.cache_key(self.alice.id))
+        self.assertEqual(blocks.blocked_user_ids(self.alice.id), {self.bob.id})
+        Block.objects.all().delete()
+        self.assertEqual(blocks.blocked_user_ids(self.alice.id), set())
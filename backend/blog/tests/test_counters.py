@@ -0,0 +1,80 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+from blog import counters
+from blog.models import Like, UserCounters
+from blog.services import like_user
+
+
+class BumpTests(TestCase):
+    """集計値の差分加算"""
+
+    def setUp(self):
+        self.alice = User.objects.create_user('alice', password='x')
+        self.bob = User.objects.create_user('bob', password='x')
+
+    def assert_matches_data(self, *users):
+        computed = counters.compute([user.id for user in users])
+        for user in users:
+            row = UserCounters.objects.get(user=user)
+            self.assertEqual({field: getattr(row, field) for field in UserCounters.COUNTER_FIELDS}, computed[user.id])
+
+    def test_missing_rows_are_created_from_data(self):
+        # 集計値の行がないまま作られたいいね（行を作る前からのデータ）
+        Like.objects.bulk_create([Like(from_user=self.bob, to_user=self.alice)])
+        self.assertFalse(UserCounters.objects.exists())
+
+        like_user(self.alice, self.bob.id)
+        self.assert_matches_data(self.alice, self.bob)
+
+    def test_row_created_concurrently(self):
+        # 存在確認の後に別のリクエストが行を作っても、作り直さずにその行へ加算する
+        compute = counters.compute
+
+        def compute_after_other_insert(user_ids):
+            UserCounters.objects.create(user=self.alice, likes_received=1)
+            return compute(user_ids)
+
+        with mock.patch('blog.counters.compute', compute_after_other_insert):
+            counters.bump([self.alice.id], likes_received=1)
+        self.assertEqual(UserCounters.objects.get(user=self.alice).likes_received, 2)
+
+    def test_existing_rows_take_a_single_update(self):
+        # 行があれば存在確認をせず UPDATE だけで加算する
+        counters.rebuild([self.alice.id, self.bob.id])
+        with self.assertNumQueries(1):
+            counters.bump([self.alice.id, self.bob.id], likes_received=1)
+        self.assertEqual(UserCounters.objects.get(user=self.alice).likes_received, 1)
+
+    def test_only_missing_rows_are_created(self):
+        # 一部の行だけがない場合は、ない行だけを実データから作る
+        counters.rebuild([self.alice.id])
+        Like.objects.bulk_create([Like(from_user=self.alice, to_user=self.bob)])
+        counters.bump([self.alice.id], likes_sent=1)
+        counters.bump([self.alice.id, self.bob.id], likes_received=0, matches=0)
+        counters.bump([self.bob.id], likes_received=1, pending_likes=1)
+        self.assert_matches_data(self.alice, self.bob)
+
+    def test_batch_applies_once_on_exit(self):
+        counters.rebuild([self.alice.id, self.bob.id])
+        with self.assertNumQueries(1):
+            with counters.batch():
+                counters.bump([self.alice.id], likes_sent=1)
+                with counters.batch():
+                    counters.bump([self.alice.id, self.bob.id], matches=1)
+                counters.add({self.bob.id: {'likes_received': 1}})
+        row = UserCounters.objects.get(user=self.alice)
+        self.assertEqual((row.likes_sent, row.matches, row.likes_received), (1, 1, 0))
+        row = UserCounters.objects.get(user=self.bob)
+        self.assertEqual((row.likes_sent, row.matches, row.likes_received), (0, 1, 1))
+
+    def test_batch_discards_on_error(self):
+        counters.rebuild([self.alice.id])
+        with self.assertRaises(ValueError), counters.batch():
+            counters.bump([self.alice.id], likes_sent=1)
+            raise ValueError
+        self.assertEqual(UserCounters.objects.get(user=self.alice).likes_sent, 0)
+        counters.bump([self.alice.id], likes_sent=1)
+        self.assertEqual(UserCounters.objects.get(user=self.alice).likes_sent, 1)
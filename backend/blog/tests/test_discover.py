@@ -0,0 +1,74 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from blog.discover import refill_queue
+from blog.models import DiscoverCandidate, Profile
+
+
+class DiscoverQueueTests(TestCase):
+    """discover の候補キュー"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('viewer', password='x')
+        Profile.objects.create(user=self.user, display_name='viewer')
+        for i in range(30):
+            user = User.objects.create_user(f'user{i}', password='x')
+            Profile.objects.create(user=user, display_name=user.username)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_refills_requested_page_size(self):
+        refill_queue(self.user, size=5)
+        response = self.client.get('/api/blog/profiles/discover/', {'page_size': 20})
+        self.assertEqual(len(response.data['results']), 20)
+
+    def test_shown_candidates_stay_queued(self):
+        first = self.client.get('/api/blog/profiles/discover/').data['results']
+        self.assertEqual(self.client.get('/api/blog/profiles/discover/').data['results'], first)
+
+        self.client.post('/api/blog/likes/', {'to_user': first[0]['user_id']}, format='json')
+        self.assertFalse(DiscoverCandidate.objects.filter(user=self.user, candidate_id=first[0]['user_id']).exists())
+
+
+class DiscoverPagingTests(TestCase):
+    """キューの大きさ（DISCOVER_QUEUE_SIZE）を越えてページを読めること"""
+
+    ELIGIBLE = 250
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('viewer', password='x')
+        Profile.objects.create(user=self.user, display_name='viewer')
+        users = User.objects.bulk_create([User(username=f'user{i}') for i in range(self.ELIGIBLE)])
+        Profile.objects.bulk_create([Profile(user=user, display_name=user.username) for user in users])
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def collect(self, url, params):
+        """next をたどって全ページの user_id を集める"""
+        user_ids = []
+        response = self.client.get(url, params)
+        while True:
+            self.assertEqual(response.status_code, 200)
+            user_ids += [profile['user_id'] for profile in response.data['results']]
+            if not response.data['next']:
+                return user_ids
+            response = self.client.get(response.data['next'])
+
+    def test_page_past_queue_size(self):
+        response = self.client.get('/api/blog/profiles/discover/', {'page': 11})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 10)
+
+    def test_page_numbers_reach_every_profile(self):
+        user_ids = self.collect('/api/blog/profiles/discover/', {'page_size': 10})
+        self.assertEqual(len(user_ids), self.ELIGIBLE)
+        self.assertEqual(len(set(user_ids)), self.ELIGIBLE)
+
+    def test_cursor_reaches_every_profile(self):
+        user_ids = self.collect('/api/blog/profiles/discover/', {'pagination': 'cursor', 'page_size': 10})
+        self.assertEqual(len(user_ids), self.ELIGIBLE)
+        self.assertEqual(len(set(user_ids)), self.ELIGIBLE)
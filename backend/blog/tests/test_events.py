@@ -0,0 +1,115 @@
+import asyncio
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.test import TestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from accounts.authentication import user_cache
+from blog.models import PubSubEvent
+from blog.pubsub import DatabaseBroker, get_broker, user_channel
+
+IDLE_CONNECTIONS = 200
+
+
+class EventStreamTests(TestCase):
+    """/api/blog/events/ の SSE"""
+
+    def setUp(self):
+        user_cache.clear()
+        self.user = User.objects.create_user('alice', password='x')
+        self.token = str(AccessToken.for_user(self.user))
+
+    async def open_stream(self):
+        response = await self.async_client.get('/api/blog/events/', {'token': self.token})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        content = response.streaming_content
+        self.assertEqual(await anext(content), b'retry: 3000\n\n')
+        return response, content
+
+    async def close_streams(self, streams):
+        """送信を終えた応答を閉じると（ASGI ハンドラーと同じ）購読が解除されること"""
+        for response, content in streams:
+            await content.aclose()
+            response.close()
+        self.assertEqual(get_broker().connection_count(), 0)
+
+    async def test_requires_token(self):
+        response = await self.async_client.get('/api/blog/events/')
+        self.assertEqual(response.status_code, 401)
+
+    async def test_rejects_inactive_user(self):
+        self.user.is_active = False
+        await self.user.asave()
+        response = await self.async_client.get('/api/blog/events/', {'token': self.token})
+        self.assertEqual(response.status_code, 401)
+
+    @mock.patch('blog.events.HEARTBEAT', 0.05)
+    async def test_closes_after_deactivation(self):
+        response, content = await self.open_stream()
+        self.assertEqual(await asyncio.wait_for(anext(content), 5), b': ping\n\n')
+
+        self.user.is_active = False
+        await self.user.asave()
+        # 次のハートビートで確かめ直してストリームを終える
+        with self.assertRaises(StopAsyncIteration):
+            await asyncio.wait_for(anext(content), 5)
+        response.close()
+        self.assertEqual(get_broker().connection_count(), 0)
+
+    def test_rejects_wsgi(self):
+        # WSGI ではストリームを送れないのでワーカーを占有せずに断る
+        response = self.client.get('/api/blog/events/', {'token': self.token})
+        self.assertEqual(response.status_code, 503)
+
+    async def test_receives_published_event(self):
+        response, content = await self.open_stream()
+        get_broker().publish(user_channel(self.user.id), {'type': 'match', 'match': 1, 'partner': 2})
+        chunk = await asyncio.wait_for(anext(content), 5)
+        self.assertTrue(chunk.startswith(b'event: match\ndata: '))
+        await self.close_streams([(response, content)])
+
+    async def test_idle_connections(self):
+        # 多数の待機接続を同時に保持し、全員にイベントが届いて、切断で購読が片付くこと
+        broker = get_broker()
+        streams = await asyncio.gather(*[self.open_stream() for _ in range(IDLE_CONNECTIONS)])
+        self.assertEqual(broker.connection_count(), IDLE_CONNECTIONS)
+
+        broker.publish(user_channel(self.user.id), {'type': 'unmatch', 'match': 1})
+        chunks = await asyncio.wait_for(asyncio.gather(*[anext(content) for _, content in streams]), 10)
+        self.assertTrue(all(chunk.startswith(b'event: unmatch\n') for chunk in chunks))
+
+        await self.close_streams(streams)
+
+
+@mock.patch.object(DatabaseBroker, 'start', lambda self: None)
+class DatabaseBrokerTests(TestCase):
+    """プロセス間の受け渡し（ポーリングはスレッドを起動せずに直接呼ぶ）"""
+
+    async def test_delivers_between_brokers(self):
+        publisher, receiver = DatabaseBroker(), DatabaseBroker()
+        subscription = receiver.subscribe([user_channel(1)])
+        await sync_to_async(receiver.poll)()
+
+        await sync_to_async(publisher.publish)(user_channel(1), {'type': 'match', 'match': 1})
+        await sync_to_async(publisher.publish)(user_channel(2), {'type': 'match', 'match': 2})
+        self.assertEqual(await sync_to_async(receiver.poll)(), 2)
+        self.assertEqual(await subscription.get(timeout=1), {'type': 'match', 'match': 1})
+        self.assertIsNone(await subscription.get(timeout=0.1))
+        subscription.close()
+
+    def test_rereads_uncommitted_gap(self):
+        broker = DatabaseBroker()
+        broker.poll()
+        first = PubSubEvent.objects.create(channel='user:1', payload={'type': 'read'})
+        # 先に採番された行より後の行が先にコミットされた状態
+        PubSubEvent.objects.create(id=first.id + 2, channel='user:1', payload={'type': 'read'})
+        self.assertEqual(broker.poll(), 2)
+        self.assertIn(first.id + 1, broker.gaps)
+
+        PubSubEvent.objects.create(id=first.id + 1, channel='user:1', payload={'type': 'read'})
+        self.assertEqual(broker.poll(), 1)
+        self.assertEqual(broker.gaps, {})
+        self.assertEqual(broker.poll(), 0)
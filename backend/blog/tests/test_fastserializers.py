@@ -0,0 +1,98 @@
+import json
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from blog import ranking
+from blog.models import Block, Match, Message, Profile
+from blog.services import like_user
+
+URLS = [
+    '/api/blog/profiles/',
+    '/api/blog/profiles/?pagination=cursor',
+    '/api/blog/profiles/discover/',
+    '/api/blog/profiles/discover/?rank=interests',
+    '/api/blog/profiles/discover/?nearest=10',
+    '/api/blog/profiles/discover/?interests=music',
+    '/api/blog/likes/',
+    '/api/blog/likes/sent/',
+    '/api/blog/likes/received/',
+    '/api/blog/likes/?pagination=cursor',
+    '/api/blog/matches/',
+    '/api/blog/matches/inbox/',
+    '/api/blog/blocks/',
+    '/api/blog/messages/',
+]
+
+
+class FastSerializerOutputTests(TestCase):
+    """高速シリアライザの出力が ModelSerializer と同じであること（対象のすべての一覧）"""
+
+    def setUp(self):
+        self.addCleanup(setattr, ranking, '_index', None)
+        ranking._index = None
+        cache.clear()
+        self.viewer = User.objects.create_user('viewer', password='x')
+        Profile.objects.create(
+            user=self.viewer, display_name='viewer', interests='music,hiking', latitude=35.68, longitude=139.76
+        )
+        users = []
+        for i in range(6):
+            user = User.objects.create_user(f'user{i}', password='x')
+            Profile.objects.create(
+                user=user, display_name=f'User {i}', age=20 + i, gender='female', location='Tokyo',
+                bio=f'bio {i}', interests='music' if i % 2 else 'music,hiking',
+                latitude=35.68 + i / 100, longitude=139.76,
+            )
+            users.append(user)
+        # 縮小版のある画像・縮小版のまだない画像
+        Profile.objects.filter(user=users[0]).update(
+            avatar='avatars/a.png', avatar_source='avatars/a.png',
+            avatar_thumbnails={'small': 'avatars/small/a.jpg', 'medium': 'avatars/medium/a.jpg'}
+        )
+        Profile.objects.filter(user=users[1]).update(avatar='avatars/b.png')
+        # プロフィールのないユーザー
+        no_profile = User.objects.create_user('noprofile', password='x')
+
+        for user in users[:4] + [no_profile]:
+            like_user(user, self.viewer.id)
+        for user in (users[0], users[1], no_profile):
+            like_user(self.viewer, user.id)
+        like_user(self.viewer, users[4].id)
+        match = Match.objects.get(pair_key=Match.build_pair_key(self.viewer.id, users[0].id))
+        for i in range(3):
+            message = Message.objects.create(match=match, sender=users[0] if i % 2 else self.viewer, content=f'm{i}')
+            match.set_last_message(message)
+        Block.objects.create(blocker=self.viewer, blocked=users[5], reason='spam')
+
+        self.client = APIClient()
+        self.client.force_authenticate(self.viewer)
+
+    def get(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+        return json.loads(response.content)
+
+    def test_same_output(self):
+        for url in URLS:
+            with self.subTest(url=url):
+                with mock.patch('blog.fastserializers.ENABLED', False):
+                    expected = self.get(url)
+                self.assertTrue(expected['results'])
+                # ModelSerializer が保存した断片を引いた場合
+                self.assertEqual(self.get(url), expected)
+                # 断片がキャッシュにない場合
+                cache.clear()
+                self.assertEqual(self.get(url), expected)
+
+    def test_profile_change_is_not_served_stale(self):
+        self.get('/api/blog/likes/received/')
+        profile = Profile.objects.get(user__username='user2')
+        profile.display_name = 'Renamed'
+        profile.save()
+        names = [like['from_user_profile']['display_name'] for like in self.get('/api/blog/likes/received/')['results']
+                 if like['from_user_profile']]
+        self.assertIn('Renamed', names)
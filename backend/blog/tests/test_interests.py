@@ -0,0 +1,59 @@
+from django.contrib.auth.models import User
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from blog import interests
+from blog.models import Interest, Profile, ProfileInterest
+
+
+class SyncTests(TestCase):
+    """興味タグの同期（プロフィールの保存シグナル）"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('alice', password='x')
+
+    def tag_names(self, profile):
+        return set(ProfileInterest.objects.filter(profile=profile).values_list('interest__name', flat=True))
+
+    def counts(self):
+        return dict(Interest.objects.values_list('name', 'profile_count'))
+
+    def test_orm_save_syncs_tags(self):
+        # ProfileSerializer を通さない保存でもタグが付く
+        profile = Profile.objects.create(user=self.user, display_name='alice', interests='Music, hiking')
+        self.assertEqual(self.tag_names(profile), {'music', 'hiking'})
+
+        profile.interests = 'hiking,cooking'
+        profile.save()
+        self.assertEqual(self.tag_names(profile), {'hiking', 'cooking'})
+        self.assertEqual(self.counts(), {'music': 0, 'hiking': 1, 'cooking': 1})
+
+    def test_unrelated_update_fields_skip_sync(self):
+        profile = Profile.objects.create(user=self.user, display_name='alice', interests='music')
+        Profile.objects.filter(pk=profile.pk).update(interests='hiking')
+        profile.refresh_from_db()
+        profile.save(update_fields=['display_name'])
+        self.assertEqual(self.tag_names(profile), {'music'})
+        profile.save(update_fields=['interests'])
+        self.assertEqual(self.tag_names(profile), {'hiking'})
+
+    def test_variants_are_separate_tags(self):
+        # 照合順序で同じとみなされうる かな・濁点・アクセントの違いも別のタグにする
+        profile = Profile.objects.create(
+            user=self.user, display_name='alice', interests='カフェ,かふぇ,カヘ,café,cafe'
+        )
+        self.assertEqual(self.tag_names(profile), {'カフェ', 'かふぇ', 'カヘ', 'café', 'cafe'})
+        self.assertEqual(set(self.counts().values()), {1})
+
+    def test_truncated_name_has_no_trailing_space(self):
+        name = 'a' * (interests.NAME_LENGTH - 1) + ' b'
+        profile = Profile.objects.create(user=self.user, display_name='alice', interests=name)
+        self.assertEqual(self.tag_names(profile), {'a' * (interests.NAME_LENGTH - 1)})
+
+    def test_api_update_counts_once(self):
+        profile = Profile.objects.create(user=self.user, display_name='alice', interests='music')
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.patch(f'/api/blog/profiles/{profile.pk}/', {'interests': 'music,hiking'}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(self.counts(), {'music': 1, 'hiking': 1})
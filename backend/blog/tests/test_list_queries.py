@@ -0,0 +1,98 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from blog.models import Match, Message, Profile
+from blog.services import like_user
+
+SMALL = 2
+LARGE = 8
+
+
+class ListQueryCountTests(TestCase):
+    """一覧の問い合わせ回数が行数によらず一定であること（N+1 がないこと）"""
+
+    def setUp(self):
+        cache.clear()
+        self.viewer = User.objects.create_user('viewer', password='x')
+        Profile.objects.create(user=self.viewer, display_name='viewer')
+        self.client = APIClient()
+        self.client.force_authenticate(self.viewer)
+
+    def populate(self, count):
+        """count 人から自分へのいいね（半分は相互にしてマッチング）と、1つのマッチングに count 件のメッセージを作る"""
+        others = []
+        for i in range(count):
+            user = User.objects.create_user(f'user{count}-{i}', password='x')
+            Profile.objects.create(user=user, display_name=user.username, interests='music,hiking')
+            like_user(user, self.viewer.id)
+            others.append(user)
+        for user in others[::2]:
+            like_user(self.viewer, user.id)
+        match = Match.objects.filter(user2=others[0]).first() or Match.objects.get(user1=others[0])
+        for i in range(count):
+            message = Message.objects.create(match=match, sender=others[0], content=f'message {i}')
+            match.set_last_message(message)
+        return match
+
+    def assert_constant_queries(self, expected, url, cached=None):
+        """SMALL 件と LARGE 件で、url の問い合わせ回数がどちらも expected であること
+
+        cached を指定すると、除外セットとプロフィールの断片がキャッシュに載った2回目の回数も確かめる。
+        """
+        for count in (SMALL, LARGE):
+            with self.subTest(url=url, rows=count):
+                Match.objects.all().delete()
+                User.objects.exclude(pk=self.viewer.pk).delete()
+                cache.clear()
+                match = self.populate(count)
+                with self.assertNumQueries(expected):
+                    response = self.client.get(url.format(match_id=match.id))
+                self.assertEqual(response.status_code, 200)
+                self.assertTrue(response.data['results'])
+                if cached is not None:
+                    with self.assertNumQueries(cached):
+                        self.client.get(url.format(match_id=match.id))
+
+    def test_profiles(self):
+        # 除外セット1・件数1・一覧（IDとバージョン）1・キャッシュになかったプロフィール1
+        self.assert_constant_queries(4, '/api/blog/profiles/', cached=2)
+
+    def test_likes(self):
+        # 除外セット1・件数1・一覧1・キャッシュになかったプロフィール1
+        self.assert_constant_queries(4, '/api/blog/likes/', cached=2)
+
+    def test_likes_sent_and_received(self):
+        # 除外セット1・件数1・一覧1（相互いいねは注釈で同じ問い合わせに含まれる）・キャッシュになかったプロフィール1
+        self.assert_constant_queries(4, '/api/blog/likes/sent/', cached=2)
+        self.assert_constant_queries(4, '/api/blog/likes/received/', cached=2)
+
+    def test_matches(self):
+        # 除外セット1・件数1・一覧1・キャッシュになかったプロフィール1
+        self.assert_constant_queries(4, '/api/blog/matches/', cached=2)
+
+    def test_inbox(self):
+        # 除外セット1・一覧1・キャッシュになかったプロフィール1
+        self.assert_constant_queries(3, '/api/blog/matches/inbox/', cached=1)
+
+    def test_messages(self):
+        # 除外セット1・件数1・一覧1
+        self.assert_constant_queries(3, '/api/blog/messages/')
+        # 除外セット1・最新の一覧1・（ページに満たないので）マッチング1・アーカイブ1
+        self.assert_constant_queries(4, '/api/blog/messages/by_match/?match_id={match_id}')
+
+    def test_cursor_pages(self):
+        # キーセットでは件数を数えない
+        self.assert_constant_queries(3, '/api/blog/likes/?pagination=cursor')
+        self.assert_constant_queries(2, '/api/blog/messages/?pagination=cursor')
+
+    @mock.patch('blog.fastserializers.ENABLED', False)
+    def test_model_serializers(self):
+        # 高速シリアライザを使わない場合も、関連は select_related と注釈で読む
+        self.assert_constant_queries(3, '/api/blog/profiles/')
+        self.assert_constant_queries(3, '/api/blog/likes/')
+        self.assert_constant_queries(3, '/api/blog/matches/')
+        self.assert_constant_queries(3, '/api/blog/messages/')
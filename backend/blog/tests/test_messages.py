@@ -0,0 +1,142 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from blog import messagearchive
+from blog.counters import get_counters
+from blog.models import Message, MessageChunk
+from blog.services import like_user, mark_read
+
+
+class ByMatchTests(TestCase):
+    """by_match の最新ページ・差分取得"""
+
+    def setUp(self):
+        cache.clear()
+        self.alice = User.objects.create_user('alice', password='x')
+        self.bob = User.objects.create_user('bob', password='x')
+        like_user(self.bob, self.alice.id)
+        self.match = like_user(self.alice, self.bob.id).match
+        self.messages = [
+            Message.objects.create(match=self.match, sender=self.bob, content=f'message {i}') for i in range(12)
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+
+    def by_match(self, **params):
+        return self.client.get('/api/blog/messages/by_match/', {'match_id': self.match.id, **params})
+
+    def ids(self, response):
+        return [message['id'] for message in response.data['results']]
+
+    def test_latest(self):
+        response = self.by_match(latest=1, page_size=5)
+        self.assertEqual(self.ids(response), [message.id for message in self.messages[-5:]])
+        self.assertTrue(response.data['has_more'])
+
+        older = self.by_match(before_id=self.ids(response)[0], page_size=5)
+        self.assertEqual(self.ids(older), [message.id for message in self.messages[-10:-5]])
+
+    def test_latest_reads_archive(self):
+        mark_read(self.alice, self.match.id)
+        messagearchive.archive_match(self.match.id, timezone.now() + timedelta(days=1), chunk_size=4)
+        self.assertFalse(Message.objects.filter(match=self.match).exists())
+        self.assertTrue(MessageChunk.objects.filter(match=self.match).exists())
+
+        response = self.by_match(latest=1, page_size=5)
+        self.assertEqual(self.ids(response), [message.id for message in self.messages[-5:]])
+        self.assertTrue(response.data['has_more'])
+
+        response = self.by_match(latest=1, page_size=20)
+        self.assertEqual(self.ids(response), [message.id for message in self.messages])
+        self.assertFalse(response.data['has_more'])
+
+    def test_default_mode_reads_archive(self):
+        # 指定がなければ最新ページを返し、アーカイブ済みの会話でも履歴が欠けない
+        mark_read(self.alice, self.match.id)
+        messagearchive.archive_match(self.match.id, timezone.now() + timedelta(days=1), chunk_size=4)
+        Message.objects.create(match=self.match, sender=self.bob, content='hot')
+
+        response = self.by_match(page_size=5)
+        self.assertEqual(self.ids(response)[:-1], [message.id for message in self.messages[-4:]])
+        self.assertTrue(response.data['has_more'])
+        older = self.by_match(before_id=self.ids(response)[0], page_size=20)
+        self.assertEqual(self.ids(older), [message.id for message in self.messages[:-4]])
+        self.assertFalse(older.data['has_more'])
+
+    def test_page_number_rejected(self):
+        response = self.by_match(page=2)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('error', response.data)
+
+    def test_conflicting_anchors(self):
+        response = self.by_match(after_id=self.messages[0].id, before_id=self.messages[-1].id)
+        self.assertEqual(response.status_code, 400)
+        response = self.by_match(latest=1, before_id=self.messages[-1].id)
+        self.assertEqual(response.status_code, 400)
+
+    def test_idle_poll_not_modified(self):
+        response = self.by_match(after_id=self.messages[-1].id)
+        self.assertEqual(self.ids(response), [])
+        response = self.client.get(
+            '/api/blog/messages/by_match/', {'match_id': self.match.id, 'after_id': self.messages[-1].id},
+            HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(response.status_code, 304)
+
+    def test_edit_changes_etag(self):
+        response = self.by_match(latest=1)
+        etag = response['ETag']
+        edited = self.messages[-1]
+        self.client.force_authenticate(self.bob)
+        response = self.client.patch(f'/api/blog/messages/{edited.id}/', {'content': 'edited'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.client.force_authenticate(self.alice)
+
+        response = self.client.get(
+            '/api/blog/messages/by_match/', {'match_id': self.match.id, 'latest': 1}, HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'][-1]['content'], 'edited')
+
+
+class SendMessageTests(TestCase):
+    """メッセージ送信と受信箱の最新メッセージ欄"""
+
+    def setUp(self):
+        cache.clear()
+        self.alice = User.objects.create_user('alice', password='x')
+        self.bob = User.objects.create_user('bob', password='x')
+        like_user(self.bob, self.alice.id)
+        self.match = like_user(self.alice, self.bob.id).match
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+
+    def send(self, content):
+        return self.client.post('/api/blog/messages/', {'match': self.match.id, 'content': content}, format='json')
+
+    def test_updates_last_message(self):
+        self.assertEqual(self.send('hello').status_code, 201)
+        self.match.refresh_from_db()
+        self.assertEqual(self.match.last_message_content, 'hello')
+
+    def test_rolls_back_with_last_message(self):
+        # 最新メッセージ欄を更新できなければメッセージも保存しない
+        with mock.patch('blog.models.Match.set_last_message', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.send('hello')
+        self.assertFalse(Message.objects.filter(match=self.match).exists())
+
+    def test_delete_restores_previous(self):
+        self.send('first')
+        second = self.send('second').data['id']
+        self.assertEqual(self.client.delete(f'/api/blog/messages/{second}/').status_code, 204)
+        self.match.refresh_from_db()
+        self.assertEqual(self.match.last_message_content, 'first')
+        # 未読のまま削除した分は受信者の未読数から引く
+        self.assertEqual(get_counters(self.bob).unread_messages, 1)
@@ -0,0 +1,89 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from blog import messagesearch
+from blog.models import Message, MessageTerm
+from blog.services import like_user
+
+
+class MessageSearchTests(TestCase):
+    """自分の会話内のメッセージ検索"""
+
+    def setUp(self):
+        cache.clear()
+        self.alice = User.objects.create_user('alice', password='x')
+        self.bob = User.objects.create_user('bob', password='x')
+        like_user(self.bob, self.alice.id)
+        self.match = like_user(self.alice, self.bob.id).match
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+
+    def send(self, content, sender=None):
+        return Message.objects.create(match=self.match, sender=sender or self.bob, content=content)
+
+    def search(self, q, **params):
+        return self.client.get('/api/blog/messages/search/', {'q': q, **params})
+
+    def ids(self, response):
+        return [message['id'] for message in response.data['results']]
+
+    def test_finds_all_terms(self):
+        hit = self.send('週末に映画を見に行こう')
+        self.send('週末は雨らしい')
+        response = self.search('週末 映画')
+        self.assertEqual(self.ids(response), [hit.id])
+        self.assertFalse(response.data['has_more'])
+
+    def test_old_match_behind_common_gram(self):
+        # 片方の n-gram だけを含む新しいメッセージが大量にあっても、古い一致は落とさない
+        old = self.send('ramen tonight')
+        for i in range(30):
+            self.send(f'ramen {i}')
+        with mock.patch('blog.messagesearch.MAX_CANDIDATES', 10):
+            response = self.search('ramen tonight')
+        self.assertEqual(self.ids(response), [old.id])
+
+    def test_pages_with_next_before_id(self):
+        hits = [self.send(f'coffee {i}') for i in range(5)]
+        response = self.search('coffee', page_size=3)
+        self.assertEqual(self.ids(response), [message.id for message in hits[:1:-1]])
+        self.assertTrue(response.data['has_more'])
+
+        response = self.search('coffee', page_size=3, before_id=response.data['next_before_id'])
+        self.assertEqual(self.ids(response), [hits[1].id, hits[0].id])
+        self.assertFalse(response.data['has_more'])
+
+    def test_reports_truncated_scan(self):
+        hit = self.send('tea time')
+        for i in range(12):
+            # n-gram はすべて含むが、どちらの語も含まない
+            self.send(f'tiea imte me {i}')
+        # 本文で外れる候補ばかりで確認の上限に達したら、続きの位置を返す
+        with mock.patch('blog.messagesearch.MAX_CANDIDATES', 8):
+            response = self.search('tea time', page_size=2)
+            self.assertEqual(self.ids(response), [])
+            self.assertTrue(response.data['has_more'])
+            response = self.search('tea time', page_size=2, before_id=response.data['next_before_id'])
+        self.assertEqual(self.ids(response), [hit.id])
+
+    def test_edit_reindexes(self):
+        message = self.send('original text')
+        response = self.client.patch(f'/api/blog/messages/{message.id}/', {'content': 'updated words'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.ids(self.search('updated words')), [message.id])
+        self.assertEqual(self.ids(self.search('original')), [])
+
+    def test_delete_unindexes(self):
+        message = self.send('secret plan', sender=self.alice)
+        self.assertEqual(self.client.delete(f'/api/blog/messages/{message.id}/').status_code, 204)
+        self.assertFalse(MessageTerm.objects.filter(message_id=message.id).exists())
+        self.assertEqual(self.ids(self.search('secret plan')), [])
+
+    def test_query_too_short(self):
+        with self.assertRaises(messagesearch.QueryTooShort):
+            messagesearch.search(self.alice, 'a')
+        self.assertEqual(self.search('a').status_code, 400)
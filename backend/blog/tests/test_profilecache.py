@@ -0,0 +1,52 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from blog.models import Profile
+
+
+class ProfileCacheVersionTests(TestCase):
+    """シリアライズ済みプロフィールのバージョン"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('alice', password='x')
+        self.profile = Profile.objects.create(user=self.user, display_name='alice')
+
+    def test_save_defers_reload(self):
+        with self.assertNumQueries(1):
+            self.profile.display_name = 'Alice'
+            self.profile.save(update_fields=['display_name'])
+        # 参照したときにだけ読み直す
+        with self.assertNumQueries(1):
+            self.assertEqual(self.profile.cache_version, 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.profile.cache_version, 1)
+
+    def test_username_change_bumps_version(self):
+        client = self.client_for(self.user)
+        self.assertEqual(client.get('/api/blog/profiles/').data['results'][0]['username'], 'alice')
+        self.user.username = 'alice2'
+        self.user.save()
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.cache_version, 1)
+        # 古い断片ではなく新しいユーザー名で返す
+        self.assertEqual(client.get('/api/blog/profiles/').data['results'][0]['username'], 'alice2')
+
+    def test_unrelated_user_update_keeps_version(self):
+        self.user.save(update_fields=['last_login'])
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.cache_version, 0)
+
+    def test_cache_stats_requires_staff(self):
+        self.assertEqual(self.client.get('/health/cache/').status_code, 401)
+        self.assertEqual(self.client_for(self.user).get('/health/cache/').status_code, 403)
+        self.user.is_staff = True
+        self.user.save()
+        self.assertEqual(self.client_for(self.user).get('/health/cache/').status_code, 200)
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
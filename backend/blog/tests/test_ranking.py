@@ -0,0 +1,39 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+from blog import ranking
+from blog.models import Profile
+
+
+class RankTests(TestCase):
+    """興味の類似度ランキング（他プロセスでの削除・退会の反映）"""
+
+    def setUp(self):
+        self.addCleanup(setattr, ranking, '_index', None)
+        ranking._index = None
+        self.viewer = User.objects.create_user('viewer', password='x')
+        Profile.objects.create(user=self.viewer, display_name='viewer', interests='music,hiking')
+        self.others = []
+        for i in range(4):
+            user = User.objects.create_user(f'user{i}', password='x')
+            Profile.objects.create(user=user, display_name=user.username, interests='music,hiking')
+            self.others.append(user)
+        ranking.get_index()
+
+    def ranked_ids(self, k):
+        return [user_id for user_id, score in ranking.rank(self.viewer.id, k)]
+
+    def test_excludes_deleted_profile(self):
+        # 他のプロセスで削除された（このプロセスの索引にはシグナルが届かない）
+        with mock.patch('blog.signals.ranking.remove_profile'):
+            Profile.objects.filter(user=self.others[0]).delete()
+        self.assertEqual(self.ranked_ids(3), [user.id for user in self.others[1:]])
+        # 索引からも外れている
+        self.assertNotIn(self.others[0].id, [user_id for user_id, score in ranking.get_index().rank(self.viewer.id, 10)])
+
+    def test_excludes_inactive_user(self):
+        User.objects.filter(pk=self.others[1].pk).update(is_active=False)
+        self.assertNotIn(self.others[1].id, self.ranked_ids(4))
+        self.assertEqual(len(self.ranked_ids(4)), 3)
@@ -0,0 +1,104 @@
+import threading
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, skipUnlessDBFeature
+
+from blog import counters
+from blog.models import Like, Match, MatchMember, UserCounters
+from blog.services import like_user
+
+PAIRS = 10
+ROUNDS = 3
+
+
+class LikeUserTests(TestCase):
+    """like_user（いいねとマッチング作成のサービス）"""
+
+    def setUp(self):
+        self.alice = User.objects.create_user('alice', password='x')
+        self.bob = User.objects.create_user('bob', password='x')
+
+    def test_mutual_like_creates_match(self):
+        like_user(self.bob, self.alice.id)
+        result = like_user(self.alice, self.bob.id)
+
+        self.assertTrue(result.created)
+        self.assertTrue(result.match_created)
+        self.assertTrue(result.like.mutual)
+        self.assertEqual(MatchMember.objects.filter(match=result.match).count(), 2)
+
+    def test_mutual_like_statement_count(self):
+        like_user(self.bob, self.alice.id)
+        counters.get_counters(self.alice)
+        counters.get_counters(self.bob)
+
+        # ロック1・いいねの取得1・いいね INSERT 1・候補キュー1・スワイプ記録1・
+        # マッチングの取得と INSERT 2（+ セーブポイント2）・隣接リスト1・集計値1（+ 外側のセーブポイント2）
+        with self.assertNumQueries(13):
+            result = like_user(self.alice, self.bob.id)
+        self.assertTrue(result.match_created)
+
+    def test_repeated_like_does_not_duplicate(self):
+        like_user(self.bob, self.alice.id)
+        like_user(self.alice, self.bob.id)
+        result = like_user(self.alice, self.bob.id)
+
+        self.assertFalse(result.created)
+        self.assertFalse(result.match_created)
+        self.assertEqual(Match.objects.count(), 1)
+
+    def test_unknown_user(self):
+        with self.assertRaises(User.DoesNotExist):
+            like_user(self.alice, self.bob.id + 100)
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class LikeUserConcurrencyTests(TransactionTestCase):
+    """同時に送り合ったいいね（行ロックを使えないデータベースでは実行しない）"""
+
+    def run_in_threads(self, calls):
+        """calls の (関数, 引数) を同時に実行し、発生した例外のリストを返す"""
+        barrier = threading.Barrier(len(calls))
+        errors = []
+
+        def run(func, args):
+            try:
+                barrier.wait()
+                func(*args)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=run, args=call) for call in calls]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return errors
+
+    def test_simultaneous_mutual_likes(self):
+        users = [User.objects.create_user(f'user{i}', password='x') for i in range(PAIRS * 2)]
+        pairs = list(zip(users[::2], users[1::2]))
+        for user in users:
+            counters.get_counters(user)
+
+        for _ in range(ROUNDS):
+            Like.objects.all().delete()
+            Match.objects.all().delete()
+            errors = self.run_in_threads(
+                [(like_user, (a, b.id)) for a, b in pairs] + [(like_user, (b, a.id)) for a, b in pairs]
+            )
+
+            self.assertEqual(errors, [])
+            for a, b in pairs:
+                self.assertEqual(Match.objects.filter(user1=a, user2=b, deleted_at__isnull=True).count(), 1)
+            self.assertEqual(MatchMember.objects.count(), PAIRS * 2)
+            self.assertEqual(Like.objects.count(), PAIRS * 2)
+
+            computed = counters.compute([user.id for user in users])
+            for row in UserCounters.objects.filter(user__in=users):
+                self.assertEqual(
+                    {field: getattr(row, field) for field in UserCounters.COUNTER_FIELDS}, computed[row.user_id]
+                )
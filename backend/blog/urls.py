@@ -1,6 +1,7 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import ProfileViewSet, LikeViewSet, MatchViewSet, MessageViewSet, BlockViewSet
+from .events import events
+from .views import ProfileViewSet, LikeViewSet, MatchViewSet, MessageViewSet, BlockViewSet, CountersView
 
 router = DefaultRouter()
 router.register(r'profiles', ProfileViewSet, basename='profile')
@@ -11,6 +12,8 @@ router.register(r'blocks', BlockViewSet, basename='block')
 
 urlpatterns = [
     path('', include(router.urls)),
+    path('counters/', CountersView.as_view(), name='counters'),
+    path('events/', events, name='events'),
 ]
 
 
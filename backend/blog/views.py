@@ -1,25 +1,50 @@
+import hashlib
+
 from rest_framework import viewsets, status, filters
 from rest_framework.decorators import action
+from rest_framework.pagination import CursorPagination
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.views import APIView
 from django.contrib.auth.models import User
-from django.db.models import Q
-from .models import Profile, Like, Match, Message, Block
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.utils.http import parse_etags, quote_etag
+from .models import Profile, Like, Match, MatchMember, Message, Block, DiscoverCandidate, UserCounters
+from . import avatars, blocks, counters, geo, interests, messagearchive, messagesearch, purge, ranking
+from .discover import excluded_user_ids, refill_queue
+from .fastserializers import (
+    BlockValuesSerializer, FastListMixin, InboxValuesSerializer, LikeValuesSerializer,
+    MatchValuesSerializer, MessageValuesSerializer, ProfileCardSerializer,
+)
+from .filters import InterestFilter, ProfileSearchFilter, ProximityFilter, interest_params, proximity_params
+from .services import like_user, mark_read, swipe
+from .pagination import KeysetPagination, StandardPagination, ActionPaginationMixin, PAGINATION_MODES
 from .serializers import (
     ProfileSerializer, ProfileListSerializer, LikeSerializer,
-    MatchSerializer, MessageSerializer, MessageCreateSerializer, BlockSerializer
+    MatchSerializer, MessageSerializer, MessageCreateSerializer, BlockSerializer,
+    SwipeBatchSerializer, InboxSerializer
 )
 
 
-class ProfileViewSet(viewsets.ModelViewSet):
+class ProfileViewSet(FastListMixin, ActionPaginationMixin, viewsets.ModelViewSet):
     """プロフィールViewSet"""
     queryset = Profile.objects.all()
     serializer_class = ProfileSerializer
+    fast_serializer_class = ProfileCardSerializer
     permission_classes = [IsAuthenticated]
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
-    search_fields = ['display_name', 'bio', 'interests', 'location']
+    pagination_class = StandardPagination
+    pagination_modes = PAGINATION_MODES
+    cursor_ordering = 'id'
+    filter_backends = [ProfileSearchFilter, InterestFilter, ProximityFilter, filters.OrderingFilter]
     ordering_fields = ['created_at', 'age']
     
+    def get_queryset(self):
+        """ブロック関係にあるユーザーのプロフィールは一覧・詳細・検索に出さない"""
+        profiles = Profile.objects.select_related('user').order_by('id')
+        return blocks.exclude_blocked(profiles, self.request, 'user_id')
+    
     def get_serializer_class(self):
         if self.action == 'list':
             return ProfileListSerializer
@@ -27,50 +52,196 @@ class ProfileViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['get'])
     def me(self, request):
-        """自分のプロフィールを取得"""
-        profile, created = Profile.objects.get_or_create(user=request.user)
+        """自分のプロフィールを取得（認証時に読み込み済みのプロフィールを使い、なければ作る）"""
+        try:
+            profile = request.user.profile
+        except Profile.DoesNotExist:
+            # 作成はシグナルで認証済みユーザーのキャッシュを消すので、次のリクエストからは読み込み済みになる
+            profile, created = Profile.objects.get_or_create(user=request.user)
         serializer = self.get_serializer(profile)
         return Response(serializer.data)
     
     @action(detail=False, methods=['put', 'patch'])
     def update_me(self, request):
         """自分のプロフィールを更新"""
+        # 書き込みはキャッシュ済みの（古いかもしれない）プロフィールではなく DB の最新の行に対して行う
         profile, created = Profile.objects.get_or_create(user=request.user)
         serializer = self.get_serializer(profile, data=request.data, partial=True)
         serializer.is_valid(raise_exception=True)
         serializer.save()
         return Response(serializer.data)
     
+    @action(detail=False, methods=['put'], url_path='me/avatar')
+    def upload_avatar(self, request):
+        """自分のプロフィール画像をアップロード（本文に画像そのものを送る）
+
+        本文はパーサーを通さずに少しずつ一時ファイルへ書き出し、
+        大きさ・画素数の上限を超えたらデコードする前に 413 を返す。
+        """
+        profile, created = Profile.objects.get_or_create(user=request.user)
+        try:
+            content_length = int(request.META.get('CONTENT_LENGTH') or 0) or None
+        except ValueError:
+            content_length = None
+        try:
+            avatars.accept(profile, request.stream, content_length)
+        except avatars.AvatarTooLarge as e:
+            return Response({'error': str(e)}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        except avatars.InvalidAvatar as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        serializer = self.get_serializer(profile)
+        return Response(serializer.data)
+    
     @action(detail=False, methods=['get'])
     def discover(self, request):
-        """おすすめユーザーを取得（自分以外のユーザー）"""
-        # 自分と既にいいねしたユーザーを除外
-        liked_users = Like.objects.filter(from_user=request.user).values_list('to_user', flat=True)
-        profiles = Profile.objects.exclude(
-            Q(user=request.user) | Q(user__in=liked_users)
-        ).select_related('user')
-        
-        # フィルタリング
-        page = self.paginate_queryset(profiles)
-        if page is not None:
-            serializer = ProfileListSerializer(page, many=True)
-            return self.get_paginated_response(serializer.data)
+        """おすすめユーザーを取得（事前計算済みの候補キューをカーソルで読む）"""
+        if request.query_params.get('rank') == 'interests':
+            return self.discover_ranked(request)
+        if proximity_params(request) is not None:
+            return self.discover_nearby(request)
+        if interest_params(request) is not None:
+            return self.discover_tagged(request)
+        
+        # 自分・いいね済み・ブロック関係のユーザーはキューに積む時点で除外済み
+        # 表示しただけでは候補から外さない（いいね・パス・ブロックで外れるまで同じ候補を返す）
+        queue = DiscoverCandidate.objects.filter(user=request.user)
+        self.fill_discover_queue(request, queue)
+        page = self.paginate_queryset(queue)
+        return self.get_paginated_response(self.profile_cards([candidate.candidate_id for candidate in page]))
+
+
+    def fill_discover_queue(self, request, queue):
+        """要求されたページとその次の1件までキューが届かなければ、ページを切る前に補充する
+
+        補充を後にすると、キューの末尾を越えたページは 404 になり、
+        末尾のページには次ページへのリンクが付かない。
+        """
+        page_size = self.paginator.get_page_size(request)
+        if isinstance(self.paginator, CursorPagination):
+            cursor = self.paginator.decode_cursor(request)
+            if cursor is not None and cursor.reverse:
+                return
+            if cursor is not None and cursor.position is not None:
+                queue = queue.filter(id__gt=cursor.position)
+            needed = (cursor.offset if cursor is not None else 0) + page_size + 1
+        else:
+            try:
+                page_number = int(request.query_params.get(self.paginator.page_query_param, 1))
+            except ValueError:
+                # 'last' や不正な値はページネーション側で扱う
+                return
+            needed = max(page_number, 1) * page_size + 1
+        shortage = needed - queue[:needed].count()
+        if shortage > 0:
+            refill_queue(request.user, extra=shortage)
+    
+    def discover_ranked(self, request):
+        """興味の類似度が高い順におすすめユーザーを取得（上位 page_size 件）"""
+        params = request.query_params
+        try:
+            min_age = int(params['min_age']) if params.get('min_age') else None
+            max_age = int(params['max_age']) if params.get('max_age') else None
+        except ValueError:
+            return Response(
+                {'error': 'min_age and max_age must be integers'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
-        serializer = ProfileListSerializer(profiles, many=True)
-        return Response(serializer.data)
+        metric = params.get('metric', 'jaccard')
+        if metric not in ranking.METRICS:
+            return Response(
+                {'error': f'metric must be one of {", ".join(ranking.METRICS)}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        ranked = ranking.rank(
+            request.user.id,
+            self.paginator.get_page_size(request),
+            exclude=excluded_user_ids(request.user),
+            min_age=min_age,
+            max_age=max_age,
+            gender=params.get('gender'),
+            location=params.get('location'),
+            metric=metric,
+        )
+        results = self.profile_cards([user_id for user_id, score in ranked])
+        return Response({'next': None, 'previous': None, 'results': results})
+    
+    def discover_nearby(self, request):
+        """近くにいるおすすめユーザーを近い順に取得（radius / nearest 指定時）"""
+        latitude, longitude, radius, nearest = proximity_params(request)
+        exclude = excluded_user_ids(request.user) | {request.user.id}
+        nearby = geo.nearby(
+            latitude, longitude, radius_km=radius,
+            k=nearest or self.paginator.get_page_size(request), exclude=exclude,
+            queryset=InterestFilter().filter_queryset(request, Profile.objects.all(), self)
+        )
+        results = self.profile_cards([user_id for user_id, distance in nearby])
+        return Response({'next': None, 'previous': None, 'results': results})
+    
+    def discover_tagged(self, request):
+        """指定した興味タグをすべて持つおすすめユーザーを取得（?interests= 指定時）"""
+        exclude = excluded_user_ids(request.user) | {request.user.id}
+        profiles = InterestFilter().filter_queryset(
+            request, Profile.objects.filter(user__is_active=True).select_related('user').order_by('id'), self
+        ).exclude(user_id__in=exclude)
+        if self.fast_enabled():
+            return self.fast_list(profiles)
+        page = self.paginate_queryset(profiles)
+        serializer = ProfileListSerializer(page, many=True, context=self.get_serializer_context())
+        return self.get_paginated_response(serializer.data)
+    
+    @action(detail=False, methods=['get'])
+    def interests(self, request):
+        """興味タグとプロフィール数を多い順に取得
 
+        ?prefix= で前方一致に絞り込む。?interests= を指定すると、
+        それらのタグを持つプロフィールに一緒に付いているタグを数える。
+        """
+        try:
+            limit = min(int(request.query_params.get('limit', interests.FACET_LIMIT)), interests.FACET_LIMIT)
+        except ValueError:
+            return Response(
+                {'error': 'limit must be an integer'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response({'results': interests.facets(
+            interest_params(request), request.query_params.get('prefix'), limit
+        )})
+    
+    def profile_cards(self, user_ids):
+        """ユーザーIDの並び順のままプロフィール一覧の出力を返す（ブロック関係にあるユーザーは除く）"""
+        blocked = blocks.for_request(self.request)
+        user_ids = [user_id for user_id in user_ids if user_id not in blocked]
+        if self.fast_enabled():
+            cards = ProfileCardSerializer(self.get_serializer_context()).by_user(user_ids)
+            return [cards[user_id] for user_id in user_ids if user_id in cards]
+        profiles = {
+            profile.user_id: profile
+            for profile in Profile.objects.filter(user_id__in=user_ids).select_related('user')
+        }
+        profiles = [profiles[user_id] for user_id in user_ids if user_id in profiles]
+        return ProfileListSerializer(profiles, many=True, context=self.get_serializer_context()).data
 
-class LikeViewSet(viewsets.ModelViewSet):
+
+class LikeViewSet(FastListMixin, ActionPaginationMixin, viewsets.ModelViewSet):
     """いいねViewSet"""
     queryset = Like.objects.all()
     serializer_class = LikeSerializer
+    fast_serializer_class = LikeValuesSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = StandardPagination
+    pagination_modes = PAGINATION_MODES
     
     def get_queryset(self):
-        """自分が送った、または受け取ったいいねのみを表示"""
-        return Like.objects.filter(
-            Q(from_user=self.request.user) | Q(to_user=self.request.user)
-        ).select_related('from_user', 'to_user', 'from_user__profile', 'to_user__profile')
+        """自分が送った、または受け取ったいいねのみを表示（ブロック関係にある相手とのいいねは除く）"""
+        likes = Like.objects.filter(
+            Q(from_user=self.request.user) | Q(to_user=self.request.user),
+            from_user__is_active=True, to_user__is_active=True
+        )
+        return blocks.exclude_blocked(likes, self.request, 'from_user', 'to_user').select_related(
+            'from_user', 'to_user', 'from_user__profile', 'to_user__profile'
+        ).with_mutual()
     
     def create(self, request, *args, **kwargs):
         """いいねを送る"""
@@ -83,57 +254,85 @@ class LikeViewSet(viewsets.ModelViewSet):
             )
         
         try:
-            to_user = User.objects.get(id=to_user_id)
-        except User.DoesNotExist:
+            to_user_id = int(to_user_id)
+        except (TypeError, ValueError):
             return Response(
-                {'error': 'User not found'},
-                status=status.HTTP_404_NOT_FOUND
+                {'error': 'to_user must be an integer'},
+                status=status.HTTP_400_BAD_REQUEST
             )
         
         # 自分自身にはいいねできない
-        if to_user == request.user:
+        if to_user_id == request.user.id:
             return Response(
                 {'error': 'Cannot like yourself'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # 既にいいね済みかチェック
-        like, created = Like.objects.get_or_create(
-            from_user=request.user,
-            to_user=to_user
-        )
+        # ブロック関係にある相手は存在しないユーザーと同じに扱う（書き込みなのでキャッシュを使わない）
+        if blocks.blocked_among(request.user.id, [to_user_id]):
+            return Response(
+                {'error': 'User not found'},
+                status=status.HTTP_404_NOT_FOUND
+            )
         
-        if not created:
+        # いいねと相互いいね時のマッチング作成を1トランザクションで実行
+        try:
+            result = like_user(request.user, to_user_id)
+        except User.DoesNotExist:
+            return Response(
+                {'error': 'User not found'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        
+        if not result.created:
             return Response(
                 {'message': 'Already liked'},
                 status=status.HTTP_200_OK
             )
         
-        # 相互いいねの場合、マッチングを作成
-        is_mutual = Like.objects.filter(
-            from_user=to_user,
-            to_user=request.user
-        ).exists()
-        
-        if is_mutual:
-            match, match_created = Match.create_match(request.user, to_user)
-            serializer = self.get_serializer(like)
+        serializer = self.get_serializer(result.like)
+        if result.match:
             return Response({
                 'like': serializer.data,
                 'matched': True,
-                'match_id': match.id
+                'match_id': result.match.id
             }, status=status.HTTP_201_CREATED)
         
-        serializer = self.get_serializer(like)
         return Response({
             'like': serializer.data,
             'matched': False
         }, status=status.HTTP_201_CREATED)
     
+    @action(detail=False, methods=['post'])
+    def swipes(self, request):
+        """いいね / パスをまとめて送信（マッチングが成立した相手も一括で返す）"""
+        serializer = SwipeBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        
+        swipes = [(item['to_user'], item['action']) for item in serializer.validated_data['swipes']]
+        result = swipe(request.user, swipes, excluded=blocks.blocked_among(
+            request.user.id, {to_user_id for to_user_id, action in swipes}
+        ))
+        return Response({
+            'liked': result.liked,
+            'already_liked': result.already_liked,
+            'passed': result.passed,
+            'invalid': result.invalid,
+            'matches': [
+                {
+                    'match_id': match.id,
+                    'user_id': match.user2_id if match.user1_id == request.user.id else match.user1_id
+                }
+                for match in result.matches
+            ],
+        }, status=status.HTTP_200_OK)
+    
     @action(detail=False, methods=['get'])
     def sent(self, request):
         """送信したいいね一覧"""
         likes = self.get_queryset().filter(from_user=request.user)
+        if self.fast_enabled():
+            return self.fast_list(likes)
         page = self.paginate_queryset(likes)
         if page is not None:
             serializer = self.get_serializer(page, many=True)
@@ -146,6 +345,8 @@ class LikeViewSet(viewsets.ModelViewSet):
     def received(self, request):
         """受信したいいね一覧"""
         likes = self.get_queryset().filter(to_user=request.user)
+        if self.fast_enabled():
+            return self.fast_list(likes)
         page = self.paginate_queryset(likes)
         if page is not None:
             serializer = self.get_serializer(page, many=True)
@@ -166,31 +367,25 @@ class LikeViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        # 既にマッチング済みかチェック
-        existing_match = Match.objects.filter(
-            Q(user1=request.user, user2=like.from_user) |
-            Q(user1=like.from_user, user2=request.user)
-        ).exists()
+        # いいねを返してマッチングを作成（相互いいね状態にする）
+        try:
+            result = like_user(request.user, like.from_user_id)
+        except User.DoesNotExist:
+            return Response(
+                {'error': 'User not found'},
+                status=status.HTTP_404_NOT_FOUND
+            )
         
-        if existing_match:
+        if not result.match_created:
             return Response(
                 {'message': 'Already matched'},
                 status=status.HTTP_200_OK
             )
         
-        # いいねを返す（相互いいね状態にする）
-        return_like, created = Like.objects.get_or_create(
-            from_user=request.user,
-            to_user=like.from_user
-        )
-        
-        # マッチングを作成
-        match, match_created = Match.create_match(request.user, like.from_user)
-        
         return Response({
             'message': 'Match created successfully',
             'matched': True,
-            'match_id': match.id
+            'match_id': result.match.id
         }, status=status.HTTP_201_CREATED)
     
     @action(detail=True, methods=['post'])
@@ -212,19 +407,57 @@ class LikeViewSet(viewsets.ModelViewSet):
         )
 
 
-class MatchViewSet(viewsets.ModelViewSet):
+class MatchViewSet(FastListMixin, ActionPaginationMixin, viewsets.ModelViewSet):
     """マッチングViewSet"""
     queryset = Match.objects.all()
     serializer_class = MatchSerializer
+    fast_serializer_class = MatchValuesSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = StandardPagination
+    pagination_modes = PAGINATION_MODES
+    # 受信箱は最新のやり取り順に読み進めるものなので、既定でキーセットにする
+    action_pagination_classes = {'inbox': KeysetPagination}
     http_method_names = ['get', 'delete']  # 取得と削除のみ許可
     
+    cursor_ordering = '-matched_at'
+    
     def get_queryset(self):
-        """自分のマッチングのみを表示"""
-        return Match.objects.filter(
-            Q(user1=self.request.user) | Q(user2=self.request.user)
+        """自分のマッチングのみを表示（隣接リストの (user, created_at) で範囲スキャン。ブロック関係の相手は除く）"""
+        matches = blocks.exclude_blocked(
+            Match.objects.filter(members__user=self.request.user), self.request, 'user1', 'user2'
+        )
+        return matches.annotate(
+            matched_at=F('members__created_at')
         ).select_related('user1', 'user2', 'user1__profile', 'user2__profile')
     
+    @action(detail=False, methods=['get'])
+    def inbox(self, request):
+        """受信箱：自分のマッチングを最新のやり取り順に、相手・最新メッセージ・未読数付きで取得
+
+        件数によらず、隣接リストから相手のプロフィールと Match の最新メッセージ欄を
+        JOIN し、未読数を相関サブクエリで付ける1回の問い合わせ（と次ページの判定）で返す。
+        """
+        unread = Message.objects.filter(
+            match=OuterRef('match'), id__gt=OuterRef('last_read_message_id')
+        ).exclude(sender=request.user).order_by().values('match').annotate(count=Count('id')).values('count')
+        members = blocks.exclude_blocked(
+            MatchMember.objects.filter(user=request.user), request, 'partner'
+        ).annotate(
+            last_activity_at=Coalesce('match__last_message_at', 'created_at'),
+            unread_count=Coalesce(Subquery(unread), 0),
+        ).select_related('match', 'partner', 'partner__profile').order_by('-last_activity_at', '-id')
+        
+        self.cursor_ordering = '-last_activity_at'
+        if self.fast_enabled(InboxValuesSerializer):
+            return self.fast_list(members, InboxValuesSerializer)
+        page = self.paginate_queryset(members)
+        if page is not None:
+            serializer = InboxSerializer(page, many=True, context=self.get_serializer_context())
+            return self.get_paginated_response(serializer.data)
+        
+        serializer = InboxSerializer(members, many=True, context=self.get_serializer_context())
+        return Response(serializer.data)
+    
     def destroy(self, request, *args, **kwargs):
         """マッチングを解除（削除）"""
         match = self.get_object()
@@ -242,8 +475,8 @@ class MatchViewSet(viewsets.ModelViewSet):
             Q(from_user=match.user2, to_user=match.user1)
         ).delete()
         
-        # マッチングを削除（関連メッセージはカスケードで削除される）
-        match.delete()
+        # マッチングを解除済みにする（メッセージはバックグラウンドで削除される）
+        purge.hide_match(match)
         
         return Response(
             {'message': 'Match deleted successfully'},
@@ -251,16 +484,19 @@ class MatchViewSet(viewsets.ModelViewSet):
         )
 
 
-class BlockViewSet(viewsets.ModelViewSet):
+class BlockViewSet(FastListMixin, ActionPaginationMixin, viewsets.ModelViewSet):
     """ブロックViewSet"""
     queryset = Block.objects.all()
     serializer_class = BlockSerializer
+    fast_serializer_class = BlockValuesSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = StandardPagination
+    pagination_modes = PAGINATION_MODES
     http_method_names = ['get', 'post', 'delete']
     
     def get_queryset(self):
-        """自分がブロックしたユーザーのみを表示"""
-        return Block.objects.filter(blocker=self.request.user).select_related('blocked', 'blocked__profile')
+        """自分がブロックしたユーザーのみを表示（ブロックの管理用なので除外セットは適用しない）"""
+        return Block.objects.filter(blocker=self.request.user, blocked__is_active=True).select_related('blocked', 'blocked__profile')
     
     def create(self, request, *args, **kwargs):
         """ユーザーをブロック"""
@@ -301,11 +537,9 @@ class BlockViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_200_OK
             )
         
-        # マッチングがあれば削除
-        Match.objects.filter(
-            Q(user1=request.user, user2=blocked_user) |
-            Q(user1=blocked_user, user2=request.user)
-        ).delete()
+        # マッチングがあれば解除（メッセージはバックグラウンドで削除される）
+        for match in Match.objects.filter(members__user=request.user, members__partner=blocked_user):
+            purge.hide_match(match)
         
         # いいねを削除
         Like.objects.filter(
@@ -336,20 +570,24 @@ class BlockViewSet(viewsets.ModelViewSet):
         )
 
 
-class MessageViewSet(viewsets.ModelViewSet):
+class MessageViewSet(FastListMixin, ActionPaginationMixin, viewsets.ModelViewSet):
     """メッセージViewSet"""
     queryset = Message.objects.all()
     serializer_class = MessageSerializer
+    fast_serializer_class = MessageValuesSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = StandardPagination
+    pagination_modes = PAGINATION_MODES
+    cursor_ordering = 'created_at'
     
     def get_queryset(self):
-        """自分が関係するマッチングのメッセージのみを表示"""
-        user_matches = Match.objects.filter(
-            Q(user1=self.request.user) | Q(user2=self.request.user)
-        )
+        """自分が関係するマッチングのメッセージのみを表示（ブロック関係にある相手との会話は除く）"""
+        user_matches = blocks.exclude_blocked(
+            MatchMember.objects.filter(user=self.request.user), self.request, 'partner'
+        ).values('match')
         return Message.objects.filter(match__in=user_matches).select_related(
             'match', 'sender', 'sender__profile'
-        )
+        ).with_read_state()
     
     def get_serializer_class(self):
         if self.action == 'create':
@@ -369,16 +607,49 @@ class MessageViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        # メッセージを保存
-        message = serializer.save(sender=request.user)
+        # ブロック関係にある相手には送信できない
+        partner_id = match.user2_id if match.user1_id == request.user.id else match.user1_id
+        if blocks.blocked_among(request.user.id, [partner_id]):
+            return Response(
+                {'error': 'Cannot send messages to a blocked user'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        # メッセージの保存と受信箱用の最新メッセージ欄の更新は同じトランザクションで行う
+        with transaction.atomic():
+            message = serializer.save(sender=request.user)
+            match.set_last_message(message)
         
         # 完全なメッセージデータを返す
         response_serializer = MessageSerializer(message)
         return Response(response_serializer.data, status=status.HTTP_201_CREATED)
     
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        was_read = instance.is_read
+        messagesearch.unindex_messages([instance.id])
+        instance.delete()
+        # 未読のまま削除されたメッセージは受信者の未読数から引く
+        if not was_read:
+            match = instance.match
+            recipient_id = match.user2_id if instance.sender_id == match.user1_id else match.user1_id
+            counters.bump([recipient_id], unread_messages=-1)
+        # 最新メッセージを削除した場合は1つ前のメッセージに戻す（削除と同じトランザクションで）
+        match = instance.match
+        if match.last_message_at == instance.created_at:
+            match.set_last_message(match.messages.order_by('-created_at', '-id').first())
+    
     @action(detail=False, methods=['get'])
     def by_match(self, request):
-        """特定のマッチングのメッセージ履歴を取得"""
+        """特定のマッチングのメッセージ履歴を取得
+
+        after_id / before_id を指定すると、そのメッセージより新しい（古い）メッセージを
+        (match, created_at) インデックスの範囲検索で最大 page_size 件、古い順に返す。
+        指定がなければ（latest=1 と同じく）最新の page_size 件を古い順に返す（続きは before_id で読む）。
+        どのモードも Message に残っていない分はアーカイブ（MessageChunk）から読む。
+        ページ番号（?page=）はアーカイブ済みの履歴を数えられないので受け付けない。
+        ETag を返し、If-None-Match が一致すればシリアライズせずに 304 を返す。
+        """
         match_id = request.query_params.get('match_id')
         if not match_id:
             return Response(
@@ -387,17 +658,175 @@ class MessageViewSet(viewsets.ModelViewSet):
             )
         
         messages = self.get_queryset().filter(match_id=match_id)
-        page = self.paginate_queryset(messages)
-        if page is not None:
-            serializer = self.get_serializer(page, many=True)
-            return self.get_paginated_response(serializer.data)
+        after_id = request.query_params.get('after_id')
+        before_id = request.query_params.get('before_id')
+        latest = request.query_params.get('latest', '').lower() in ('1', 'true')
+        if len([value for value in (after_id, before_id, latest) if value]) > 1:
+            return Response(
+                {'error': 'Specify only one of after_id, before_id and latest'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if 'page' in request.query_params:
+            return Response(
+                {'error': 'page is not supported; use latest, before_id or after_id'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if after_id or before_id:
+            return self.messages_since(request, match_id, messages, after_id, before_id)
+        return self.latest_messages(request, match_id, messages)
+    
+    def latest_messages(self, request, match_id, messages):
+        """最新のメッセージを最大 page_size 件、古い順に返す（Message に足りない分はアーカイブから読む）"""
+        page_size = self.paginator.get_page_size(request)
+        limit = page_size + 1
+        rows = list(messages.order_by('-created_at', '-id')[:limit])
+        if len(rows) < limit:
+            archived_match = self.my_match(match_id)
+            if archived_match is not None:
+                rows += messagearchive.before(archived_match, rows[-1].id if rows else None, limit - len(rows))
+        has_more = len(rows) > page_size
+        rows = rows[:page_size][::-1]
+        
+        return self.conditional_response(
+            request, rows, lambda data: Response({'results': data, 'has_more': has_more})
+        )
+    
+    def messages_since(self, request, match_id, messages, after_id, before_id):
+        """after_id より新しい / before_id より古いメッセージを古い順に返す
+
+        Message に残っている範囲を越えた分はアーカイブ（MessageChunk）から読む。
+        """
+        anchor_id = after_id or before_id
+        anchor = None
+        archived_match = None
+        if anchor_id.isdigit():
+            anchor_id = int(anchor_id)
+            anchor = messages.filter(id=anchor_id).values_list('created_at', flat=True).first()
+            if anchor is None:
+                archived_match = self.my_match(match_id)
+                archived = messagearchive.find(archived_match, anchor_id) if archived_match else None
+                anchor = archived.created_at if archived else None
+        if anchor is None:
+            return Response(
+                {'error': 'Message not found in this match'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
-        serializer = self.get_serializer(messages, many=True)
-        return Response(serializer.data)
+        page_size = self.paginator.get_page_size(request)
+        limit = page_size + 1
+        if after_id:
+            rows = []
+            if archived_match is not None:
+                rows = messagearchive.after(archived_match, anchor_id, limit)
+            if len(rows) < limit:
+                hot = messages.filter(created_at__gte=anchor).exclude(
+                    created_at=anchor, id__lte=anchor_id
+                ).order_by('created_at', 'id')
+                rows += list(hot[:limit - len(rows)])
+            has_more = len(rows) > page_size
+            rows = rows[:page_size]
+        else:
+            rows = list(messages.filter(created_at__lte=anchor).exclude(
+                created_at=anchor, id__gte=anchor_id
+            ).order_by('-created_at', '-id')[:limit])
+            if len(rows) < limit:
+                archived_match = archived_match or self.my_match(match_id)
+                if archived_match is not None:
+                    oldest_id = rows[-1].id if rows else anchor_id
+                    rows += messagearchive.before(archived_match, oldest_id, limit - len(rows))
+            has_more = len(rows) > page_size
+            rows = rows[:page_size][::-1]
+        
+        return self.conditional_response(
+            request, rows, lambda data: Response({'results': data, 'has_more': has_more})
+        )
+    
+    def my_match(self, match_id):
+        """自分が参加しているマッチングを取得（なければ None）"""
+        if not str(match_id).isdigit():
+            return None
+        matches = Match.objects.filter(pk=match_id, members__user=self.request.user)
+        return blocks.exclude_blocked(matches, self.request, 'user1', 'user2').first()
+    
+    def conditional_response(self, request, messages, respond):
+        """メッセージ一覧に ETag を付けて返す（If-None-Match が一致すればシリアライズせずに 304）
+
+        メッセージは編集（PATCH）できるので、ID と既読状態に加えて本文も ETag に含める。
+        """
+        etag = quote_etag(
+            hashlib.md5(repr([(m.id, m.is_read, m.content) for m in messages]).encode()).hexdigest()
+        )
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+        response = respond(self.get_serializer(messages, many=True).data)
+        response['ETag'] = etag
+        return response
+    
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """自分の会話のメッセージを検索（?q= の語をすべて含むものを新しい順に返す）
+
+        match_id で会話を絞り込み、before_id を指定するとそれより古いものを返す。
+        has_more が真なら next_before_id を before_id に指定して続きを読む。
+        """
+        query = request.query_params.get('q', '')
+        match_id = request.query_params.get('match_id')
+        before_id = request.query_params.get('before_id')
+        if (match_id and not match_id.isdigit()) or (before_id and not before_id.isdigit()):
+            return Response(
+                {'error': 'match_id and before_id must be integers'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            result = messagesearch.search(
+                request.user, query,
+                match_id=int(match_id) if match_id else None,
+                before_id=int(before_id) if before_id else None,
+                limit=self.paginator.get_page_size(request),
+            )
+        except messagesearch.QueryTooShort as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        serializer = self.get_serializer(result.messages, many=True)
+        return Response({
+            'results': serializer.data,
+            'has_more': result.has_more,
+            'next_before_id': result.next_before_id,
+        })
+    
+    @action(detail=False, methods=['post'])
+    def read(self, request):
+        """マッチングの既読位置を message_id まで進める（省略時は最新のメッセージまで既読にする）"""
+        try:
+            match_id = int(request.data.get('match_id'))
+            message_id = request.data.get('message_id')
+            if message_id is not None:
+                message_id = int(message_id)
+        except (TypeError, ValueError):
+            return Response(
+                {'error': 'match_id and message_id must be integers'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            last_read_message_id = mark_read(request.user, match_id, message_id)
+        except MatchMember.DoesNotExist:
+            return Response(
+                {'error': 'Match not found'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        except Message.DoesNotExist:
+            return Response(
+                {'error': 'Message not found in this match'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        return Response({'match_id': match_id, 'last_read_message_id': last_read_message_id})
     
     @action(detail=True, methods=['post'])
     def mark_as_read(self, request, pk=None):
-        """メッセージを既読にする"""
+        """メッセージまでを既読にする（互換用。まとめて既読にするには messages/read/ を使う）"""
         message = self.get_object()
         if message.sender == request.user:
             return Response(
@@ -405,9 +834,15 @@ class MessageViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        message.is_read = True
-        message.save()
+        message.recipient_read_id = mark_read(request.user, message.match_id, message.id)
         serializer = self.get_serializer(message)
         return Response(serializer.data)
 
 
+class CountersView(APIView):
+    """バッジ表示用の集計値（未承認いいね・マッチング・未読メッセージ数など）を取得"""
+    permission_classes = [IsAuthenticated]
+    
+    def get(self, request):
+        user_counters = counters.get_counters(request.user)
+        return Response({field: getattr(user_counters, field) for field in UserCounters.COUNTER_FIELDS})
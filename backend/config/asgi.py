@@ -3,6 +3,14 @@ ASGI config for blog project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+The real-time event stream (/api/blog/events/) is an async view that keeps
+connections open, so the app is served with an ASGI server: gunicorn with
+uvicorn workers (``gunicorn config.asgi:application -c gunicorn.conf.py``, see
+the Dockerfile and docker-compose.yml). Sync API views run in each worker's
+thread pool, so size the workers with WEB_CONCURRENCY as for WSGI.
+Under WSGI the endpoint answers 503. With more than one process, set
+PUBSUB_BACKEND=blog.pubsub.DatabaseBroker so events reach every process.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
 """
@@ -121,7 +121,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # REST Framework
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'accounts.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
@@ -158,3 +158,57 @@ SPECTACULAR_SETTINGS = {
 }
 
 
+
+# Discover（おすすめ候補キュー・興味ランキング）
+DISCOVER_QUEUE_SIZE = config('DISCOVER_QUEUE_SIZE', default=100, cast=int)
+RANKING_SYNC_INTERVAL = config('RANKING_SYNC_INTERVAL', default=5, cast=int)
+
+# プロフィール検索（auto: MySQL なら FULLTEXT、それ以外はプロセス内の転置索引）
+PROFILE_SEARCH_BACKEND = config('PROFILE_SEARCH_BACKEND', default='auto')
+SEARCH_SYNC_INTERVAL = config('SEARCH_SYNC_INTERVAL', default=5, cast=int)
+
+# スワイプイベントのアーカイブ
+SWIPE_ARCHIVE_DIR = config('SWIPE_ARCHIVE_DIR', default=str(BASE_DIR / 'archive' / 'swipes'))
+SWIPE_EVENT_RETENTION_DAYS = config('SWIPE_EVENT_RETENTION_DAYS', default=90, cast=int)
+
+# バックグラウンド削除ジョブ（run_purge_jobs）
+PURGE_BATCH_SIZE = config('PURGE_BATCH_SIZE', default=1000, cast=int)
+PURGE_JOB_LEASE = config('PURGE_JOB_LEASE', default=300, cast=int)
+
+# リアルタイム配信（SSE）の pub/sub（InMemoryBroker は単一プロセス用。複数プロセスでは DatabaseBroker）
+PUBSUB_BACKEND = config('PUBSUB_BACKEND', default='blog.pubsub.InMemoryBroker')
+PUBSUB_POLL_INTERVAL = config('PUBSUB_POLL_INTERVAL', default=0.5, cast=float)
+PUBSUB_RETENTION = config('PUBSUB_RETENTION', default=60, cast=int)
+EVENTS_HEARTBEAT = config('EVENTS_HEARTBEAT', default=15, cast=int)
+
+# メッセージのアーカイブ（archive_messages）
+MESSAGE_RETENTION_DAYS = config('MESSAGE_RETENTION_DAYS', default=180, cast=int)
+MESSAGE_CHUNK_SIZE = config('MESSAGE_CHUNK_SIZE', default=500, cast=int)
+
+# プロフィール画像（アップロードの上限と process_avatars で作る縮小版の画質）
+AVATAR_QUALITY = config('AVATAR_QUALITY', default=85, cast=int)
+AVATAR_MAX_UPLOAD_SIZE = config('AVATAR_MAX_UPLOAD_SIZE', default=10 * 1024 * 1024, cast=int)
+AVATAR_MAX_PIXELS = config('AVATAR_MAX_PIXELS', default=25_000_000, cast=int)
+
+# キャッシュ（既定はプロセス内。複数プロセスで共有するには Redis / Memcached のバックエンドを指定）
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default=''),
+    }
+}
+PROFILE_CACHE_TIMEOUT = config('PROFILE_CACHE_TIMEOUT', default=3600, cast=int)
+
+# 一覧（list アクション）を .values() の行から直接組み立てる高速シリアライザ（fastserializers）
+FAST_LIST_SERIALIZERS = config('FAST_LIST_SERIALIZERS', default=True, cast=bool)
+
+# 認証済みユーザー・プロフィールのプロセス内キャッシュ（CachedJWTAuthentication）
+# 無効化はキャッシュ（CACHES）上のバージョンで伝える。共有キャッシュなら全プロセスにすぐ届き、
+# 既定のプロセス内キャッシュでは他のプロセスに最大この秒数遅れて届く
+AUTH_USER_CACHE_TTL = config('AUTH_USER_CACHE_TTL', default=60, cast=int)
+AUTH_USER_CACHE_SIZE = config('AUTH_USER_CACHE_SIZE', default=10000, cast=int)
+
+# ブロック関係の除外セット（blocks）のキャッシュ保持秒数（ブロック・解除時には消す）
+# 既定のプロセス内キャッシュでは他のプロセスの削除が届かず、この秒数だけ古い集合で一覧を返し得る。
+# CACHE_BACKEND に Redis / Memcached を指定して全プロセスで共有する場合は長くしてよい
+BLOCK_CACHE_TIMEOUT = config('BLOCK_CACHE_TIMEOUT', default=60, cast=int)
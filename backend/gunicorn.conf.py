@@ -0,0 +1,17 @@
+"""
+gunicorn の設定（Dockerfile・docker-compose.yml から読み込む）
+
+config.asgi を uvicorn のワーカー（UvicornWorker）で複数プロセス動かす。
+SSE の待機接続はイベントループ上で保持するのでワーカー数によらないが、
+同期ビュー（DRF の API）は各プロセスのスレッドプール（と GIL）で実行されるため、
+API の並列度はワーカー数で決まる。WSGI で動かしていたときと同じ程度の数を指定する。
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+worker_class = 'uvicorn.workers.UvicornWorker'
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+# SSE の接続は長く続くので、再起動時は接続を切るまで待ちすぎない
+graceful_timeout = 10
+accesslog = '-'
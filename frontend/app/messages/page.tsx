@@ -52,8 +52,8 @@ export default function MessagesPage() {
 
   const fetchMessages = async () => {
     try {
-      const response = await api.get(`/api/blog/messages/by_match/?match_id=${matchId}`);
-      // レスポンスが配列かオブジェクトか確認
+      const response = await api.get(`/api/blog/messages/by_match/?match_id=${matchId}&latest=1`);
+      // 最新のメッセージを古い順に取得（レスポンスが配列かオブジェクトか確認）
       const data = Array.isArray(response.data) ? response.data : response.data.results || [];
       setMessages(data);
     } catch (error) {